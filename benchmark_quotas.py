@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import subprocess
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，此时不记录峰值内存
+    resource = None
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 默认测试的选手规模
+BENCH_SIZES = (10_000, 100_000, 1_000_000)
+# 默认省份数 (超出 province_mapping.json 的部分使用合成的省份代码)
+BENCH_PROVINCES = 32
+# 每个基准重复次数，耗时取最小值
+BENCH_REPEAT = 3
+# 零分选手比例
+ZERO_SCORE_RATIO = 0.15
+# 每套成绩的题目数 (每题 0~100 分)
+PROBLEM_COUNT = 4
+# 基准历史 (每次运行追加一行JSON) 与基线文件
+HISTORY_FILENAME = "benchmark_history.jsonl"
+BASELINE_FILENAME = "benchmark_baseline.json"
+# 相对基线的容忍比例，超过即标记为性能回归
+WALL_TOLERANCE = 0.20
+RSS_TOLERANCE = 0.20
+# 耗时增加不超过此值 (秒) 时不视为回归，避免毫秒级基准的计时抖动被误报
+MIN_WALL_DELTA = 0.02
+# ==============================================================================
+
+# 两种表头方言: 中文 (用户/总分数) 与英文 (User/Total Score)
+HEADER_DIALECTS = (
+    ('#', '用户', '总分数'),
+    ('#', 'User', 'Total Score'),
+)
+
+BENCHMARKS = ('ingest_cold', 'ingest_warm', 'allocate', 'calculate_quotas')
+
+# 本仓库目录: 省份映射从这里读取，子进程也从这里导入模块，与当前工作目录无关
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def synthetic_province_codes(province_count, mapping_codes):
+    """前面使用真实的省份代码，不足时补充不与之冲突的两位大写字母代码。"""
+    # 映射中的 TOTAL 等非两位代码不是省份，不能作为用户ID前缀
+    codes = [code for code in mapping_codes if len(code) == 2][:province_count]
+    taken = set(mapping_codes)
+    for first in 'ZYXWVUTSRQ':
+        for second in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+            if len(codes) >= province_count:
+                return codes
+            if first + second not in taken:
+                codes.append(first + second)
+    if len(codes) < province_count:
+        raise ValueError(f"最多只能合成 {len(codes)} 个省份代码。")
+    return codes
+
+def synthetic_scores(rng, n):
+    """
+    生成 n 名选手的各题得分与总分 (按总分降序)。
+    每名选手有一个能力值，各题得分随能力与题目难度变化，并有 ZERO_SCORE_RATIO 的选手全部零分。
+    """
+    ability = rng.normal(0.0, 1.0, size=(n, 1))
+    difficulty = np.linspace(-1.0, 1.5, PROBLEM_COUNT)[None, :]
+    logits = 1.7 * (ability - difficulty) + rng.normal(0.0, 0.8, size=(n, PROBLEM_COUNT))
+    problems = np.rint(100 / (1 + np.exp(-logits)) / 5) * 5
+    problems[rng.random(n) < ZERO_SCORE_RATIO] = 0
+    problems = problems.astype(np.int64)
+    totals = problems.sum(axis=1)
+    order = np.argsort(-totals, kind='stable')
+    return problems[order], totals[order]
+
+def generate_scoreboards(output_dir, contestants, province_codes, seed=0):
+    """
+    在 output_dir 下为每个省份写一个成绩文件，两种表头方言交替使用。
+    各省人数大致服从 Zipf 分布 (少数大省、多数小省)，总人数为 contestants。
+    返回 {省份代码: 人数}。
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    weights = 1.0 / np.arange(1, len(province_codes) + 1) ** 0.8
+    sizes = rng.multinomial(contestants - len(province_codes), weights / weights.sum()) + 1
+
+    for i, (province_code, n) in enumerate(zip(province_codes, sizes.tolist())):
+        rank_col, user_col, score_col = HEADER_DIALECTS[i % len(HEADER_DIALECTS)]
+        problems, totals = synthetic_scores(rng, n)
+        df = pd.DataFrame({
+            rank_col: np.arange(1, n + 1),
+            user_col: [f"{province_code}-{j:07d}" for j in range(n)],
+            score_col: totals,
+        })
+        for p in range(PROBLEM_COUNT):
+            df[f"#{p + 1} NOIP2025BENCH{chr(ord('A') + p)}"] = problems[:, p]
+        df.to_csv(os.path.join(output_dir, f"NOIP_2025_{province_code}_bench.csv"), index=False, encoding='utf-8-sig')
+
+    return dict(zip(province_codes, sizes.tolist()))
+
+def prepare_workspace(workspace, contestants, province_count, seed=0):
+    """生成一个可直接运行 calculate_noi_quotas 的工作目录: results/、省份映射与官方参赛人数文件。"""
+    with open(os.path.join(REPO_DIR, "province_mapping.json"), 'r', encoding='utf-8') as f:
+        name_to_code = json.load(f)
+    province_codes = synthetic_province_codes(province_count, name_to_code.values())
+    sizes = generate_scoreboards(os.path.join(workspace, "results"), contestants, province_codes, seed)
+
+    mapping = dict(name_to_code)
+    mapping.update({code: code for code in province_codes if code not in name_to_code.values()})
+    with open(os.path.join(workspace, "province_mapping.json"), 'w', encoding='utf-8') as f:
+        json.dump(mapping, f, ensure_ascii=False, indent=4)
+
+    # 官方参赛人数取为成绩文件人数的约 1.1 倍
+    participants = pd.DataFrame({'省份代码': province_codes,
+                                 'A+B类总名额': [round(n * 1.1) for n in sizes.values()]})
+    participants.to_csv(os.path.join(workspace, "noip2025_participants.csv"), index=False)
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _run_benchmark(name, workspace):
+    """在独立的子进程中执行一个基准，返回 (耗时秒数, 进程峰值内存MB)。"""
+    os.chdir(workspace)
+    import score_cache
+    import calculate_noi_quotas as calc
+
+    if name == 'ingest_cold':
+        shutil.rmtree(score_cache.cache_dir_for("results"), ignore_errors=True)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if name == 'ingest_cold' or name == 'ingest_warm':
+            started = time.perf_counter()
+            calc.load_all_scores()
+        elif name == 'allocate':
+            score_arrays, participants = calc.load_score_data()
+            province_code_to_name = calc.load_province_mapping()
+            started = time.perf_counter()
+            calc.run_calculation(participants, score_arrays, province_code_to_name,
+                                 "benchmark", "", "noi2025_quotas_benchmark.csv")
+        else:
+            started = time.perf_counter()
+            calc.calculate_quotas()
+        elapsed = time.perf_counter() - started
+    return elapsed, _peak_rss_mb()
+
+def measure(name, workspace, repeat=BENCH_REPEAT):
+    """重复执行一个基准，每次使用新的子进程 (峰值内存互不影响)，返回最短耗时与最大峰值内存。"""
+    context = multiprocessing.get_context('spawn')
+    samples = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            samples.append(executor.submit(_run_benchmark, name, workspace).result())
+    rss = [r for _, r in samples if r is not None]
+    return min(t for t, _ in samples), (max(rss) if rss else None)
+
+def run_benchmarks(sizes, province_count, benchmarks=BENCHMARKS, repeat=BENCH_REPEAT, seed=0):
+    """按规模生成合成数据并依次执行各基准，返回结果记录列表。"""
+    # 子进程以 spawn 方式启动，需要能从工作目录之外导入本仓库的模块
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')]))
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    records = []
+    for contestants in sizes:
+        workspace = tempfile.mkdtemp(prefix="calcnoi_bench_")
+        try:
+            print(f"生成 {contestants} 名选手、{province_count} 个省份的合成成绩 ...")
+            prepare_workspace(workspace, contestants, province_count, seed)
+            # 先做一次冷启动读取，保证 warm 类基准有可用的缓存
+            if 'ingest_cold' not in benchmarks:
+                measure('ingest_cold', workspace, repeat=1)
+            for name in benchmarks:
+                wall, rss = measure(name, workspace, repeat)
+                record = {
+                    'benchmark': name,
+                    'contestants': contestants,
+                    'provinces': province_count,
+                    'wall_seconds': round(wall, 4),
+                    'peak_rss_mb': rss,
+                    'contestants_per_second': round(contestants / wall) if wall > 0 else None,
+                }
+                records.append(record)
+                print(f"  {name:<18} {wall:9.3f} s  {rss if rss is not None else '-':>8} MB  "
+                      f"{record['contestants_per_second'] or '-':>12} 人/秒")
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return records
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=REPO_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def append_history(records, history_path=HISTORY_FILENAME):
+    """向历史文件追加一行JSON，包含运行环境与本次结果。"""
+    entry = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': records,
+    }
+    with open(history_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    return entry
+
+def _record_key(record):
+    return record['benchmark'], record['contestants'], record['provinces']
+
+def find_regressions(records, baseline_records, wall_tolerance=WALL_TOLERANCE, rss_tolerance=RSS_TOLERANCE):
+    """与基线比较，返回 [(记录, 指标, 基线值, 当前值)]；基线中没有的组合不参与比较。"""
+    baseline = {_record_key(r): r for r in baseline_records}
+    regressions = []
+    for record in records:
+        base = baseline.get(_record_key(record))
+        if base is None:
+            continue
+        for metric, tolerance in (('wall_seconds', wall_tolerance), ('peak_rss_mb', rss_tolerance)):
+            before, after = base.get(metric), record.get(metric)
+            if not before or after is None or after <= before * (1 + tolerance):
+                continue
+            if metric == 'wall_seconds' and after - before <= MIN_WALL_DELTA:
+                continue
+            regressions.append((record, metric, before, after))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用合成成绩数据测量读取、分配与完整计算流程的耗时和内存。")
+    parser.add_argument('--sizes', default=','.join(map(str, BENCH_SIZES)), help="选手规模，逗号分隔")
+    parser.add_argument('--provinces', type=int, default=BENCH_PROVINCES, help="省份数")
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                        help=f"要执行的基准，逗号分隔 (可选: {', '.join(BENCHMARKS)})")
+    parser.add_argument('--repeat', type=int, default=BENCH_REPEAT, help="每个基准的重复次数")
+    parser.add_argument('--seed', type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument('--history', default=HISTORY_FILENAME, help="基准历史文件 (JSON Lines)")
+    parser.add_argument('--baseline', default=BASELINE_FILENAME, help="基线文件")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为新的基线")
+    parser.add_argument('--tolerance', type=float, default=WALL_TOLERANCE, help="耗时相对基线的容忍比例")
+    args = parser.parse_args(argv)
+
+    sizes = [int(v) for v in args.sizes.split(',') if v.strip()]
+    benchmarks = [b.strip() for b in args.benchmarks.split(',') if b.strip()]
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(sorted(unknown))}")
+    if args.repeat < 1:
+        parser.error("--repeat 至少为 1")
+    if any(n < args.provinces for n in sizes):
+        parser.error("选手规模不能小于省份数。")
+
+    records = run_benchmarks(sizes, args.provinces, benchmarks, args.repeat, args.seed)
+    entry = append_history(records, args.history)
+    print(f"\n结果已追加到: {args.history}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"没有找到基线文件 '{args.baseline}'，可使用 --save-baseline 创建。")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline_records = json.load(f)['results']
+    regressions = find_regressions(records, baseline_records, wall_tolerance=args.tolerance)
+    if not regressions:
+        print("与基线相比没有发现性能回归。")
+        return 0
+    print("\n发现性能回归:")
+    for record, metric, before, after in regressions:
+        print(f"  {record['benchmark']} ({record['contestants']} 人, {record['provinces']} 省) "
+              f"{metric}: {before} -> {after} (+{(after / before - 1) * 100:.1f}%)")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
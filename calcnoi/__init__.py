@@ -0,0 +1,33 @@
+"""
+CalcNOI 的程序接口: 读取成绩、按给定参数计算名额、应用约束，均返回结构化结果而不打印。
+
+所有名称在首次访问时才导入对应模块，``import calcnoi`` 本身不会加载 numpy 或 pandas；
+计算路径只依赖 numpy，pandas/requests/bs4 只在解析未缓存的CSV、输出表格或爬取时才导入。
+"""
+
+# 公开名称 -> 所在模块
+_EXPORTS = {
+    'QuotaParams': 'calcnoi.api',
+    'ScoreData': 'calcnoi.api',
+    'load_scores': 'calcnoi.api',
+    'b1_participants': 'calcnoi.api',
+    'compute_quotas': 'calcnoi.api',
+    'apply_caps': 'calcnoi.api',
+    'quota_table': 'calcnoi.api',
+    'reverse_validate': 'calcnoi.api',
+    'Allocation': 'quota_engine',
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'calcnoi' has no attribute '{name}'")
+    import importlib
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
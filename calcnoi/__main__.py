@@ -0,0 +1,4 @@
+import sys
+from calcnoi.cli import main
+
+sys.exit(main())
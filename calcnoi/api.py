@@ -0,0 +1,64 @@
+from collections import namedtuple
+import quota_engine
+import calculate_noi_quotas as calc
+
+# 名额计算参数，默认值取自 calculate_noi_quotas 的配置
+QuotaParams = namedtuple(
+    'QuotaParams', ['s_total', 'k1_segments', 'k2_top_scores', 'p_max_ratio', 'max_b_quotas'],
+    defaults=(calc.S_TOTAL_B_QUOTAS, calc.K1_SEGMENTS, calc.K2_TOP_SCORES, calc.P_MAX_RATIO,
+              calc.MAX_B_QUOTAS_PER_PROVINCE)
+)
+
+# 成绩数据: scores 为各省非零分成绩数组 (流式读取时为各省分数直方图组成的 quota_engine.HistogramBoard)，
+# participants 为各省总参赛人数 (含零分)
+ScoreData = namedtuple('ScoreData', ['scores', 'participants'])
+
+def load_scores(results_dir="results", use_cache=True, streaming=False):
+    """读取成绩目录，返回 ScoreData。缓存命中时不需要 pandas。"""
+    if streaming:
+        histograms, participants = calc.load_score_data_streaming(results_dir)
+        return ScoreData(quota_engine.prepare_histograms(histograms), participants)
+    return ScoreData(*calc.load_score_data(results_dir, use_cache=use_cache))
+
+def b1_participants(mode, score_data):
+    """返回 B1 所用的各省参赛人数，mode 为 'official' / 'with_zeros' / 'no_zeros'。"""
+    return calc.load_b1_participants(mode, score_data.scores, score_data.participants)
+
+def compute_quotas(scores, b1_participants_data, params=QuotaParams()):
+    """
+    按给定参数计算一次名额分配。
+    scores 为 {省份代码: 非零分成绩} 或 ScoreData.scores，b1_participants_data 为 {省份代码: B1 所用参赛人数}。
+    返回 quota_engine.Allocation。
+    """
+    board = quota_engine.as_board(scores)
+    b1_counts, b1_total = quota_engine.align_participants(board, b1_participants_data)
+    return quota_engine.allocate(board, b1_counts, b1_total, *params)
+
+def apply_caps(b1, b2, b3, non_zero, params=QuotaParams()):
+    """B类总名额 = round(B1+B2+B3)，再受非零分人数 × P 与单省上限约束。"""
+    return quota_engine.apply_caps(b1, b2, b3, non_zero, params.p_max_ratio, params.max_b_quotas)
+
+def quota_table(allocation, province_code_to_name=None, a_quota=calc.A_QUOTA_BASE):
+    """将分配结果整理为按省份代码排序的字典列表 (与结果CSV的各列对应)，不依赖 pandas。"""
+    province_code_to_name = province_code_to_name or {}
+    index_of = {pc: i for i, pc in enumerate(allocation.province_codes)}
+    rows = []
+    for province_code in sorted(allocation.province_codes):
+        i = index_of[province_code]
+        total_b = int(allocation.total_b[i])
+        rows.append({
+            '省份代码': province_code,
+            '省份': province_code_to_name.get(province_code, province_code),
+            'A类': a_quota,
+            'B1': float(allocation.b1[i]),
+            'B2': int(allocation.b2[i]),
+            'B3': int(allocation.b3[i]),
+            'B总名额': total_b,
+            '总名额': a_quota + total_b,
+        })
+    return rows
+
+def reverse_validate(filepath="noip2025_participants.csv"):
+    """由官方名额表反推各省 B1，返回 (推算结果列表, 全国NOIP总参赛人数, 错误信息列表)。"""
+    import calculate_b_quotas
+    return calculate_b_quotas.reverse_validate(filepath)
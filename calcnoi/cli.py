@@ -0,0 +1,35 @@
+import sys
+import argparse
+import importlib
+
+# 子命令 -> (模块, 说明)。模块在执行对应子命令时才导入
+COMMANDS = {
+    'compute': ('calculate_noi_quotas', "计算三种B1模式下的各省名额"),
+    'scrape': ('scraper', "从网站爬取各省NOIP成绩"),
+    'sweep': ('sweep_quotas', "参数网格扫描"),
+    'reverse-validate': ('calculate_b_quotas', "由官方名额表反推各省B1名额并核对"),
+    'margins': ('margin_quotas', "B2/B3 临界分析: 各省距名额线还差多少分"),
+    'calibrate': ('calibrate_quotas', "搜索最能复现官方名额表的参数"),
+    'simulate': ('simulate_quotas', "蒙特卡洛名额不确定性模拟"),
+    'watch': ('watch_quotas', "监视成绩目录并实时重新发布名额表"),
+    'serve': ('serve_quotas', "常驻内存的名额查询服务 (HTTP/JSON)"),
+    'results': ('result_store', "列式名额结果目录: 查看与导出CSV"),
+    'history': ('history_store', "多年历史数据: 导入、历年名额轨迹与跨年规则重放"),
+    'benchmark': ('benchmark_quotas', "基于合成数据的性能基准"),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='calcnoi', description="NOI 省队名额分配模拟器。",
+        epilog='\n'.join(f"  {name:<18}{help_text}" for name, (_, help_text) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('command', choices=COMMANDS, metavar='command', help="子命令 (见下方列表)")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="传给子命令的参数 (可用 calcnoi <子命令> -h 查看)")
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    return module.main(args.args)
+
+if __name__ == "__main__":
+    sys.exit(main())
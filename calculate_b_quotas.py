@@ -1,50 +1,49 @@
 import csv
 import os
-import math
+import argparse
 
-def calculate_b_quotas_from_raw_data(filepath="noi2025_quotas.csv"):
+# 原始名额文件中的省份列与总数行 (generate_csv_from_text.py 生成的文件使用省份代码)
+PROVINCE_COLUMNS = ("省份", "省份代码")
+TOTAL_ROW_NAMES = ("总数", "TOTAL")
+
+def reverse_validate(filepath="noip2025_participants.csv"):
     """
-    读取 NOI2025 省队名额 CSV 文件 (其中B1为NOIP参赛人数)，
-    推算 B1 名额，并与其他数据进行比较和展示。
+    读取 NOI2025 省队名额 CSV 文件 (其中B1为NOIP参赛人数)，推算各省 B1 名额。
+    不打印任何内容，返回 (推算结果列表, 全国NOIP总参赛人数, 错误信息列表)。
+    文件不存在或无法解析时，推算结果为空，错误信息中说明原因。
     """
     if not os.path.exists(filepath):
-        print(f"错误: 文件 '{filepath}' 未找到。请先运行 generate_csv_from_text.py。")
-        return
+        return [], 0, [f"文件 '{filepath}' 未找到。请先运行 generate_csv_from_text.py。"]
 
-    print(f"正在读取文件: {filepath} 并推算B类名额...")
     raw_data_rows = []
     national_noip_participants_total = 0
     errors = []
 
     try:
-        with open(filepath, mode='r', newline='', encoding='utf-8') as csvfile:
+        with open(filepath, mode='r', newline='', encoding='utf-8-sig') as csvfile:
             reader = csv.DictReader(csvfile)
+            province_column = next((c for c in PROVINCE_COLUMNS if c in (reader.fieldnames or [])), None)
+            if province_column is None:
+                return [], 0, [f"文件 '{filepath}' 缺少省份列 ({' / '.join(PROVINCE_COLUMNS)})。"]
             for row in reader:
                 raw_data_rows.append(row)
-                if row["省份"] != "总数":
+                if row[province_column] not in TOTAL_ROW_NAMES:
                     try:
                         national_noip_participants_total += int(row["B1"])
                     except ValueError:
-                        errors.append(f"省份 {row["省份"]}: B1(NOIP参赛人数)不是有效数字: {row["B1"]}")
+                        errors.append(f"省份 {row[province_column]}: B1(NOIP参赛人数)不是有效数字: {row['B1']}")
 
     except Exception as e:
-        print(f"读取或解析CSV文件时发生错误: {e}")
-        return
-    
+        return [], 0, [f"读取或解析CSV文件时发生错误: {e}"]
+
     if errors:
-        print("\n--- 原始数据读取错误 ---")
-        for error in errors:
-            print(error)
-        return
+        return [], national_noip_participants_total, errors
 
-    print(f"\n计算得出全国NOIP总参赛人数 (B1列总和): {national_noip_participants_total}")
-    print("\n--- B类名额推算结果及数据验证 ---")
-    
     calculated_results = []
 
     for row in raw_data_rows:
-        province = row["省份"]
-        if province == "总数":
+        province = row[province_column]
+        if province in TOTAL_ROW_NAMES:
             # 跳过总数行，或者可以进行总数验证
             continue
 
@@ -86,7 +85,21 @@ def calculate_b_quotas_from_raw_data(filepath="noi2025_quotas.csv"):
             errors.append(f"省份 {province}: 转换数值时出错 - {ve}. 原始行: {row}")
         except KeyError as ke:
             errors.append(f"省份 {province}: 缺少列 - {ke}. 原始行: {row}")
-    
+
+    return calculated_results, national_noip_participants_total, errors
+
+def calculate_b_quotas_from_raw_data(filepath="noip2025_participants.csv"):
+    """
+    读取 NOI2025 省队名额 CSV 文件 (其中B1为NOIP参赛人数)，
+    推算 B1 名额，并与其他数据进行比较和展示。
+    """
+    print(f"正在读取文件: {filepath} 并推算B类名额...")
+    calculated_results, national_noip_participants_total, errors = reverse_validate(filepath)
+
+    if calculated_results:
+        print(f"\n计算得出全国NOIP总参赛人数 (B1列总和): {national_noip_participants_total}")
+        print("\n--- B类名额推算结果及数据验证 ---")
+
     for res in calculated_results:
         print(f"省份: {res['省份']} | A类(CSV): {res['A类名额(CSV)']} | NOIP人数(B1): {res['NOIP各省人数(B1)']} | 原始B2: {res['原始B2输入(B2)']} | 原始B3: {res['原始B3输入(B3)']} | 推导总B(S): {res['推导总B类名额(S)']} | 计算B1(四舍五入): {res['计算B1名额(四舍五入)']} (浮点: {res['计算B1名额(浮点)']}) | A+B总(CSV): {res['A+B类总名额(CSV)']}")
 
@@ -94,6 +107,13 @@ def calculate_b_quotas_from_raw_data(filepath="noi2025_quotas.csv"):
         print("\n--- 发现以下错误 ---")
         for error in errors:
             print(error)
+    return calculated_results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由官方名额表反推各省B1名额并核对。")
+    parser.add_argument('--file', default="noip2025_participants.csv", help="官方名额CSV文件")
+    args = parser.parse_args(argv)
+    calculate_b_quotas_from_raw_data(args.file)
 
-if __name__ == "main":
-    calculate_b_quotas_from_raw_data()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
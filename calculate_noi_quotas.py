@@ -1,9 +1,12 @@
 import os
+import csv
 import glob
-import math
 import json
-import pandas as pd
-from collections import defaultdict
+import argparse
+import numpy as np
+import score_cache
+import quota_engine
+import stage_profiler
 
 # ==============================================================================
 # 核心假设与可配置参数 (根据 NOI2026 官方方案更新)
@@ -14,8 +17,22 @@ K2_TOP_SCORES = 5
 P_MAX_RATIO = 0.05
 MAX_B_QUOTAS_PER_PROVINCE = 12
 A_QUOTA_BASE = 5
+# 精确模式 (--exact) 下B类总名额的取整方式: 'half_up' (四舍五入) / 'half_even' (与浮点模式相同的银行家舍入)
+EXACT_ROUNDING = 'half_up'
+# 精确模式下名额线处同分的处理方式，可选值见 quota_engine.TIE_BREAKS
+EXACT_TIE_BREAK = 'province_code'
 # ==============================================================================
 
+# B1 的三种参赛人数来源: (模式, 标题, 来源说明, 输出文件)
+B1_MODES = (
+    ('official', "模式1: B1基于官方参赛总人数", " (来自participants文件)",
+     "noi2025_quotas_official_participants.csv"),
+    ('with_zeros', "模式2: B1基于测试成绩总人数 (含零分)", " (来自成绩文件, 含零分)",
+     "noi2025_quotas_scores_with_zeros.csv"),
+    ('no_zeros', "模式3: B1基于测试成绩总人数 (不含零分)", " (来自成绩文件, 非零分)",
+     "noi2025_quotas_scores_no_zeros.csv"),
+)
+
 def load_province_mapping(filepath="province_mapping.json"):
     """从JSON文件加载省份名称到代码的映射，并返回一个代码到名称的反向映射。"""
     try:
@@ -33,183 +50,325 @@ def load_province_participants_from_file(filepath="noip2025_participants.csv"):
     """
     participants = {}
     try:
-        df = pd.read_csv(filepath)
-        df = df[df['省份代码'] != 'TOTAL']
-        participants = df.set_index('省份代码')['A+B类总名额'].to_dict()
+        with open(filepath, 'r', newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                if row['省份代码'] != 'TOTAL':
+                    participants[row['省份代码']] = int(row['A+B类总名额'])
     except Exception as e:
         print(f"读取参赛人数文件 '{filepath}' 出错: {e}")
     return participants
 
-def load_all_scores(results_dir="results"):
+def _read_score_columns(csv_files, results_dir, use_cache):
+    if use_cache:
+        return score_cache.load_score_columns(csv_files, score_cache.cache_dir_for(results_dir))
+    return [score_cache.parse_score_file(f) for f in csv_files]
+
+def _default_valid_codes(valid_codes):
+    if valid_codes is None:
+        valid_codes = set(load_province_mapping())
+    # 没有可用的省份映射时不做校验
+    return valid_codes or None
+
+def load_score_data(results_dir="results", use_cache=True, valid_codes=None):
     """
-    加载 results/ 目录下所有省份的**非零分**成绩。
+    单次读取 results/ 目录下所有成绩文件，同时返回:
+    - 各省**非零分**成绩数组 (按文件中的排名顺序)
+    - 各省**总**参赛人数 (包含零分)
+    未变化的文件直接从 score_cache 的缓存中加载；同一选手出现在多个文件中时只计一次。
+    省份代码按 valid_codes (默认为 province_mapping.json 中的代码) 校验。
     """
-    all_scores = defaultdict(list)
-    csv_files = glob.glob(os.path.join(results_dir, '*.csv'))
-    
+    with stage_profiler.stage('文件查找'):
+        csv_files = sorted(glob.glob(os.path.join(results_dir, '*.csv')))
+
     if not csv_files:
         print(f"警告: 在 '{results_dir}' 目录中没有找到CSV成绩文件。")
-        return {}
-        
-    all_dfs = [pd.read_csv(f) for f in csv_files]
-    combined_df = pd.concat(all_dfs, ignore_index=True)
+        return {}, {}
 
-    if '用户' not in combined_df.columns:
-        print("错误: 成绩文件中找不到 '用户' 列。" )
-        return {}
-
-    combined_df['province_code'] = combined_df['用户'].str.slice(0, 2)
-    score_col = '总分数' if '总分数' in combined_df.columns else 'score'
-    
-    if score_col not in combined_df.columns:
-        print(f"错误: 成绩文件中找不到 '{score_col}' 列。" )
-        return {}
+    with stage_profiler.stage('CSV解析'):
+        columns = [c for c in _read_score_columns(csv_files, results_dir, use_cache) if c is not None]
+    if not columns:
+        print("错误: 没有可用的成绩文件。")
+        return {}, {}
 
-    grouped = combined_df[combined_df[score_col] > 0].groupby('province_code')
-    for province_code, group in grouped:
-        all_scores[province_code] = group[score_col].tolist()
-        
-    return all_scores
+    with stage_profiler.stage('分组'):
+        return combine_score_columns(columns, _default_valid_codes(valid_codes))
 
-def load_all_participants_from_scores(results_dir="results"):
+def load_score_data_streaming(results_dir="results", dedupe=True, valid_codes=None):
     """
-    加载 results/ 目录下所有省份的**总**参赛人数 (包含零分)。
+    load_score_data 的流式版本: 分块读取成绩文件，直接累加各省的分数直方图，
+    内存只随省份数 (以及去重所需的选手记录) 增长，适合处理超大的全国成绩文件。
+    返回 ({省份代码: 0~400 分的人数直方图}, 各省**总**参赛人数)，直方图不展开为逐人成绩，
+    由 quota_engine.prepare_histograms 直接得到与 load_score_data 逐位相同的名额。
     """
-    participant_counts = defaultdict(int)
-    csv_files = glob.glob(os.path.join(results_dir, '*.csv'))
-    
+    with stage_profiler.stage('文件查找'):
+        csv_files = sorted(glob.glob(os.path.join(results_dir, '*.csv')))
+
     if not csv_files:
-        return {}
-        
-    all_dfs = [pd.read_csv(f) for f in csv_files]
-    combined_df = pd.concat(all_dfs, ignore_index=True)
+        print(f"警告: 在 '{results_dir}' 目录中没有找到CSV成绩文件。")
+        return {}, {}
 
-    if '用户' not in combined_df.columns:
-        return {}
+    import stream_scores
+
+    # 流式读取时解析与分组在同一遍中完成
+    with stage_profiler.stage('CSV解析+分组 (流式)'):
+        summaries = stream_scores.stream_score_summaries(csv_files, dedupe=dedupe,
+                                                         valid_codes=_default_valid_codes(valid_codes))
+        return stream_scores.summaries_to_histograms(summaries)
+
+def combine_score_columns(columns, valid_codes=None):
+    """
+    合并若干成绩文件的 (users, scores) 列，同一选手只计一次，返回:
+    - 各省**非零分**成绩数组 (按文件中的排名顺序)
+    - 各省**总**参赛人数 (包含零分)
+    valid_codes 给定时，用户ID前两位不在其中的记录会被忽略并给出警告。
+    """
+    users = np.concatenate([c[0] for c in columns])
+    all_scores = np.concatenate([c[1] for c in columns])
 
-    combined_df['province_code'] = combined_df['用户'].str.slice(0, 2)
-    participant_counts = combined_df.groupby('province_code').size().to_dict()
-        
+    # 同一选手只保留第一次出现的记录 (按用户ID哈希去重)，并忽略空用户
+    keep = score_cache.first_occurrences(users)
+    keep &= users != b''
+    users, all_scores = users[keep], all_scores[keep]
+
+    # 省份代码为用户ID的前两个字节；按大端 uint16 计数，数值顺序与字节串顺序一致
+    code_values = users.astype('S2').view('>u2')
+    present = np.bincount(code_values, minlength=1 << 16) > 0
+    province_index = (np.cumsum(present) - 1)[code_values]
+    codes = np.flatnonzero(present).astype('>u2').view('S2')
+    province_codes = [c.decode('utf-8', errors='replace') for c in codes]
+
+    if valid_codes is not None:
+        valid = np.array([pc in valid_codes for pc in province_codes], dtype=bool)
+        if not valid.all():
+            counts = np.bincount(province_index, minlength=len(codes))
+            ignored = ', '.join(f"{pc}: {n}" for pc, n, ok in zip(province_codes, counts.tolist(), valid) if not ok)
+            print(f"警告: 以下省份代码不在省份映射中，对应的记录已忽略 ({ignored})。")
+            rows = valid[province_index]
+            all_scores = all_scores[rows]
+            province_index = (np.cumsum(valid) - 1)[province_index[rows]]
+            codes = codes[valid]
+            province_codes = [pc for pc, ok in zip(province_codes, valid) if ok]
+
+    participant_counts = dict(zip(province_codes, np.bincount(province_index, minlength=len(codes)).tolist()))
+
+    # 按省份稳定排序，省内保持文件中的排名顺序
+    non_zero = all_scores > 0
+    order = np.argsort(province_index[non_zero], kind='stable')
+    grouped = all_scores[non_zero][order]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(province_index[non_zero], minlength=len(codes)))))
+    scores = {
+        province_code: grouped[bounds[i]:bounds[i + 1]]
+        for i, province_code in enumerate(province_codes) if bounds[i + 1] > bounds[i]
+    }
+
+    return scores, participant_counts
+
+def load_all_scores(results_dir="results"):
+    """
+    加载 results/ 目录下所有省份的**非零分**成绩。
+    """
+    scores, _ = load_score_data(results_dir)
+    return {province_code: s.tolist() for province_code, s in scores.items()}
+
+def load_all_participants_from_scores(results_dir="results"):
+    """
+    加载 results/ 目录下所有省份的**总**参赛人数 (包含零分)。
+    """
+    _, participant_counts = load_score_data(results_dir)
     return participant_counts
 
+def load_b1_participants(mode, score_arrays, participants_with_zeros):
+    """
+    按 calculate_quotas 中的三种模式返回 B1 所用的各省参赛人数:
+    'official' (官方参赛人数文件) / 'with_zeros' (成绩文件, 含零分) / 'no_zeros' (成绩文件, 非零分)。
+    score_arrays 为 {省份代码: 非零分成绩}，或预处理好的 ScoreBoard/HistogramBoard。
+    """
+    if mode == 'official':
+        return load_province_participants_from_file()
+    if mode == 'with_zeros':
+        return participants_with_zeros
+    if isinstance(score_arrays, (quota_engine.ScoreBoard, quota_engine.HistogramBoard)):
+        return dict(zip(score_arrays.province_codes, score_arrays.counts.tolist()))
+    return {pc: len(s) for pc, s in score_arrays.items()}
+
 def run_calculation(b1_participants_data, scores_data, province_code_to_name, title, source_msg, output_filename):
     """
     执行一次完整的配额计算并显示/保存结果。
     """
+    allocation, b1_totals = run_scenarios([b1_participants_data], scores_data)
+    national_total_participants = b1_totals[0]
+    allocation = allocation._replace(b1=allocation.b1[0], total_b=allocation.total_b[0])
+    report_allocation(allocation, national_total_participants, province_code_to_name, title, source_msg, output_filename)
+
+def run_scenarios(scenarios, scores_data, p_max_ratio=P_MAX_RATIO, max_b_quotas=MAX_B_QUOTAS_PER_PROVINCE,
+                  exact=False, rounding=EXACT_ROUNDING, tie_break=EXACT_TIE_BREAK):
+    """
+    对多个 B1 参赛人数场景 (如按省预测的报名人数增长) 批量计算名额。
+    scores_data 为 {省份代码: 非零分成绩}，或预处理好的 ScoreBoard/HistogramBoard (如流式读取的直方图)。
+    B2/B3 的排名只计算一次，每个场景只需 B1 与约束的向量运算。
+    p_max_ratio/max_b_quotas 可为标量或每个场景各自的取值。
+    exact=True 时使用整数/整数比的精确模式，rounding/tie_break 见 quota_engine.allocate_exact。
+    返回 (quota_engine.Allocation，其中 b1/total_b 为 (场景数, 省份数) 矩阵, 各场景的全国总人数)。
+    """
+    with stage_profiler.stage('成绩预处理'):
+        board = quota_engine.as_board(scores_data)
+    with stage_profiler.stage('B1'):
+        b1_counts, b1_totals = quota_engine.align_scenarios(board, scenarios)
+        b1 = quota_engine.b1_scenarios(b1_counts, b1_totals, S_TOTAL_B_QUOTAS)
+    with stage_profiler.stage('B2/B3'):
+        if exact:
+            awards = quota_engine.exact_rank_awards(board, S_TOTAL_B_QUOTAS, K1_SEGMENTS, K2_TOP_SCORES, tie_break)
+        else:
+            awards = quota_engine.rank_awards(board, S_TOTAL_B_QUOTAS, K1_SEGMENTS, K2_TOP_SCORES)
+    with stage_profiler.stage('约束'):
+        if exact:
+            total_b = quota_engine.exact_total_b(awards, b1_counts, b1_totals, S_TOTAL_B_QUOTAS,
+                                                 p_max_ratio, max_b_quotas, rounding)
+        else:
+            total_b = quota_engine.cap_scenarios(awards, b1, p_max_ratio, max_b_quotas)
+    return quota_engine.Allocation(awards.province_codes, b1, awards.b2, awards.b3, total_b), b1_totals
+
+def report_allocation(allocation, national_total_participants, province_code_to_name, title, source_msg, output_filename):
+    """显示并保存一次分配结果。"""
     print(f"\n{'='*80}\n--- {title} ---\n{'='*80}")
 
     # 1. 计算全国总参赛人数
-    national_total_participants = sum(b1_participants_data.values())
     print(f"1. B1所用全国总人数{source_msg}: {national_total_participants}")
 
-    # 2. 计算B类名额
-    b1_quotas = {}
-    b2_quotas = defaultdict(int)
-    b3_quotas = defaultdict(int)
-    
-    # B1 计算
-    print(f"2. 计算 B1 ...")
-    for province_code, count in b1_participants_data.items():
-        b1_share = (count / national_total_participants) if national_total_participants else 0
-        b1_quotas[province_code] = S_TOTAL_B_QUOTAS * 0.5 * b1_share
-
-    # B2 计算 (使用非零分成绩: scores_data)
-    print(f"3. 计算 B2 ...")
-    all_representative_scores = [{'province_code': pc, 'score': sum(s[i:i+math.ceil(len(s)/K1_SEGMENTS)])/len(s[i:i+math.ceil(len(s)/K1_SEGMENTS)])} for pc, s in scores_data.items() for i in range(0,len(s),math.ceil(len(s)/K1_SEGMENTS)) if s]
-    all_representative_scores.sort(key=lambda x: x['score'], reverse=True)
-    b2_award_count = math.floor(S_TOTAL_B_QUOTAS * 0.3)
-    for item in all_representative_scores[:b2_award_count]:
-        b2_quotas[item['province_code']] += 1
-
-    # B3 计算 (使用非零分成绩: scores_data)
-    print(f"4. 计算 B3 ...")
-    all_excellent_scores = [{'province_code': pc, 'score': score} for pc, s in scores_data.items() for score in sorted(s, reverse=True)[:K2_TOP_SCORES]]
-    all_excellent_scores.sort(key=lambda x: x['score'], reverse=True)
-    b3_award_count = math.floor(S_TOTAL_B_QUOTAS * 0.2)
-    for item in all_excellent_scores[:b3_award_count]:
-        b3_quotas[item['province_code']] += 1
-        
-    # 3. 汇总与约束
-    print("5. 汇总与约束应用 ...")
+    # 2. 计算B类名额 (B1/B2/B3 与约束均由 quota_engine 向量化完成)
+    print("2. 计算 B1 / B2 / B3 并应用约束 ...")
+
+    with stage_profiler.stage('输出'):
+        # 3. 汇总
+        print("3. 汇总 ...")
+        result_df = build_result_table(allocation, province_code_to_name)
+
+        # 4. 显示和保存结果
+        print(result_df.to_string())
+        try:
+            save_result_table(result_df, output_filename)
+            print(f"\n计算结果已成功保存到: {output_filename}")
+        except Exception as e:
+            print(f"\n保存结果到CSV文件时出错: {e}")
+
+def build_result_table(allocation, province_code_to_name, a_quota=A_QUOTA_BASE):
+    """将一次分配结果整理为按省份代码排序的结果表。"""
+    import pandas as pd
+
+    index_of = {pc: i for i, pc in enumerate(allocation.province_codes)}
     final_results = []
-    for province_code in sorted(scores_data.keys()):
-        non_zero_participants = len(scores_data.get(province_code, []))
-        if non_zero_participants == 0:
-            continue
-
-        b1 = b1_quotas.get(province_code, 0)
-        b2 = b2_quotas.get(province_code, 0)
-        b3 = b3_quotas.get(province_code, 0)
-        
-        total_b = round(b1 + b2 + b3)
-        p_ratio_cap = math.floor(non_zero_participants * P_MAX_RATIO)
-        total_b = min(total_b, p_ratio_cap, MAX_B_QUOTAS_PER_PROVINCE)
-        
+    for province_code in sorted(allocation.province_codes):
+        i = index_of[province_code]
+        b1 = allocation.b1[i]
+        total_b = int(allocation.total_b[i])
         final_results.append({
             '省份': province_code_to_name.get(province_code, province_code),
-            'A类': A_QUOTA_BASE,
+            'A类': a_quota,
             'B1(计算)': f"{b1:.2f}",
-            'B2(计算)': b2,
-            'B3(计算)': b3,
+            'B2(计算)': int(allocation.b2[i]),
+            'B3(计算)': int(allocation.b3[i]),
             'B总名额(计算)': total_b,
-            '总名额': A_QUOTA_BASE + total_b
+            '总名额': a_quota + total_b
         })
-        
-    # 4. 显示和保存结果
-    result_df = pd.DataFrame(final_results)
-    print(result_df.to_string())
-    try:
-        result_df.to_csv(output_filename, index=False, encoding='utf-8-sig')
-        print(f"\n计算结果已成功保存到: {output_filename}")
-    except Exception as e:
-        print(f"\n保存结果到CSV文件时出错: {e}")
+    return pd.DataFrame(final_results)
 
-def calculate_quotas():
+def save_result_table(result_df, output_filename):
+    """先写入临时文件再原子替换，读取方不会看到写了一半的文件。"""
+    tmp_filename = f"{output_filename}.tmp"
+    result_df.to_csv(tmp_filename, index=False, encoding='utf-8-sig')
+    os.replace(tmp_filename, output_filename)
+
+def calculate_quotas(streaming=False, store_dir=None, exact=False, rounding=EXACT_ROUNDING, tie_break=EXACT_TIE_BREAK,
+                     dedupe=True):
     """
     主计算函数，协调三种不同的B1计算模式。
+    streaming=True 时使用流式读取 (适合超大成绩文件)，名额直接由各省的分数直方图计算；
+    dedupe=False 时流式读取不跨文件去重同一选手，内存只随省份数增长。
+    exact=True 时使用精确模式 (整数/整数比，取整方式 rounding，名额线同分处理 tie_break)。
+    store_dir 给定时，三种模式的结果另外作为一个批次追加到该列式结果目录 (见 result_store)。
     """
     province_code_to_name = load_province_mapping()
-    scores_data_non_zero = load_all_scores()
+    # 所有成绩文件只读取一次，非零分成绩与含零分的总人数都由这一次读取得出
+    if streaming:
+        histograms, participants_from_scores_with_zeros = load_score_data_streaming(dedupe=dedupe)
+        score_data = None
+        if histograms:
+            with stage_profiler.stage('成绩预处理'):
+                score_data = quota_engine.prepare_histograms(histograms)
+    else:
+        score_data, participants_from_scores_with_zeros = load_score_data()
 
-    if not scores_data_non_zero or not province_code_to_name:
+    if not score_data or not province_code_to_name:
         print("核心数据加载不完整，无法继续计算。" )
         return
     
-    # 模式1: 使用官方公布的参赛总人数
-    participants_from_file = load_province_participants_from_file()
-    if participants_from_file:
-        run_calculation(
-            b1_participants_data=participants_from_file,
-            scores_data=scores_data_non_zero,
-            province_code_to_name=province_code_to_name,
-            title="模式1: B1基于官方参赛总人数",
-            source_msg=" (来自participants文件)",
-            output_filename="noi2025_quotas_official_participants.csv"
-        )
+    # 三种模式只在 B1 所用的参赛人数上不同，B2/B3 的排名只计算一次
+    modes = []
+    for mode, title, source_msg, output_filename in B1_MODES:
+        b1_participants_data = load_b1_participants(mode, score_data, participants_from_scores_with_zeros)
+        if b1_participants_data:
+            modes.append((mode, b1_participants_data, title, source_msg, output_filename))
+    if not modes:
+        return
 
-    # 模式2: 使用测试成绩计算总人数 (含零分)
-    participants_from_scores_with_zeros = load_all_participants_from_scores()
-    if participants_from_scores_with_zeros:
-        run_calculation(
-            b1_participants_data=participants_from_scores_with_zeros,
-            scores_data=scores_data_non_zero,
-            province_code_to_name=province_code_to_name,
-            title="模式2: B1基于测试成绩总人数 (含零分)",
-            source_msg=" (来自成绩文件, 含零分)",
-            output_filename="noi2025_quotas_scores_with_zeros.csv"
-        )
-        
-    # 模式3: 使用测试成绩计算总人数 (不含零分)
-    participants_from_scores_no_zeros = {pc: len(s) for pc, s in scores_data_non_zero.items()}
-    if participants_from_scores_no_zeros:
-        run_calculation(
-            b1_participants_data=participants_from_scores_no_zeros,
-            scores_data=scores_data_non_zero,
-            province_code_to_name=province_code_to_name,
-            title="模式3: B1基于测试成绩总人数 (不含零分)",
-            source_msg=" (来自成绩文件, 非零分)",
-            output_filename="noi2025_quotas_scores_no_zeros.csv"
+    allocation, b1_totals = run_scenarios([m[1] for m in modes], score_data,
+                                          exact=exact, rounding=rounding, tie_break=tie_break)
+    for i, (_, _, title, source_msg, output_filename) in enumerate(modes):
+        scenario = allocation._replace(b1=allocation.b1[i], total_b=allocation.total_b[i])
+        report_allocation(scenario, b1_totals[i], province_code_to_name, title, source_msg, output_filename)
+
+    if store_dir:
+        import result_store
+
+        store_exact = (rounding, tie_break) if exact else None
+        non_zero = load_b1_participants('no_zeros', score_data, participants_from_scores_with_zeros)
+        non_zero = [non_zero[pc] for pc in allocation.province_codes]
+        columns = result_store.allocation_columns(
+            allocation, non_zero, S_TOTAL_B_QUOTAS, K1_SEGMENTS, K2_TOP_SCORES, P_MAX_RATIO,
+            MAX_B_QUOTAS_PER_PROVINCE, b1_mode=[m[0] for m in modes], exact=store_exact,
         )
+        batch = result_store.append_batch(columns, store_dir, exact=store_exact)
+        print(f"\n结果已追加到列式结果目录: {store_dir} ({batch.name}, {batch.rows} 行)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟计算NOI各省B类名额。")
+    parser.add_argument('--streaming', action='store_true',
+                        help="流式读取成绩文件，适合超大的全国成绩文件 (默认跨文件去重，内存随选手数增长，见 --no-dedupe)")
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help="与 --streaming 同时使用，不跨文件去重同一选手，内存只随省份数增长 (各成绩文件的选手须互不重复)")
+    parser.add_argument('--profile', nargs='?', const="noi2025_profile.json", default=None, metavar='REPORT',
+                        help="记录各阶段的耗时与内存，并将JSON报告写入 REPORT (默认 noi2025_profile.json)")
+    parser.add_argument('--profile-dump', default=None, metavar='DIR',
+                        help="与 --profile 同时使用，为每个阶段写出 cProfile/tracemalloc 数据到 DIR")
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help="与 --profile 同时使用，不启用 tracemalloc (开销更小，但不记录内存)")
+    parser.add_argument('--store', default=None, metavar='DIR',
+                        help="另外将结果 (精确的B1与整数名额) 追加到列式结果目录 DIR")
+    parser.add_argument('--exact', action='store_true',
+                        help="精确模式: 平均分比较与取整全部按整数/整数比，不受浮点误差影响")
+    parser.add_argument('--rounding', choices=quota_engine.ROUNDING_MODES, default=None,
+                        help=f"与 --exact 同时使用，B类总名额的取整方式 (默认 {EXACT_ROUNDING})")
+    parser.add_argument('--tie-break', choices=quota_engine.TIE_BREAKS, default=None,
+                        help=f"与 --exact 同时使用，名额线处同分的处理方式 (默认 {EXACT_TIE_BREAK})")
+    args = parser.parse_args(argv)
+    if not args.exact and (args.rounding is not None or args.tie_break is not None):
+        parser.error("--rounding 与 --tie-break 只能与 --exact 同时使用")
+    if args.no_dedupe and not args.streaming:
+        parser.error("--no-dedupe 只能与 --streaming 同时使用")
+    args.rounding = args.rounding or EXACT_ROUNDING
+    args.tie_break = args.tie_break or EXACT_TIE_BREAK
+    options = dict(streaming=args.streaming, dedupe=not args.no_dedupe, store_dir=args.store,
+                   exact=args.exact, rounding=args.rounding, tie_break=args.tie_break)
+    if args.profile is None and args.profile_dump is None:
+        calculate_quotas(**options)
+    else:
+        report_path = args.profile or "noi2025_profile.json"
+        with stage_profiler.profiling(args.profile_dump, trace_memory=not args.no_trace_memory) as profiler:
+            calculate_quotas(**options)
+        print(f"\n{'='*80}\n--- 各阶段耗时与内存 ---\n{'='*80}")
+        print(profiler.summary_table())
+        profiler.save_report(report_path)
+        print(f"\n分析报告已保存到: {report_path}")
 
 if __name__ == "__main__":
-    calculate_quotas()
\ No newline at end of file
+    main()
@@ -0,0 +1,338 @@
+import os
+import math
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import quota_engine
+import history_store
+import calculate_noi_quotas as calc
+from sweep_quotas import parse_values
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 默认搜索范围
+DEFAULT_S = "50:300:1"
+DEFAULT_K1 = "1:10:1"
+DEFAULT_K2 = "1:10:1"
+DEFAULT_P = "0.01:0.2:0.005"
+DEFAULT_MAX = "1:30:1"
+# 每个工作进程平均分到的任务块数
+CHUNKS_PER_WORKER = 4
+# 拟合结果 (各省残差) 输出文件
+OUTPUT_FILENAME = "noi2025_quotas_calibration.csv"
+# ==============================================================================
+
+# B1+B2+B3 的取整方式，只搜索 quota_engine 支持的方式 (见 quota_engine.round_ratio)，拟合结果都能由主程序复现
+ROUNDING_MODES = quota_engine.ROUNDING_MODES
+B1_MODE_NAMES = tuple(mode for mode, _, _, _ in calc.B1_MODES)
+
+# 搜索空间 (各项均为取值列表)
+SearchSpace = namedtuple('SearchSpace', ['s_values', 'k1_values', 'k2_values', 'p_values', 'max_values',
+                                         'rounding_modes', 'b1_modes'])
+
+# 一组拟合参数与其损失 (各省B类总名额残差绝对值之和)
+Fit = namedtuple('Fit', ['loss', 's_total', 'k1_segments', 'k2_top_scores', 'p_max_ratio', 'max_b_quotas',
+                         'rounding', 'b1_mode'])
+
+# 搜索统计: 各层被剪枝的节点数与实际求值的 (P, 上限) 网格数
+SearchStats = namedtuple('SearchStats', ['pruned_s', 'pruned_k1', 'pruned_k2', 'pruned_rounding', 'evaluated'])
+
+def load_target(filepath):
+    """
+    读取官方名额表，返回 {省份代码: 官方B类总名额}。
+    B类总名额取 'A+B类总名额' - 'A类名额'，也可以直接使用本项目输出的 'B总名额(计算)' 列。
+    """
+    name_to_code = {name: code for code, name in calc.load_province_mapping().items()}
+    target = {}
+    for province_code, row in history_store.load_official_table(filepath, name_to_code).items():
+        if 'A+B类总名额' in row and 'A类名额' in row:
+            target[province_code] = row['A+B类总名额'] - row['A类名额']
+        elif 'B总名额(计算)' in row:
+            target[province_code] = row['B总名额(计算)']
+    if not target:
+        raise ValueError(f"名额表 '{filepath}' 中没有可用的B类总名额 (需要 A+B类总名额 与 A类名额 两列)。")
+    return target
+
+def _rank_cumulative(values, owners, province_count):
+    """按全国排名 (同分保持原有顺序) 累计各省获得的名额: 第 r 行为前 r 名中各省的个数。"""
+    order = np.argsort(-values, kind='stable')
+    cumulative = np.zeros((len(values) + 1, province_count), dtype=np.int64)
+    cumulative[np.arange(1, len(values) + 1), owners[order]] = 1
+    return np.cumsum(cumulative, axis=0)
+
+class Calibrator:
+    """
+    用分支定界搜索最能复现官方名额表的参数。
+
+    B1 只依赖 S 与B1模式，B2 只依赖 (S, K1)，B3 只依赖 (S, K2)；P 与单省上限只会让名额变少。
+    因此对任意一层的部分参数，用其余参数下 B2/B3 的最大值与向上取整得到各省名额的上界，
+    官方名额超出上界的部分就是损失的下界，下界不小于当前最优解的分支直接剪掉。
+    每个 K1/K2 的全国排名只排序一次，任意 S 下的 B2/B3 由累计名额表直接查出。
+    取整与 P 比例上限和精确模式 (quota_engine.allocate_exact，同分按传入顺序) 一样按整数比计算。
+    """
+
+    def __init__(self, score_arrays, b1_sources, target, space):
+        self.space = space
+        board = quota_engine.prepare_scores(score_arrays)
+        self.province_codes = board.province_codes
+        province_count = len(board.province_codes)
+
+        # 不在成绩数据中的省份预测为0，其残差为常数
+        self.target = np.array([target.get(pc, 0) for pc in board.province_codes], dtype=np.int64)
+        self.in_target = np.array([pc in target for pc in board.province_codes])
+        self.missing_loss = sum(abs(v) for pc, v in target.items() if pc not in set(board.province_codes))
+
+        # 各B1模式的 (各省人数, 全国总人数)，B1 = S×人数 / (2×总人数)
+        self.b1_parts = {}
+        self.b1_shares = {}
+        for mode in space.b1_modes:
+            counts, total = quota_engine.align_participants(board, b1_sources[mode])
+            if total:
+                self.b1_parts[mode] = (counts, int(total))
+                self.b1_shares[mode] = counts / total
+
+        self.b2_tables = {}
+        for k1 in space.k1_values:
+            values, owners = quota_engine.segment_means(board, k1)
+            self.b2_tables[k1] = _rank_cumulative(values, owners, province_count)
+        self.b3_tables = {}
+        for k2 in space.k2_values:
+            values, owners = quota_engine.top_scores(board, k2)
+            self.b3_tables[k2] = _rank_cumulative(values, owners, province_count)
+
+        self.non_zero = board.counts
+        self.p_values = np.asarray(space.p_values, dtype=np.float64)
+        self.max_values = np.asarray(space.max_values, dtype=np.int64)
+        # 各 P 下的比例上限 (P数, 省份数)
+        self.p_caps = quota_engine.p_ratio_caps(board.counts[None, :], self.p_values[:, None])
+
+    @staticmethod
+    def _awarded(table, award_count):
+        return table[min(award_count, len(table) - 1)]
+
+    def b2(self, s_total, k1):
+        return self._awarded(self.b2_tables[k1], math.floor(s_total * 0.3))
+
+    def b3(self, s_total, k2):
+        return self._awarded(self.b3_tables[k2], math.floor(s_total * 0.2))
+
+    def _uncapped(self, s_total, mode, b23, rounding):
+        """按整数比 (S×人数 + 2×总人数×(B2+B3)) / (2×总人数) 取整的 B1+B2+B3。"""
+        counts, total = self.b1_parts[mode]
+        return quota_engine.round_ratio(s_total * counts + 2 * total * b23, 2 * total, rounding)
+
+    def _lower_bound(self, upper):
+        """各省名额上界为 upper 时的损失下界。"""
+        return int(np.maximum(self.target - upper, 0)[self.in_target].sum()) + self.missing_loss
+
+    def predict(self, fit):
+        """按一组参数计算 (B1, B2, B3, B类总名额)，各数组与 province_codes 对齐。"""
+        b1 = fit.s_total * 0.5 * self.b1_shares[fit.b1_mode]
+        b2 = self.b2(fit.s_total, fit.k1_segments)
+        b3 = self.b3(fit.s_total, fit.k2_top_scores)
+        uncapped = self._uncapped(fit.s_total, fit.b1_mode, b2 + b3, fit.rounding)
+        p_cap = quota_engine.p_ratio_caps(self.non_zero, fit.p_max_ratio)
+        return b1, b2, b3, np.minimum(np.minimum(uncapped, p_cap), fit.max_b_quotas)
+
+    def loss(self, fit):
+        total_b = self.predict(fit)[3]
+        return int(np.abs(total_b - self.target)[self.in_target].sum()) + self.missing_loss
+
+    def search(self, s_values, best=None):
+        """在给定的 S 取值上做分支定界，返回 (最优 Fit 或 None, SearchStats)。best 为已知的可行解。"""
+        best_loss = best.loss if best is not None else np.inf
+        best_fit = None
+        pruned = dict(s=0, k1=0, k2=0, rounding=0)
+        evaluated = 0
+        space = self.space
+
+        for s_total in s_values:
+            b2_max = np.max([self.b2(s_total, k1) for k1 in space.k1_values], axis=0)
+            b3_max = np.max([self.b3(s_total, k2) for k2 in space.k2_values], axis=0)
+            for mode, share in self.b1_shares.items():
+                b1 = s_total * 0.5 * share
+                if self._lower_bound(np.ceil(b1 + b2_max + b3_max)) >= best_loss:
+                    pruned['s'] += 1
+                    continue
+                for k1 in space.k1_values:
+                    b12 = b1 + self.b2(s_total, k1)
+                    if self._lower_bound(np.ceil(b12 + b3_max)) >= best_loss:
+                        pruned['k1'] += 1
+                        continue
+                    for k2 in space.k2_values:
+                        b3 = self.b3(s_total, k2)
+                        if self._lower_bound(np.ceil(b12 + b3)) >= best_loss:
+                            pruned['k2'] += 1
+                            continue
+                        b23 = self.b2(s_total, k1) + b3
+                        for rounding in space.rounding_modes:
+                            uncapped = self._uncapped(s_total, mode, b23, rounding)
+                            if self._lower_bound(uncapped) >= best_loss:
+                                pruned['rounding'] += 1
+                                continue
+                            # 一次求出所有 (P, 上限) 组合: (P数, 上限数, 省份数)
+                            capped = np.minimum(np.minimum(uncapped, self.p_caps)[:, None, :],
+                                                self.max_values[None, :, None])
+                            losses = np.abs(capped - self.target)[:, :, self.in_target].sum(axis=2)
+                            evaluated += losses.size
+                            i, j = np.unravel_index(np.argmin(losses), losses.shape)
+                            loss = int(losses[i, j]) + self.missing_loss
+                            if loss < best_loss:
+                                best_loss = loss
+                                best_fit = Fit(loss, int(s_total), int(k1), int(k2), float(self.p_values[i]),
+                                               int(self.max_values[j]), rounding, mode)
+
+        stats = SearchStats(pruned['s'], pruned['k1'], pruned['k2'], pruned['rounding'], evaluated)
+        return best_fit, stats
+
+def in_space(fit, space):
+    """fit 的各项参数是否都在搜索空间 space 内。"""
+    return (fit.s_total in space.s_values and fit.k1_segments in space.k1_values
+            and fit.k2_top_scores in space.k2_values and fit.p_max_ratio in space.p_values
+            and fit.max_b_quotas in space.max_values and fit.rounding in space.rounding_modes
+            and fit.b1_mode in space.b1_modes)
+
+# 工作进程中的 Calibrator
+_worker_state = {}
+
+def _init_worker(args):
+    _worker_state['calibrator'] = Calibrator(*args)
+
+def _search_chunk(task):
+    s_values, best = task
+    return _worker_state['calibrator'].search(s_values, best)
+
+def calibrate(score_arrays, b1_sources, target, space, workers=None):
+    """
+    并行搜索最优参数，返回 (最优 Fit, 合计的 SearchStats, Calibrator)；结果一定在搜索空间内。
+    当前默认参数落在搜索空间内时，先用它得到一个可行解作为各进程共同的初始上界，
+    否则从无上界开始搜索；再把 S 的取值分块交给各进程。
+    """
+    args = (score_arrays, b1_sources, target, space)
+    calibrator = Calibrator(*args)
+
+    initial = None
+    for mode in calibrator.b1_shares:
+        for rounding in space.rounding_modes:
+            fit = Fit(0, calc.S_TOTAL_B_QUOTAS, calc.K1_SEGMENTS, calc.K2_TOP_SCORES, calc.P_MAX_RATIO,
+                      calc.MAX_B_QUOTAS_PER_PROVINCE, rounding, mode)
+            if not in_space(fit, space):
+                continue
+            fit = fit._replace(loss=calibrator.loss(fit))
+            if initial is None or fit.loss < initial.loss:
+                initial = fit
+
+    workers = workers or os.cpu_count() or 1
+    # S 交错分块，使每块都覆盖整个取值范围，各进程的剪枝效果相近
+    chunk_count = max(1, min(len(space.s_values), workers * CHUNKS_PER_WORKER))
+    tasks = [(list(space.s_values[i::chunk_count]), initial) for i in range(chunk_count)]
+    if workers == 1:
+        results = [calibrator.search(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(args,)) as executor:
+            results = list(executor.map(_search_chunk, tasks))
+
+    best = initial
+    for fit, _ in results:
+        if fit is not None and (best is None or fit.loss < best.loss):
+            best = fit
+    stats = SearchStats(*(sum(values) for values in zip(*(s for _, s in results))))
+    return best, stats, calibrator
+
+def residual_table(calibrator, fit, target, province_code_to_name):
+    """各省官方名额、拟合名额与残差。"""
+    import pandas as pd
+
+    b1, b2, b3, total_b = calibrator.predict(fit)
+    index_of = {pc: i for i, pc in enumerate(calibrator.province_codes)}
+    rows = []
+    for province_code in sorted(set(target) | set(calibrator.province_codes)):
+        i = index_of.get(province_code)
+        fitted = int(total_b[i]) if i is not None else 0
+        official = target.get(province_code)
+        rows.append({
+            '省份': province_code_to_name.get(province_code, province_code),
+            'B1(拟合)': round(float(b1[i]), 2) if i is not None else None,
+            'B2(拟合)': int(b2[i]) if i is not None else None,
+            'B3(拟合)': int(b3[i]) if i is not None else None,
+            'B总名额(拟合)': fitted,
+            'B总名额(官方)': official,
+            '残差': None if official is None else fitted - official,
+        })
+    return pd.DataFrame(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="搜索最能复现官方名额表的参数 (分支定界 + 多进程)。")
+    parser.add_argument('--official', required=True,
+                        help="官方名额表 (需要 A+B类总名额 与 A类名额 两列，或 B总名额(计算) 列)")
+    parser.add_argument('--s', default=DEFAULT_S, help="S 的取值，如 '50:300:1'")
+    parser.add_argument('--k1', default=DEFAULT_K1, help="K1 的取值")
+    parser.add_argument('--k2', default=DEFAULT_K2, help="K2 的取值")
+    parser.add_argument('--p', default=DEFAULT_P, help="P 的取值")
+    parser.add_argument('--max', default=DEFAULT_MAX, help="单省B类名额上限的取值")
+    parser.add_argument('--rounding', default=','.join(ROUNDING_MODES),
+                        help=f"取整方式，逗号分隔 (可选: {', '.join(ROUNDING_MODES)})")
+    parser.add_argument('--b1-modes', default=','.join(B1_MODE_NAMES),
+                        help=f"B1 所用参赛人数来源，逗号分隔 (可选: {', '.join(B1_MODE_NAMES)})")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数 (默认使用全部CPU核心)")
+    parser.add_argument('--output', default=OUTPUT_FILENAME, help="各省残差输出文件")
+    args = parser.parse_args(argv)
+
+    def choices(text, allowed, name):
+        values = [v.strip() for v in text.split(',') if v.strip()]
+        unknown = set(values) - set(allowed)
+        if unknown or not values:
+            parser.error(f"{name} 的取值无效: {', '.join(sorted(unknown)) or text}")
+        return tuple(values)
+
+    def values(option, text, value_type=int, minimum=1, maximum=None):
+        try:
+            return parse_values(text, value_type, minimum, maximum)
+        except ValueError as e:
+            parser.error(f"{option}: {e}")
+
+    space = SearchSpace(
+        values('--s', args.s), values('--k1', args.k1), values('--k2', args.k2), values('--p', args.p, float, 0, 1),
+        values('--max', args.max, minimum=0), choices(args.rounding, ROUNDING_MODES, '--rounding'),
+        choices(args.b1_modes, B1_MODE_NAMES, '--b1-modes'),
+    )
+
+    province_code_to_name = calc.load_province_mapping()
+    score_arrays, participants_with_zeros = calc.load_score_data()
+    if not score_arrays:
+        print("核心数据加载不完整，无法继续计算。")
+        return
+    target = load_target(args.official)
+    b1_sources = {mode: calc.load_b1_participants(mode, score_arrays, participants_with_zeros)
+                  for mode in space.b1_modes}
+
+    combos = (len(space.s_values) * len(space.k1_values) * len(space.k2_values) * len(space.p_values)
+              * len(space.max_values) * len(space.rounding_modes) * len(space.b1_modes))
+    print(f"搜索空间共 {combos} 个参数组合，开始分支定界搜索 ...")
+    best, stats, calibrator = calibrate(score_arrays, b1_sources, target, space, args.workers)
+    if best is None:
+        print("没有找到可行的参数组合。")
+        return
+
+    print(f"剪枝: S层 {stats.pruned_s}，K1层 {stats.pruned_k1}，K2层 {stats.pruned_k2}，取整层 {stats.pruned_rounding}；"
+          f"实际求值 {stats.evaluated} 个组合 ({stats.evaluated / combos:.2%})")
+    print(f"\n最优参数 (残差绝对值之和 {best.loss}):")
+    for field in Fit._fields[1:]:
+        print(f"  {field} = {getattr(best, field)}")
+    print(f"复现: 将 calculate_noi_quotas.py 的参数设为 S={best.s_total}, K1={best.k1_segments}, "
+          f"K2={best.k2_top_scores}, P={best.p_max_ratio}, 单省上限={best.max_b_quotas}，运行\n"
+          f"  python calculate_noi_quotas.py --exact --rounding {best.rounding} --tie-break insertion\n"
+          f"  并查看B1模式 '{best.b1_mode}' 的结果表。")
+
+    table = residual_table(calibrator, best, target, province_code_to_name)
+    print(table.to_string())
+    try:
+        table.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n拟合结果已成功保存到: {args.output}")
+    except Exception as e:
+        print(f"\n保存结果到CSV文件时出错: {e}")
+
+if __name__ == "__main__":
+    main()
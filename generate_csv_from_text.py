@@ -1,6 +1,7 @@
 import csv
 import io
 import json
+import argparse
 
 # 原始纯文本数据
 raw_data_corrected = """
@@ -49,11 +50,11 @@ def load_province_mapping(filepath="province_mapping.json"):
         print(f"读取映射文件 '{filepath}' 出错: {e}")
         return {}
 
-def generate_csv(province_map, output_filename="noip2025_participants.csv"):
+def generate_csv(province_map, output_filename="noip2025_participants.csv", raw_text=raw_data_corrected):
     """
-    从内置的原始文本数据生成CSV文件，使用省份代码作为第一列。
+    从原始文本数据 (默认为内置的2025年数据) 生成CSV文件，使用省份代码作为第一列。
     """
-    data_file = io.StringIO(raw_data_corrected.strip())
+    data_file = io.StringIO(raw_text.strip())
     
     header_line = data_file.readline().strip().split()
     header_line[0] = '省份代码' # 修改表头
@@ -77,7 +78,19 @@ def generate_csv(province_map, output_filename="noip2025_participants.csv"):
         print(f"写入文件时出错: {e}")
         return False
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从原始文本生成各省参赛人数/名额CSV。")
+    parser.add_argument('--input', help="原始文本文件 (格式同内置数据，默认使用内置的2025年数据)")
+    parser.add_argument('--output', default="noip2025_participants.csv", help="输出CSV文件")
+    args = parser.parse_args(argv)
+
+    raw_text = raw_data_corrected
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            raw_text = f.read()
     province_mapping = load_province_mapping()
     if province_mapping:
-        generate_csv(province_mapping)
+        generate_csv(province_mapping, args.output, raw_text)
+
+if __name__ == "__main__":
+    main()
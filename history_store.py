@@ -0,0 +1,284 @@
+import os
+import csv
+import json
+import shutil
+import argparse
+from collections import namedtuple
+import numpy as np
+import score_cache
+import quota_engine
+import calculate_noi_quotas as calc
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 历史数据目录。每年一个子目录: scores.npy (所有省份的非零分成绩，按省份代码排序拼接、省内降序)
+# 与 index.json (各省在 scores.npy 中的位置、参赛人数与官方名额表)；各年规则统一保存在 rules.json，
+# 导入时没有给出规则的年份在其中记为 null (未设置规则)
+HISTORY_DIR = "history"
+SCORES_FILENAME = "scores.npy"
+INDEX_FILENAME = "index.json"
+RULES_FILENAME = "rules.json"
+# ==============================================================================
+
+# 某一年的名额规则
+YearRules = namedtuple(
+    'YearRules', ['s_total', 'k1_segments', 'k2_top_scores', 'p_max_ratio', 'max_b_quotas', 'a_quota'],
+    defaults=(calc.S_TOTAL_B_QUOTAS, calc.K1_SEGMENTS, calc.K2_TOP_SCORES, calc.P_MAX_RATIO,
+              calc.MAX_B_QUOTAS_PER_PROVINCE, calc.A_QUOTA_BASE)
+)
+
+# 从历史数据中读取的一年数据:
+# - scores: {省份代码: 非零分成绩 (降序，内存映射)}
+# - participants_with_zeros: 成绩文件中的总人数 (含零分)
+# - official_participants: 官方参赛人数 (B1 'official' 模式)
+# - official_quotas: {省份代码: 官方名额表的一行}
+YearData = namedtuple('YearData', ['year', 'scores', 'participants_with_zeros', 'official_participants', 'official_quotas'])
+
+# 名额表中的省份列与总数行
+PROVINCE_COLUMNS = ("省份代码", "省份")
+TOTAL_ROW_NAMES = ("TOTAL", "总数")
+
+def _year_dir(year, store_dir):
+    return os.path.join(store_dir, str(year))
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def load_official_table(filepath, name_to_code=None):
+    """读取官方名额表 (如 noip2025_participants.csv)，返回 {省份代码: {列名: 整数}}，跳过总数行。"""
+    name_to_code = name_to_code or {}
+    table = {}
+    with open(filepath, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        province_column = next((c for c in PROVINCE_COLUMNS if c in (reader.fieldnames or [])), None)
+        if province_column is None:
+            raise ValueError(f"名额表 '{filepath}' 缺少省份列 ({' / '.join(PROVINCE_COLUMNS)})。")
+        for row in reader:
+            province = row[province_column].strip()
+            if province in TOTAL_ROW_NAMES:
+                continue
+            table[name_to_code.get(province, province)] = {
+                k: int(v) for k, v in row.items() if k != province_column and v and v.strip().lstrip('-').isdigit()
+            }
+    return table
+
+def load_rules(store_dir=HISTORY_DIR):
+    """返回 {年份: YearRules}，已导入数据但未设置规则的年份对应 None。"""
+    path = os.path.join(store_dir, RULES_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {int(year): YearRules(**rules) if rules is not None else None for year, rules in json.load(f).items()}
+
+def save_rules(year, rules, store_dir=HISTORY_DIR):
+    """
+    保存某一年的规则 (没有成绩数据的年份也可以只有规则，如用于重放的新方案)。
+    rules 为 None 表示该年未设置规则。
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    all_rules = load_rules(store_dir)
+    all_rules[int(year)] = rules
+    _write_json(os.path.join(store_dir, RULES_FILENAME),
+                {str(y): r._asdict() if r is not None else None for y, r in sorted(all_rules.items())})
+
+def ingest_year(year, results_dir, participants_file=None, official_file=None, rules=None, store_dir=HISTORY_DIR):
+    """
+    将一年的成绩目录、官方参赛人数与官方名额表写入历史数据。同一年份重复导入时整体替换。
+    official_file 为含 'A+B类总名额' 等列的官方名额表，不给出时不保存官方名额。
+    rules 不给出时保留该年已有的规则；该年还没有规则时记为未设置 (不会用当前的默认参数代替)。
+    返回写入的省份数。
+    """
+    score_arrays, participants_with_zeros = calc.load_score_data(results_dir)
+    if not score_arrays:
+        raise ValueError(f"'{results_dir}' 中没有可用的成绩数据。")
+
+    official_participants = calc.load_province_participants_from_file(participants_file) if participants_file else {}
+    name_to_code = {name: code for code, name in calc.load_province_mapping().items()}
+    official_quotas = load_official_table(official_file, name_to_code) if official_file else {}
+
+    # 官方参赛人数中没有成绩文件的省份也要保存，B1 的全国总人数包含这些省份
+    provinces = sorted(set(participants_with_zeros) | set(score_arrays) | set(official_participants) | set(official_quotas))
+    arrays = []
+    index = {}
+    offset = 0
+    for province_code in provinces:
+        s = np.asarray(score_arrays.get(province_code, []), dtype=score_cache.SCORE_DTYPE)
+        s = -np.sort(-s, kind='stable')
+        arrays.append(s)
+        index[province_code] = {
+            'offset': offset,
+            'count': int(s.size),
+            'participants_with_zeros': int(participants_with_zeros.get(province_code, 0)),
+            'official_participants': official_participants.get(province_code),
+            'official_quotas': official_quotas.get(province_code),
+        }
+        offset += s.size
+
+    # 先写入临时目录再整体替换，读取方不会看到导入了一半的年份
+    year_dir = _year_dir(year, store_dir)
+    tmp_dir = f"{year_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, SCORES_FILENAME), np.concatenate(arrays))
+    _write_json(os.path.join(tmp_dir, INDEX_FILENAME), {
+        'year': int(year),
+        'sources': {'results_dir': results_dir, 'participants_file': participants_file, 'official_file': official_file},
+        'provinces': index,
+    })
+    shutil.rmtree(year_dir, ignore_errors=True)
+    os.replace(tmp_dir, year_dir)
+
+    if rules is not None or int(year) not in load_rules(store_dir):
+        save_rules(year, rules, store_dir)
+    return len(provinces)
+
+def list_years(store_dir=HISTORY_DIR):
+    """返回已导入成绩数据的年份 (升序)。"""
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(int(name) for name in os.listdir(store_dir)
+                  if name.isdigit() and os.path.exists(os.path.join(store_dir, name, INDEX_FILENAME)))
+
+def load_year(year, store_dir=HISTORY_DIR, provinces=None):
+    """读取一年的数据；成绩以内存映射方式打开，provinces 给定时只取这些省份。"""
+    year_dir = _year_dir(year, store_dir)
+    with open(os.path.join(year_dir, INDEX_FILENAME), 'r', encoding='utf-8') as f:
+        index = json.load(f)['provinces']
+    all_scores = np.load(os.path.join(year_dir, SCORES_FILENAME), mmap_mode='r')
+
+    selected = index if provinces is None else {pc: index[pc] for pc in provinces if pc in index}
+    scores = {pc: all_scores[e['offset']:e['offset'] + e['count']] for pc, e in selected.items() if e['count']}
+    return YearData(
+        year=int(year),
+        scores=scores,
+        participants_with_zeros={pc: e['participants_with_zeros'] for pc, e in selected.items()
+                                 if e['participants_with_zeros']},
+        official_participants={pc: e['official_participants'] for pc, e in selected.items()
+                               if e['official_participants'] is not None},
+        official_quotas={pc: e['official_quotas'] for pc, e in selected.items() if e['official_quotas']},
+    )
+
+def allocate_year(data, rules, mode='official'):
+    """在某一年的数据上按给定规则计算名额，返回 quota_engine.Allocation。"""
+    b1_participants_data = {
+        'official': data.official_participants,
+        'with_zeros': data.participants_with_zeros,
+        'no_zeros': {pc: s.size for pc, s in data.scores.items()},
+    }[mode]
+    if not b1_participants_data:
+        raise ValueError(f"{data.year} 年没有B1模式 '{mode}' 所需的参赛人数数据。")
+    board = quota_engine.prepare_scores(data.scores)
+    b1_counts, b1_total = quota_engine.align_participants(board, b1_participants_data)
+    return quota_engine.allocate(board, b1_counts, b1_total, rules.s_total, rules.k1_segments,
+                                 rules.k2_top_scores, rules.p_max_ratio, rules.max_b_quotas)
+
+def province_trajectory(province_code, store_dir=HISTORY_DIR, mode='official', rules_year=None):
+    """
+    某省历年的名额。默认每年使用当年的规则，rules_year 给定时所有年份统一使用该年的规则。
+    返回按年份排列的字典列表；所用年份未设置规则时不计算名额，'备注' 中注明。
+    """
+    all_rules = load_rules(store_dir)
+    trajectory = []
+    for year in list_years(store_dir):
+        used_year = rules_year if rules_year is not None else year
+        rules = all_rules.get(used_year)
+        data = load_year(year, store_dir)
+        row = {'年份': year, '规则年份': used_year}
+        if rules is None:
+            row['备注'] = f"{used_year} 年未设置规则"
+            allocation = None
+        else:
+            allocation = allocate_year(data, rules, mode)
+        if allocation is not None and province_code in allocation.province_codes:
+            i = allocation.province_codes.index(province_code)
+            total_b = int(allocation.total_b[i])
+            row.update({'B1': round(float(allocation.b1[i]), 2), 'B2': int(allocation.b2[i]),
+                        'B3': int(allocation.b3[i]), 'B总名额': total_b, '总名额': rules.a_quota + total_b})
+        official = data.official_quotas.get(province_code)
+        if official and 'A+B类总名额' in official:
+            row['官方总名额'] = official['A+B类总名额']
+        trajectory.append(row)
+    return trajectory
+
+def replay(data_year, rules_year, store_dir=HISTORY_DIR, mode='official'):
+    """用 rules_year 年的规则重放 data_year 年的数据，返回 (Allocation, 所用规则)。"""
+    all_rules = load_rules(store_dir)
+    if all_rules.get(rules_year) is None:
+        raise ValueError(f"没有 {rules_year} 年的规则，请先用 set-rules 保存。")
+    rules = all_rules[rules_year]
+    return allocate_year(load_year(data_year, store_dir), rules, mode), rules
+
+def _rules_from_args(args):
+    defaults = YearRules()
+    return YearRules(*(getattr(args, field) if getattr(args, field) is not None else getattr(defaults, field)
+                       for field in YearRules._fields))
+
+def _add_rules_arguments(parser):
+    parser.add_argument('--s', dest='s_total', type=int, help="B类总名额 S")
+    parser.add_argument('--k1', dest='k1_segments', type=int, help="B2 分段数 K1")
+    parser.add_argument('--k2', dest='k2_top_scores', type=int, help="B3 拔尖人数 K2")
+    parser.add_argument('--p', dest='p_max_ratio', type=float, help="B类名额占非零分人数的比例上限 P")
+    parser.add_argument('--max', dest='max_b_quotas', type=int, help="单省B类名额上限")
+    parser.add_argument('--a', dest='a_quota', type=int, help="A类名额")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多年成绩、参赛人数与官方名额表的历史数据。")
+    parser.add_argument('--store', default=HISTORY_DIR, help="历史数据目录")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="导入一年的数据")
+    ingest.add_argument('--year', type=int, required=True)
+    ingest.add_argument('--results-dir', required=True, help="该年的成绩目录")
+    ingest.add_argument('--participants', help="该年的官方参赛人数文件 (格式同 noip2025_participants.csv)")
+    ingest.add_argument('--official', help="该年的官方名额表 (含 A+B类总名额 列，不指定时不保存官方名额)")
+    _add_rules_arguments(ingest)
+
+    set_rules = commands.add_parser('set-rules', help="保存某一年的规则 (未指定的参数使用当前默认值)")
+    set_rules.add_argument('--year', type=int, required=True)
+    _add_rules_arguments(set_rules)
+
+    commands.add_parser('list', help="列出已导入的年份与规则")
+
+    trajectory = commands.add_parser('trajectory', help="某省历年的名额")
+    trajectory.add_argument('--province', required=True, help="省份代码")
+    trajectory.add_argument('--rules-year', type=int, help="所有年份统一使用该年的规则 (默认各用当年规则)")
+    trajectory.add_argument('--b1-mode', choices=('official', 'with_zeros', 'no_zeros'), default='official')
+
+    replay_parser = commands.add_parser('replay', help="用某一年的规则重放另一年的数据")
+    replay_parser.add_argument('--year', type=int, required=True, help="数据年份")
+    replay_parser.add_argument('--rules-year', type=int, required=True, help="规则年份")
+    replay_parser.add_argument('--b1-mode', choices=('official', 'with_zeros', 'no_zeros'), default='official')
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        has_rules = any(getattr(args, f) is not None for f in YearRules._fields)
+        count = ingest_year(args.year, args.results_dir, args.participants, args.official,
+                            _rules_from_args(args) if has_rules else None, args.store)
+        print(f"已导入 {args.year} 年的数据: {count} 个省份 -> {_year_dir(args.year, args.store)}")
+        if load_rules(args.store).get(args.year) is None:
+            print(f"{args.year} 年未设置规则，请用 set-rules 补充后再查询名额。")
+    elif args.command == 'set-rules':
+        rules = _rules_from_args(args)
+        save_rules(args.year, rules, args.store)
+        print(f"已保存 {args.year} 年的规则: {rules}")
+    elif args.command == 'list':
+        all_rules = load_rules(args.store)
+        years = list_years(args.store)
+        for year in sorted(set(years) | set(all_rules)):
+            rules = all_rules.get(year)
+            print(f"{year}: {'有数据' if year in years else '仅规则'}  {rules if rules is not None else '(未设置规则)'}")
+    elif args.command == 'trajectory':
+        import pandas as pd
+        rows = province_trajectory(args.province, args.store, args.b1_mode, args.rules_year)
+        print(pd.DataFrame(rows).to_string(index=False) if rows else "没有已导入的年份。")
+    else:
+        allocation, rules = replay(args.year, args.rules_year, args.store, args.b1_mode)
+        print(f"用 {args.rules_year} 年的规则重放 {args.year} 年的数据: {rules}")
+        print(calc.build_result_table(allocation, calc.load_province_mapping(), rules.a_quota).to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import math
+from bisect import insort
+from collections import Counter
+import numpy as np
+import quota_engine
+import calculate_noi_quotas as calc
+
+class IncrementalAllocator:
+    """
+    增量名额分配引擎。
+
+    保存每省的降序成绩、K1 段平均分和前 K2 名拔尖分，以及全国代表分/拔尖分的有序排名。
+    某省成绩变化时只替换该省的条目，B2/B3 的分数线由有序排名直接得出，不需要重建全部数据。
+    同分时按省份代码、省内顺序决定先后，与 load_score_data 按省份代码排序后全量计算的结果一致。
+    """
+
+    def __init__(self, s_total=calc.S_TOTAL_B_QUOTAS, k1_segments=calc.K1_SEGMENTS,
+                 k2_top_scores=calc.K2_TOP_SCORES, p_max_ratio=calc.P_MAX_RATIO,
+                 max_b_quotas=calc.MAX_B_QUOTAS_PER_PROVINCE):
+        self.s_total = s_total
+        self.k1_segments = k1_segments
+        self.k2_top_scores = k2_top_scores
+        self.p_max_ratio = p_max_ratio
+        self.max_b_quotas = max_b_quotas
+
+        self.scores = {}
+        self.segment_means = {}
+        self.top_scores = {}
+        # 全国排名，元素为 (-分数, 省份代码, 省内序号)，升序即分数降序
+        self._representatives = []
+        self._excellents = []
+
+    @property
+    def b2_award_count(self):
+        return math.floor(self.s_total * 0.3)
+
+    @property
+    def b3_award_count(self):
+        return math.floor(self.s_total * 0.2)
+
+    def remove_province(self, province_code):
+        """移除某省的全部成绩及其在全国排名中的条目。"""
+        if self.scores.pop(province_code, None) is None:
+            return
+        del self.segment_means[province_code]
+        del self.top_scores[province_code]
+        self._representatives = [e for e in self._representatives if e[1] != province_code]
+        self._excellents = [e for e in self._excellents if e[1] != province_code]
+
+    def set_province(self, province_code, scores):
+        """用新的非零分成绩替换某省的数据，只重新计算该省的代表分和拔尖分。"""
+        self.remove_province(province_code)
+        board = quota_engine.prepare_scores({province_code: scores})
+        if not board.province_codes:
+            return
+
+        means, _ = quota_engine.segment_means(board, self.k1_segments)
+        tops, _ = quota_engine.top_scores(board, self.k2_top_scores)
+        self.scores[province_code] = board.scores
+        self.segment_means[province_code] = means
+        self.top_scores[province_code] = tops
+        for j, value in enumerate(means.tolist()):
+            insort(self._representatives, (-value, province_code, j))
+        for j, value in enumerate(tops.tolist()):
+            insort(self._excellents, (-value, province_code, j))
+
+    def update(self, score_arrays):
+        """批量替换多个省份的成绩，score_arrays 为 {省份代码: 非零分成绩}。"""
+        for province_code, scores in score_arrays.items():
+            self.set_province(province_code, scores)
+
+    def cutoffs(self):
+        """返回 (B2 分数线, B3 分数线)，即全国排名中最后一个获得名额的分数；名额多于条目时为 None。"""
+        def cutoff(ranking, award_count):
+            if award_count == 0 or not ranking:
+                return None
+            return -ranking[min(award_count, len(ranking)) - 1][0]
+        return cutoff(self._representatives, self.b2_award_count), cutoff(self._excellents, self.b3_award_count)
+
+    def allocation(self, b1_participants_data):
+        """
+        按当前状态给出完整的分配结果 (quota_engine.Allocation，省份按代码排序)。
+        B1 只依赖参赛人数，可为不同的 b1_participants_data 反复调用而不影响 B2/B3 状态。
+        """
+        province_codes = sorted(self.scores)
+        b2_counts = Counter(e[1] for e in self._representatives[:self.b2_award_count])
+        b3_counts = Counter(e[1] for e in self._excellents[:self.b3_award_count])
+
+        b1_counts = np.array([b1_participants_data.get(pc, 0) for pc in province_codes], dtype=np.int64)
+        b1 = quota_engine.b1_quotas(b1_counts, sum(b1_participants_data.values()), self.s_total)
+        b2 = np.array([b2_counts[pc] for pc in province_codes], dtype=np.int64)
+        b3 = np.array([b3_counts[pc] for pc in province_codes], dtype=np.int64)
+        non_zero = np.array([self.scores[pc].size for pc in province_codes], dtype=np.int64)
+
+        total_b = quota_engine.apply_caps(b1, b2, b3, non_zero, self.p_max_ratio, self.max_b_quotas)
+        return quota_engine.Allocation(province_codes, b1, b2, b3, total_b)
@@ -0,0 +1,87 @@
+import time
+import argparse
+import numpy as np
+import quota_engine
+import calculate_noi_quotas as calc
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 临界分析结果输出文件
+OUTPUT_FILENAME = "noi2025_quota_margins.csv"
+# ==============================================================================
+
+def _cell(value, digits=None):
+    if np.isnan(value):
+        return None
+    return round(float(value), digits) if digits is not None else int(value)
+
+def build_margin_table(board, b2_margins, b3_margins, province_code_to_name):
+    """将 B2/B3 的临界分析整理为按省份代码排序的表格。"""
+    import pandas as pd
+
+    index_of = {pc: i for i, pc in enumerate(board.province_codes)}
+    rows = []
+    for province_code in sorted(board.province_codes):
+        i = index_of[province_code]
+        row = {'省份': province_code_to_name.get(province_code, province_code)}
+        for label, m, digits in (('B2', b2_margins, 2), ('B3', b3_margins, None)):
+            row.update({
+                f'{label}': int(m.awarded[i]),
+                f'{label}末位入选': _cell(m.last_in[i], digits),
+                f'{label}入选余量': _cell(m.keep_margin[i], digits),
+                f'{label}失去需降分': _cell(m.lose_points[i]),
+                f'{label}首位落选': _cell(m.first_out[i], digits),
+                f'{label}落选差距': _cell(m.gain_gap[i], digits),
+                f'{label}获得需加分': _cell(m.gain_points[i]),
+            })
+        rows.append(row)
+    table = pd.DataFrame(rows)
+    # 含空值的整数列保持整数显示
+    integer_columns = [c for c in table.columns if c.endswith('需降分') or c.endswith('需加分') or c.startswith('B3')]
+    return table.astype({c: 'Int64' for c in integer_columns})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="B2/B3 临界分析: 各省距名额线还差多少分。")
+    parser.add_argument('--s', type=int, default=calc.S_TOTAL_B_QUOTAS, help="B类名额总数 S")
+    parser.add_argument('--k1', type=int, default=calc.K1_SEGMENTS, help="B2 分段数 K1")
+    parser.add_argument('--k2', type=int, default=calc.K2_TOP_SCORES, help="B3 拔尖人数 K2")
+    parser.add_argument('--province', default=None, help="只显示一个省份 (省份代码或名称)")
+    parser.add_argument('--output', default=OUTPUT_FILENAME, help="结果输出文件")
+    args = parser.parse_args(argv)
+
+    province_code_to_name = calc.load_province_mapping()
+    score_arrays, _ = calc.load_score_data()
+    if not score_arrays:
+        print("核心数据加载不完整，无法继续计算。")
+        return
+
+    started = time.perf_counter()
+    board = quota_engine.prepare_scores(score_arrays)
+    b2_margins, b3_margins = quota_engine.rank_margins(board, args.s, args.k1, args.k2)
+    elapsed = time.perf_counter() - started
+    table = build_margin_table(board, b2_margins, b3_margins, province_code_to_name)
+
+    print(f"参数: S={args.s}, K1={args.k1}, K2={args.k2}")
+    print(f"B2 名额线: 最后入选代表分 {b2_margins.cutoff:.2f}，第一个落选代表分 {b2_margins.next_value:.2f}")
+    print(f"B3 名额线: 最后入选拔尖分 {b3_margins.cutoff:.0f}，第一个落选拔尖分 {b3_margins.next_value:.0f}")
+    print("失去需降分/获得需加分为该段选手总分的最少变化 (B3 即该选手的分数)，空白表示单个代表分的变化无法改变名额。")
+
+    shown = table
+    if args.province:
+        shown = table[(table['省份'] == args.province)
+                      | (table['省份'] == province_code_to_name.get(args.province, args.province))]
+        if shown.empty:
+            print(f"没有省份 '{args.province}' 的成绩数据。")
+            return
+    print(shown.to_string())
+    print(f"\n分析耗时 {elapsed * 1000:.1f} ms")
+
+    try:
+        calc.save_result_table(table, args.output)
+        print(f"临界分析结果已成功保存到: {args.output}")
+    except Exception as e:
+        print(f"保存结果到CSV文件时出错: {e}")
+
+if __name__ == "__main__":
+    main()
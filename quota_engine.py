@@ -0,0 +1,574 @@
+import math
+from fractions import Fraction
+from collections import namedtuple
+import numpy as np
+
+# 总分上限，直方图表示要求总分为 0~MAX_SCORE 的整数
+MAX_SCORE = 400
+
+# 精确模式 (allocate_exact) 的取整方式:
+# - half_up: 四舍五入 (官方规则)
+# - half_even: 四舍六入五成双 (与浮点引擎中 np.round 的行为一致)
+ROUNDING_MODES = ('half_up', 'half_even')
+# 精确模式中，名额线处同分代表的处理方式:
+# - province_code: 按省份代码的字母顺序，同省按分段顺序 (与省份的传入顺序无关)
+# - insertion: 按省份的传入顺序 (与浮点引擎一致)
+# - include_all: 与最后一个入选者同分的代表全部入选 (名额可能多于 floor(S×比例))
+# - exclude_all: 与第一个落选者同分的代表全部落选 (名额可能少于 floor(S×比例))
+TIE_BREAKS = ('province_code', 'insertion', 'include_all', 'exclude_all')
+# 精确模式中 P 按十进制写法取整数比 (分母为 P_SCALE)，P 最多可有 P_DECIMALS 位小数
+P_DECIMALS = 9
+P_SCALE = 10 ** P_DECIMALS
+
+# 预处理后的各省非零分成绩:
+# - province_codes: 省份代码列表 (保持传入顺序，B2/B3 同分时按此顺序决定先后)
+# - counts: 各省非零分人数
+# - offsets: 各省成绩在 scores 中的起始下标
+# - scores: 所有省份按省拼接、省内降序排列的成绩
+# - prefix: scores 的前缀和 (首位补0)，用于 O(1) 求任意分数段之和
+ScoreBoard = namedtuple('ScoreBoard', ['province_codes', 'counts', 'offsets', 'scores', 'prefix'])
+
+# 以分数直方图 (计数排序) 表示的各省非零分成绩，每省占用的空间与人数无关:
+# - province_codes / counts: 同 ScoreBoard
+# - histograms: (省份数, MAX_SCORE+1) 的人数矩阵，第 s 列为得 s 分的人数 (第0列恒为0)
+# - rank_counts: 从最高分往下的累计人数，第 j 列对应分数 MAX_SCORE-j
+# - rank_sums: 与 rank_counts 对应的累计总分
+# 直方图可以直接相加合并，单个选手的增删只需改动一个计数
+HistogramBoard = namedtuple('HistogramBoard', ['province_codes', 'counts', 'histograms', 'rank_counts', 'rank_sums'])
+
+# B2/B3 的全国排名结果，与 B1 所用的参赛人数无关，可被任意多个 B1 场景复用
+# - non_zero: 各省非零分人数 (P 比例约束的基数)
+RankAwards = namedtuple('RankAwards', ['province_codes', 'b2', 'b3', 'non_zero'])
+
+# 一项 (B2 或 B3) 全国排名的临界分析，各数组与 province_codes 对齐，不适用处为 NaN:
+# - awarded: 各省获得的名额数
+# - cutoff / next_value: 全国最后一个入选、第一个落选的代表分
+# - last_in / first_out: 本省最低的入选代表分、最高的落选代表分
+# - keep_margin: 本省最低入选代表分高出它需要守住的对手代表分的分数 (代表分单位)
+# - gain_gap: 本省最高落选代表分距它需要超过的对手代表分的分数 (代表分单位)
+# - lose_points / gain_points: 失去一个名额所需的最少降分、获得一个名额所需的最少加分 (该段总分，整数)
+RankMargins = namedtuple('RankMargins', ['awarded', 'cutoff', 'next_value', 'last_in', 'first_out',
+                                         'keep_margin', 'gain_gap', 'lose_points', 'gain_points'])
+
+# 一次名额分配的结果，所有数组都与 province_codes 对齐
+# (allocate_scenarios 返回的 b1/total_b 为 (场景数, 省份数) 矩阵)
+Allocation = namedtuple('Allocation', ['province_codes', 'b1', 'b2', 'b3', 'total_b'])
+
+def prepare_scores(scores_data):
+    """
+    将 {省份代码: 非零分成绩} 预处理为 ScoreBoard。
+    各省成绩按降序排列 (已降序的输入不会重新排序)，没有非零分成绩的省份被忽略。
+    """
+    province_codes = []
+    arrays = []
+    for province_code, s in scores_data.items():
+        s = np.asarray(s, dtype=np.int64)
+        if s.size == 0:
+            continue
+        if s.size > 1 and not np.all(s[:-1] >= s[1:]):
+            s = -np.sort(-s, kind='stable')
+        province_codes.append(province_code)
+        arrays.append(s)
+
+    counts = np.array([s.size for s in arrays], dtype=np.int64)
+    offsets = np.zeros(len(arrays), dtype=np.int64)
+    if len(arrays) > 1:
+        offsets[1:] = np.cumsum(counts)[:-1]
+    scores = np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+    prefix = np.concatenate(([0], np.cumsum(scores)))
+    return ScoreBoard(province_codes, counts, offsets, scores, prefix)
+
+def histograms_from_scores(scores_data, max_score=MAX_SCORE):
+    """将 {省份代码: 成绩} 按计数排序转换为 {省份代码: 长度为 max_score+1 的分数直方图}。"""
+    histograms = {}
+    for province_code, s in scores_data.items():
+        s = np.asarray(s, dtype=np.int64)
+        if s.size and (s.min() < 0 or s.max() > max_score):
+            raise ValueError(f"省份 '{province_code}' 存在超出 0~{max_score} 的总分，无法使用直方图表示。")
+        histograms[province_code] = np.bincount(s, minlength=max_score + 1)
+    return histograms
+
+def prepare_histograms(histogram_data):
+    """
+    将 {省份代码: 分数直方图} 预处理为 HistogramBoard。
+    直方图可来自 histograms_from_scores 或流式读取 (calculate_noi_quotas.load_score_data_streaming)，
+    其中的零分计数会被忽略；没有非零分成绩的省份被忽略。
+    """
+    province_codes = []
+    rows = []
+    for province_code, hist in histogram_data.items():
+        hist = np.array(hist, dtype=np.int64)
+        hist[0] = 0
+        if not hist.any():
+            continue
+        province_codes.append(province_code)
+        rows.append(hist)
+
+    width = rows[0].size if rows else MAX_SCORE + 1
+    histograms = np.array(rows, dtype=np.int64).reshape(len(rows), width)
+    descending = histograms[:, ::-1]
+    rank_counts = np.cumsum(descending, axis=1)
+    rank_sums = np.cumsum(descending * np.arange(width - 1, -1, -1), axis=1)
+    return HistogramBoard(province_codes, rank_counts[:, -1].copy(), histograms, rank_counts, rank_sums)
+
+def as_board(scores_data):
+    """已经预处理好的 ScoreBoard/HistogramBoard 原样返回，{省份代码: 非零分成绩} 交给 prepare_scores。"""
+    if isinstance(scores_data, (ScoreBoard, HistogramBoard)):
+        return scores_data
+    return prepare_scores(scores_data)
+
+def align_participants(board, participants_data):
+    """
+    将 {省份代码: 参赛人数} 对齐到 board 的省份顺序。
+    返回 (对齐后的人数数组, 全国总人数)；全国总人数包含不在 board 中的省份。
+    """
+    counts = np.array([participants_data.get(pc, 0) for pc in board.province_codes], dtype=np.int64)
+    return counts, sum(participants_data.values())
+
+def segment_means(board, k1_segments):
+    """
+    计算 B2 的代表分: 每省按 ceil(n/K1) 人一段切分降序成绩，取各段平均分。
+    返回 (代表分, 所属省份下标)，按省份顺序、省内分段顺序排列。
+    """
+    sums, lengths, owners = segment_sums(board, k1_segments)
+    return sums / lengths, owners
+
+def segment_sums(board, k1_segments):
+    """segment_means 的整数形式: 返回 (各段总分, 各段人数, 所属省份下标)，顺序与 segment_means 相同。"""
+    n = board.counts
+    seg = -(-n // k1_segments)
+    starts = np.arange(k1_segments)[None, :] * seg[:, None]
+    valid = starts < n[:, None]
+    ends = np.minimum(starts + seg[:, None], n[:, None])
+
+    base = board.offsets[:, None]
+    sums = board.prefix[(base + ends)[valid]] - board.prefix[(base + starts)[valid]]
+    lengths = (ends - starts)[valid]
+    owners = np.broadcast_to(np.arange(len(n))[:, None], valid.shape)[valid]
+    return sums, lengths, owners
+
+def top_scores(board, k2_top_scores):
+    """
+    取 B3 的拔尖分: 每省降序成绩中的前 K2 个。
+    返回 (拔尖分, 所属省份下标)，按省份顺序、省内降序排列。
+    """
+    ranks = np.arange(k2_top_scores)[None, :]
+    valid = ranks < board.counts[:, None]
+    values = board.scores[(board.offsets[:, None] + ranks)[valid]]
+    owners = np.broadcast_to(np.arange(len(board.counts))[:, None], valid.shape)[valid]
+    return values, owners
+
+def _histogram_top_sums(board, ranks):
+    """
+    由累计人数/累计总分求每省前 ranks 名的总分 (ranks 形状为 (省份数, m)，整数运算，结果精确)。
+    第 r 名所在的分数列为累计人数首次达到 r 的列，该列中排在 r 名之后的人数从累计总分中扣除。
+    """
+    province_count, width = board.histograms.shape
+    # 各行加上递增的偏移后整体单调，一次 searchsorted 即可完成所有省份的查找
+    row_offsets = np.arange(province_count)[:, None] * (int(board.counts.max(initial=0)) + 1)
+    flat = (board.rank_counts + row_offsets).ravel()
+    columns = np.searchsorted(flat, ranks + row_offsets) - np.arange(province_count)[:, None] * width
+    columns = np.minimum(columns, width - 1)
+    values = width - 1 - columns
+    surplus = np.take_along_axis(board.rank_counts, columns, axis=1) - ranks
+    sums = np.take_along_axis(board.rank_sums, columns, axis=1) - surplus * values
+    return np.where(ranks > 0, sums, 0), values
+
+def histogram_segment_means(board, k1_segments):
+    """segment_means 的直方图版本，返回值 (包括浮点结果) 与 segment_means 完全一致。"""
+    sums, lengths, owners = histogram_segment_sums(board, k1_segments)
+    return sums / lengths, owners
+
+def histogram_segment_sums(board, k1_segments):
+    """segment_sums 的直方图版本。"""
+    n = board.counts
+    seg = -(-n // k1_segments)
+    starts = np.arange(k1_segments)[None, :] * seg[:, None]
+    valid = starts < n[:, None]
+    ends = np.minimum(starts + seg[:, None], n[:, None])
+    starts = np.minimum(starts, n[:, None])
+
+    end_sums, _ = _histogram_top_sums(board, ends)
+    start_sums, _ = _histogram_top_sums(board, starts)
+    sums = (end_sums - start_sums)[valid]
+    lengths = (ends - starts)[valid]
+    owners = np.broadcast_to(np.arange(len(n))[:, None], valid.shape)[valid]
+    return sums, lengths, owners
+
+def histogram_top_scores(board, k2_top_scores):
+    """top_scores 的直方图版本: 第 j 个拔尖分即累计人数首次超过 j 的分数。"""
+    ranks = np.broadcast_to(np.arange(1, k2_top_scores + 1)[None, :], (len(board.counts), k2_top_scores))
+    valid = ranks <= board.counts[:, None]
+    _, values = _histogram_top_sums(board, ranks)
+    owners = np.broadcast_to(np.arange(len(board.counts))[:, None], valid.shape)[valid]
+    return values[valid], owners
+
+def award_by_rank(values, owners, award_count, province_count):
+    """
+    全国统一排名 (同分时保持原有顺序)，取前 award_count 个，统计各省获得的名额数。
+    """
+    order = np.argsort(-values, kind='stable')[:award_count]
+    return np.bincount(owners[order], minlength=province_count)
+
+def b1_quotas(b1_counts, b1_total, s_total):
+    """B1 = S × 50% × (各省人数 / 全国总人数)。"""
+    b1_share = b1_counts / b1_total if b1_total else np.zeros(len(b1_counts))
+    return s_total * 0.5 * b1_share
+
+def apply_caps(b1, b2, b3, non_zero, p_max_ratio, max_b_quotas):
+    """B类总名额 = round(B1+B2+B3)，再受非零分人数 × P 与单省上限约束。"""
+    total_b = np.round(b1 + b2 + b3).astype(np.int64)
+    p_ratio_cap = np.floor(non_zero * p_max_ratio).astype(np.int64)
+    return np.minimum(np.minimum(total_b, p_ratio_cap), max_b_quotas)
+
+def rank_awards(board, s_total, k1_segments, k2_top_scores):
+    """
+    在 board (ScoreBoard 或 HistogramBoard，两者结果完全一致) 上完成 B2/B3 的全国排名。
+    结果与 B1 无关，多个 B1 场景只需计算一次。
+    """
+    province_count = len(board.province_codes)
+    if isinstance(board, HistogramBoard):
+        segment_means_of, top_scores_of = histogram_segment_means, histogram_top_scores
+    else:
+        segment_means_of, top_scores_of = segment_means, top_scores
+
+    rep_scores, rep_owners = segment_means_of(board, k1_segments)
+    b2 = award_by_rank(rep_scores, rep_owners, math.floor(s_total * 0.3), province_count)
+
+    top_values, top_owners = top_scores_of(board, k2_top_scores)
+    b3 = award_by_rank(top_values, top_owners, math.floor(s_total * 0.2), province_count)
+
+    return RankAwards(board.province_codes, b2, b3, board.counts)
+
+def award_margins(sums, lengths, owners, award_count, province_count, max_score=MAX_SCORE):
+    """
+    在一次全国排名上直接求各省距名额线的余量，不重新分配。代表分为 sums / lengths
+    (B3 的 lengths 全为1)，同分时按原有顺序决定先后，与 award_by_rank 一致。
+    - 失去名额: 本省最低的入选代表分需降到被第一个落选者超过；第一个落选者若是本省自己的，
+      它会补上空出的名额，单个代表分的变化无法让本省失去名额
+    - 获得名额: 本省最高的落选代表分需超过最后一个入选者；最后一个入选者若是本省自己的，
+      被挤掉的正是本省的名额，单个代表分的变化无法让本省多得名额
+    需要的分数按整数总分精确计算 (加分默认落在该段选手身上、不改变省内排序)，
+    超过该段满分的加分、降到负分才会失去的名额视为不会发生 (NaN)。
+    """
+    sums = np.asarray(sums, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    values = sums / lengths
+    order = np.argsort(-values, kind='stable')
+    award_count = min(award_count, len(order))
+    awarded_idx, excluded_idx = order[:award_count], order[award_count:]
+    awarded = np.bincount(owners[awarded_idx], minlength=province_count)
+
+    def nan_array():
+        return np.full(province_count, np.nan)
+
+    # 各省最低的入选代表 (入选部分中排名最靠后的) 与最高的落选代表
+    last_in_rank = np.full(province_count, -1)
+    np.maximum.at(last_in_rank, owners[awarded_idx], np.arange(award_count))
+    first_out_rank = np.full(province_count, len(order))
+    np.minimum.at(first_out_rank, owners[excluded_idx], np.arange(award_count, len(order)))
+    has_in = last_in_rank >= 0
+    has_out = first_out_rank < len(order)
+    # 在末尾补一个占位下标，没有入选/落选代表的省份取到占位值 (只在 has_in/has_out 为真处使用)
+    padded = np.append(order, -1)
+    last_in_idx = padded[last_in_rank]
+    first_out_idx = padded[first_out_rank]
+
+    cutoff, next_value = np.nan, np.nan
+    last_in, first_out = nan_array(), nan_array()
+    keep_margin, gain_gap = nan_array(), nan_array()
+    lose_points, gain_points = nan_array(), nan_array()
+
+    last_in[has_in] = values[last_in_idx[has_in]]
+    first_out[has_out] = values[first_out_idx[has_out]]
+
+    if award_count < len(order):
+        # 失去名额: 被第一个落选者超过
+        rival = excluded_idx[0]
+        next_value = values[rival]
+        mine = has_in & (np.arange(province_count) != owners[rival])
+        r = last_in_idx[mine]
+        keep_margin[mine] = values[r] - values[rival]
+        threshold = sums[rival] * lengths[r]
+        # 降分后的总分 x 满足 x * len_rival < threshold (同分时对手在前则 <= 亦可)
+        highest = np.where(rival < r, threshold // lengths[rival], -(-threshold // lengths[rival]) - 1)
+        lose_points[mine] = np.where(highest >= 0, (sums[r] - highest).astype(np.float64), np.nan)
+
+    if award_count > 0:
+        # 获得名额: 超过最后一个入选者
+        rival = awarded_idx[-1]
+        cutoff = values[rival]
+        mine = has_out & (np.arange(province_count) != owners[rival])
+        r = first_out_idx[mine]
+        gain_gap[mine] = values[rival] - values[r]
+        threshold = sums[rival] * lengths[r]
+        # 加分后的总分 x 满足 x * len_rival > threshold (同分时本省在前则 >= 亦可)
+        lowest = np.where(r < rival, -(-threshold // lengths[rival]), threshold // lengths[rival] + 1)
+        needed = (lowest - sums[r]).astype(np.float64)
+        gain_points[mine] = np.where(lowest <= max_score * lengths[r], needed, np.nan)
+
+    return RankMargins(awarded, cutoff, next_value, last_in, first_out, keep_margin, gain_gap,
+                       lose_points, gain_points)
+
+def rank_margins(board, s_total, k1_segments, k2_top_scores):
+    """在 board 上求 B2、B3 两项排名的临界分析，返回 (B2 的 RankMargins, B3 的 RankMargins)。"""
+    province_count = len(board.province_codes)
+    if isinstance(board, HistogramBoard):
+        segment_sums_of, top_scores_of = histogram_segment_sums, histogram_top_scores
+    else:
+        segment_sums_of, top_scores_of = segment_sums, top_scores
+
+    sums, lengths, owners = segment_sums_of(board, k1_segments)
+    b2 = award_margins(sums, lengths, owners, math.floor(s_total * 0.3), province_count)
+
+    top_values, top_owners = top_scores_of(board, k2_top_scores)
+    b3 = award_margins(top_values, np.ones(len(top_values), dtype=np.int64), top_owners,
+                       math.floor(s_total * 0.2), province_count)
+    return b2, b3
+
+def allocate(board, b1_counts, b1_total, s_total, k1_segments, k2_top_scores, p_max_ratio, max_b_quotas):
+    """
+    在预处理好的 board 上执行一次完整的 B1/B2/B3 名额分配与约束。
+    b1_counts/b1_total 由 align_participants 得到。
+    """
+    awards = rank_awards(board, s_total, k1_segments, k2_top_scores)
+    b1 = b1_quotas(b1_counts, b1_total, s_total)
+    total_b = apply_caps(b1, awards.b2, awards.b3, awards.non_zero, p_max_ratio, max_b_quotas)
+    return Allocation(board.province_codes, b1, awards.b2, awards.b3, total_b)
+
+def align_scenarios(board, scenarios):
+    """
+    将多个 {省份代码: 参赛人数} 场景对齐到 board 的省份顺序。
+    返回 ((场景数, 省份数) 的人数矩阵, 各场景的全国总人数)。人数可以是预测得到的小数。
+    """
+    aligned = [align_participants(board, participants_data) for participants_data in scenarios]
+    if not aligned:
+        return np.zeros((0, len(board.province_codes))), np.zeros(0)
+    return np.stack([counts for counts, _ in aligned]), np.array([total for _, total in aligned])
+
+def allocate_scenarios(awards, b1_counts, b1_totals, s_total, p_max_ratio, max_b_quotas):
+    """
+    在一次 rank_awards 的结果上批量套用多个 B1 场景，每个场景只剩 B1 与约束的向量运算。
+    - b1_counts/b1_totals: (场景数, 省份数) 的人数矩阵与各场景全国总人数 (由 align_scenarios 得到)
+    - p_max_ratio/max_b_quotas: 标量，或长度为场景数的数组 (每个场景各自的约束)
+    返回 Allocation，其中 b1/total_b 为 (场景数, 省份数) 矩阵，b2/b3 为所有场景共享的一维数组。
+    每一行与对同一场景调用 allocate 的结果完全一致。
+    """
+    b1 = b1_scenarios(b1_counts, b1_totals, s_total)
+    total_b = cap_scenarios(awards, b1, p_max_ratio, max_b_quotas)
+    return Allocation(awards.province_codes, b1, awards.b2, awards.b3, total_b)
+
+def b1_scenarios(b1_counts, b1_totals, s_total):
+    """b1_quotas 的多场景版本，返回 (场景数, 省份数) 的 B1 矩阵。"""
+    b1_counts = np.atleast_2d(b1_counts)
+    b1_totals = np.asarray(b1_totals).reshape(-1, 1)
+    b1_share = np.divide(b1_counts, b1_totals, out=np.zeros(b1_counts.shape), where=b1_totals != 0)
+    return s_total * 0.5 * b1_share
+
+def cap_scenarios(awards, b1, p_max_ratio, max_b_quotas):
+    """apply_caps 的多场景版本，约束参数可为标量或长度为场景数的数组。"""
+    p_max_ratio = np.asarray(p_max_ratio).reshape(-1, 1) if np.ndim(p_max_ratio) else p_max_ratio
+    max_b_quotas = np.asarray(max_b_quotas).reshape(-1, 1) if np.ndim(max_b_quotas) else max_b_quotas
+    return apply_caps(b1, awards.b2, awards.b3, awards.non_zero, p_max_ratio, max_b_quotas)
+
+def round_ratio(numerators, denominators, rounding='half_up'):
+    """对整数比 numerators / denominators (分母为正) 按 rounding 取整，全程整数运算。"""
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"未知的取整方式: {rounding} (可选: {', '.join(ROUNDING_MODES)})")
+    if rounding == 'half_up':
+        # floor(n/d + 1/2) = floor((2n + d) / 2d)
+        return (2 * numerators + denominators) // (2 * denominators)
+    quotient, remainder = np.divmod(numerators, denominators)
+    twice = 2 * remainder
+    return quotient + ((twice > denominators) | ((twice == denominators) & (quotient % 2 == 1)))
+
+def _exact_order(sums, lengths, tie_keys):
+    """
+    按代表分 sums / lengths 精确地降序排列，同分按 (tie_keys, 原有顺序)；tie_keys 为 None 时只按原有顺序。
+    lengths 为 None 表示代表分就是整数 sums (B3)。
+    两个不等的整数比 a/b、c/d 至少相差 1/(bd)，而浮点除法的误差不超过商的 2^-53 倍，
+    所以只要 最大分母² × 最大代表分 < 2^52，浮点商的大小关系与整数比完全一致 (相等的整数比的商也必然相同)，
+    直接按浮点值排序即可；超出这一范围时 (极端情况) 退回 Fraction 排序。
+    """
+    values = sums if lengths is None else sums / lengths
+    if lengths is not None and values.size and float(lengths.max()) ** 2 * np.abs(values).max() >= 2.0 ** 52:
+        ties = np.zeros(len(sums), dtype=np.int64) if tie_keys is None else tie_keys
+        keys = [(-Fraction(int(a), int(b)), int(t), i) for i, (a, b, t) in enumerate(zip(sums, lengths, ties))]
+        return np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int64)
+    if tie_keys is None:
+        return np.argsort(-values, kind='stable')
+    return np.lexsort((tie_keys, -values))
+
+def exact_award_by_rank(sums, lengths, owners, award_count, province_count, province_rank=None,
+                        tie_break='province_code'):
+    """
+    award_by_rank 的精确版本: 代表分为整数比 sums / lengths (lengths 为 None 时为整数 sums)，比较结果不受浮点误差影响。
+    同分时按 province_rank[所属省份] 再按原有顺序排列 (province_rank 为 None 时只按原有顺序)，
+    名额线处的同分再按 tie_break 处理 (见 TIE_BREAKS)。
+    """
+    if tie_break not in TIE_BREAKS:
+        raise ValueError(f"未知的同分处理方式: {tie_break} (可选: {', '.join(TIE_BREAKS)})")
+    sums = np.asarray(sums, dtype=np.int64)
+    lengths = None if lengths is None else np.asarray(lengths, dtype=np.int64)
+    tie_keys = None if province_rank is None else province_rank[owners]
+    order = _exact_order(sums, lengths, tie_keys)
+    award_count = min(award_count, len(order))
+
+    if tie_break in ('include_all', 'exclude_all') and 0 < award_count < len(order):
+        # 只在名额线处用整数交叉相乘判断同分: 与最后一个入选者同分的代表在排列中连续
+        cut = order[award_count - 1]
+        ranked = sums[order]
+        if lengths is None:
+            same = ranked == sums[cut]
+        else:
+            same = ranked * lengths[cut] == sums[cut] * lengths[order]
+        if same[award_count]:
+            tied = np.flatnonzero(same)
+            award_count = int(tied[-1]) + 1 if tie_break == 'include_all' else int(tied[0])
+    return np.bincount(owners[order[:award_count]], minlength=province_count)
+
+def _province_rank(board, tie_break):
+    """同分时各省的先后 (越小越靠前)；与原有顺序一致时返回 None (代表按省份、省内顺序排列)。"""
+    if tie_break == 'insertion':
+        return None
+    codes = list(board.province_codes)
+    if codes == sorted(codes):
+        return None
+    rank = {pc: r for r, pc in enumerate(sorted(codes))}
+    return np.array([rank[pc] for pc in codes], dtype=np.int64)
+
+def exact_rank_awards(board, s_total, k1_segments, k2_top_scores, tie_break='province_code'):
+    """rank_awards 的精确版本，B2 的分段平均分以整数比比较，名额数 floor(S×30%)、floor(S×20%) 以整数计算。"""
+    province_count = len(board.province_codes)
+    if isinstance(board, HistogramBoard):
+        segment_sums_of, top_scores_of = histogram_segment_sums, histogram_top_scores
+    else:
+        segment_sums_of, top_scores_of = segment_sums, top_scores
+    province_rank = _province_rank(board, tie_break)
+
+    sums, lengths, owners = segment_sums_of(board, k1_segments)
+    b2 = exact_award_by_rank(sums, lengths, owners, s_total * 3 // 10, province_count, province_rank, tie_break)
+
+    top_values, top_owners = top_scores_of(board, k2_top_scores)
+    b3 = exact_award_by_rank(top_values, None, top_owners, s_total * 2 // 10, province_count, province_rank, tie_break)
+    return RankAwards(board.province_codes, b2, b3, board.counts)
+
+def _ratio_parts(p_max_ratio):
+    """
+    把 P (可为数组) 按其十进制写法转换为以 P_SCALE 为分母的整数分子，如 0.29 -> 29×10^7。
+    P 的最短十进制写法不超过 P_DECIMALS 位小数时，四舍五入得到的分子除以 P_SCALE 恰好回到 P，
+    反之亦然，因此回到 P 即说明分子精确。
+    """
+    if np.ndim(p_max_ratio):
+        p_max_ratio = np.asarray(p_max_ratio, dtype=np.float64)
+        numerators = np.rint(p_max_ratio * P_SCALE)
+        exact = np.array_equal(numerators / P_SCALE, p_max_ratio)
+        numerators = numerators.astype(np.int64)
+    else:
+        p_max_ratio = float(p_max_ratio)
+        numerators = round(p_max_ratio * P_SCALE)
+        exact = numerators / P_SCALE == p_max_ratio
+    if not exact:
+        raise ValueError(f"精确模式要求 P 最多有 {P_DECIMALS} 位小数。")
+    return numerators
+
+def p_ratio_caps(non_zero, p_max_ratio):
+    """精确的 P 比例上限 floor(非零分人数 × P)，P 按其十进制写法取整数比；两者按 numpy 规则广播。"""
+    return np.asarray(non_zero, dtype=np.int64) * _ratio_parts(p_max_ratio) // P_SCALE
+
+def _as_integers(values):
+    if not np.ndim(values):
+        if values != int(values):
+            raise ValueError("精确模式要求 B1 所用的参赛人数为整数。")
+        return int(values)
+    values = np.asarray(values)
+    integers = values.astype(np.int64)
+    if values.dtype.kind not in 'iu' and not np.array_equal(integers, values):
+        raise ValueError("精确模式要求 B1 所用的参赛人数为整数。")
+    return integers
+
+def exact_total_b(awards, b1_counts, b1_totals, s_total, p_max_ratio, max_b_quotas, rounding='half_up'):
+    """
+    精确计算B类总名额: B1+B2+B3 = (S×n + 2N×(B2+B3)) / 2N 按 rounding 取整，
+    P 比例上限为 floor(非零分人数 × P)，P 按其十进制写法精确计算 (如 0.29 即 29/100)。
+    b1_counts 可为一维或 (场景数, 省份数)，b1_totals 为对应的全国总人数 (须为整数)；
+    p_max_ratio/max_b_quotas 可为标量或每个场景各自的取值。
+    """
+    counts = _as_integers(b1_counts)
+    totals = _as_integers(b1_totals)
+    if counts.ndim == 2:
+        totals = totals.reshape(-1, 1)
+        if np.ndim(p_max_ratio):
+            p_max_ratio = np.asarray(p_max_ratio).reshape(-1, 1)
+        if np.ndim(max_b_quotas):
+            max_b_quotas = np.asarray(max_b_quotas).reshape(-1, 1)
+
+    # 全国总人数为0时各省人数也都为0，分母取1即得 B1 = 0
+    denominators = np.maximum(2 * totals, 1)
+    total_b = round_ratio(s_total * counts + denominators * (awards.b2 + awards.b3), denominators, rounding)
+    total_b = np.minimum(total_b, p_ratio_caps(awards.non_zero, p_max_ratio))
+    return np.minimum(total_b, max_b_quotas)
+
+def allocate_exact(board, b1_counts, b1_total, s_total, k1_segments, k2_top_scores, p_max_ratio, max_b_quotas,
+                   rounding='half_up', tie_break='province_code'):
+    """
+    allocate 的精确版本: 比较与取整全部使用整数/整数比，取整方式与名额线处的同分处理可配置。
+    返回的 b1 为便于显示的浮点值 (与 allocate 相同)，total_b 由精确的整数比得出。
+    """
+    awards = exact_rank_awards(board, s_total, k1_segments, k2_top_scores, tie_break)
+    b1 = b1_quotas(b1_counts, b1_total, s_total)
+    total_b = exact_total_b(awards, b1_counts, b1_total, s_total, p_max_ratio, max_b_quotas, rounding)
+    return Allocation(board.province_codes, b1, awards.b2, awards.b3, total_b)
+
+def _batched_segment_means(roster, nonzero, k1_segments):
+    """对一个省份的 (试验数, 人数) 降序成绩矩阵，按各试验的非零分人数计算 K1 段平均分 (无效段为 -inf)。"""
+    prefix = np.zeros((roster.shape[0], roster.shape[1] + 1), dtype=np.int64)
+    np.cumsum(roster, axis=1, out=prefix[:, 1:])
+    seg = -(-nonzero // k1_segments)
+    starts = np.arange(k1_segments)[None, :] * seg[:, None]
+    valid = starts < nonzero[:, None]
+    ends = np.minimum(starts + seg[:, None], nonzero[:, None])
+    starts = np.minimum(starts, nonzero[:, None])
+    sums = np.take_along_axis(prefix, ends, axis=1) - np.take_along_axis(prefix, starts, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / (ends - starts)
+    return np.where(valid, means, -np.inf)
+
+def _batched_award(values, owners, award_count, province_count):
+    """逐试验做全国统一排名 (同分保持原有顺序)，返回 (试验数, 省份数) 的获奖名额矩阵。"""
+    trials = values.shape[0]
+    order = np.argsort(-values, axis=1, kind='stable')[:, :award_count]
+    awarded = np.isfinite(np.take_along_axis(values, order, axis=1))
+    flat = (np.arange(trials)[:, None] * province_count + owners[order])[awarded]
+    return np.bincount(flat, minlength=trials * province_count).reshape(trials, province_count)
+
+def allocate_rosters(rosters, b1_counts, b1_total, s_total, k1_segments, k2_top_scores, p_max_ratio, max_b_quotas):
+    """
+    批量版本的 allocate: rosters 为各省的 (试验数, 人数) 成绩矩阵 (每行降序，零分排在末尾)，
+    一次完成所有试验的 B2/B3 排名与约束。
+    返回 (b1, b2, b3, total_b)，其中 b2/b3/total_b 为 (试验数, 省份数) 矩阵。
+    """
+    province_count = len(rosters)
+    nonzero = np.stack([np.count_nonzero(r, axis=1) for r in rosters], axis=1)
+
+    b1 = b1_quotas(b1_counts, b1_total, s_total)
+
+    rep_scores = np.concatenate(
+        [_batched_segment_means(r, nonzero[:, i], k1_segments) for i, r in enumerate(rosters)], axis=1
+    )
+    rep_owners = np.repeat(np.arange(province_count), k1_segments)
+    b2 = _batched_award(rep_scores, rep_owners, math.floor(s_total * 0.3), province_count)
+
+    top_values = []
+    for i, r in enumerate(rosters):
+        top = np.full((r.shape[0], k2_top_scores), -np.inf)
+        width = min(k2_top_scores, r.shape[1])
+        top[:, :width] = r[:, :width]
+        top[np.arange(k2_top_scores)[None, :] >= nonzero[:, i:i + 1]] = -np.inf
+        top_values.append(top)
+    top_owners = np.repeat(np.arange(province_count), k2_top_scores)
+    b3 = _batched_award(np.concatenate(top_values, axis=1), top_owners, math.floor(s_total * 0.2), province_count)
+
+    total_b = apply_caps(b1, b2, b3, nonzero, p_max_ratio, max_b_quotas)
+
+    return b1, b2, b3, total_b
@@ -0,0 +1,277 @@
+import os
+import json
+import shutil
+import argparse
+from collections import namedtuple
+import numpy as np
+import quota_engine
+import calculate_noi_quotas as calc
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 列式结果目录。manifest.json 记录列类型、字典与批次列表；每个批次一个子目录，每列一个 .npy 文件
+# (可内存映射，零拷贝读取)，压缩的批次则为一个 .npz 文件 (读取时整体解压)
+RESULTS_STORE_DIR = "results_store"
+MANIFEST_FILENAME = "manifest.json"
+FORMAT_VERSION = 1
+# ==============================================================================
+
+# 结果表的列与存储类型。每个参数组合 (场景) 的每个省份一行；
+# province/b1_mode 以字典编码存储 (存的是 manifest 中字典的下标)，读取时可还原为省份代码/模式名
+RESULT_SCHEMA = (
+    ('scenario', 'int32'),          # 场景编号，在整个结果目录中唯一
+    ('province', 'uint16'),         # 省份代码 (字典编码)
+    ('b1_mode', 'uint8'),           # B1 所用参赛人数来源 (字典编码)
+    ('s_total', 'int32'),
+    ('k1_segments', 'int16'),
+    ('k2_top_scores', 'int16'),
+    ('p_max_ratio', 'float64'),
+    ('max_b_quotas', 'int16'),
+    ('b1', 'float64'),              # 精确的 B1 (CSV 中只保留两位小数)
+    ('b2', 'int16'),
+    ('b3', 'int16'),
+    ('p_ratio_cap', 'int32'),       # 非零分人数 × P 向下取整
+    ('total_b', 'int16'),
+)
+RESULT_COLUMNS = tuple(name for name, _ in RESULT_SCHEMA)
+DICTIONARY_COLUMNS = ('province', 'b1_mode')
+
+# 结果目录中的一个批次。engine 为计算所用的引擎 ('float' 或 'exact')，精确模式下另记录取整方式与同分处理；
+# 旧版本写入的批次没有这三项，按浮点引擎读取
+Batch = namedtuple('Batch', ['name', 'rows', 'scenarios', 'compressed', 'engine', 'rounding', 'tie_break'],
+                   defaults=('float', None, None))
+
+def _manifest_path(store_dir):
+    return os.path.join(store_dir, MANIFEST_FILENAME)
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def load_manifest(store_dir=RESULTS_STORE_DIR):
+    """读取结果目录的 manifest；目录不存在时返回一个空的 manifest。"""
+    path = _manifest_path(store_dir)
+    if not os.path.exists(path):
+        return {
+            'format_version': FORMAT_VERSION,
+            'schema': [list(item) for item in RESULT_SCHEMA],
+            'dictionaries': {'province': [], 'b1_mode': [mode for mode, _, _, _ in calc.B1_MODES]},
+            'batches': [],
+        }
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"结果目录 '{store_dir}' 的格式版本 {manifest.get('format_version')} 不受支持。")
+    return manifest
+
+def list_batches(store_dir=RESULTS_STORE_DIR):
+    return [Batch(**b) for b in load_manifest(store_dir)['batches']]
+
+def allocation_columns(allocation, non_zero, s_total, k1_segments, k2_top_scores, p_max_ratio, max_b_quotas,
+                       b1_mode='official', exact=None):
+    """
+    将一次或多个场景的 quota_engine.Allocation (各数组为一维，或 (场景数, 省份数) 矩阵；b2/b3 可为所有场景共享的一维数组)
+    展开为一个批次的列。non_zero 为与 province_codes 对齐的非零分人数；
+    其余参数可为标量或每个场景各自的取值。exact 为 (取整方式, 同分处理) 时，P比例上限与精确模式一样按整数比计算。
+    """
+    b1 = np.atleast_2d(allocation.b1)
+    total_b = np.atleast_2d(allocation.total_b)
+    scenario_count, province_count = b1.shape
+
+    def per_scenario(value):
+        return np.broadcast_to(np.asarray(value), (scenario_count,))
+
+    def per_row(value):
+        return np.repeat(per_scenario(value), province_count)
+
+    p_max_ratio = per_scenario(p_max_ratio)
+    if exact:
+        p_ratio_cap = quota_engine.p_ratio_caps(np.asarray(non_zero)[None, :], p_max_ratio[:, None])
+    else:
+        p_ratio_cap = np.floor(np.asarray(non_zero)[None, :] * p_max_ratio[:, None]).astype(np.int64)
+    return {
+        'scenario': np.repeat(np.arange(scenario_count), province_count),
+        'province': np.tile(np.asarray(allocation.province_codes, dtype=str), scenario_count),
+        'b1_mode': per_row(b1_mode),
+        's_total': per_row(s_total),
+        'k1_segments': per_row(k1_segments),
+        'k2_top_scores': per_row(k2_top_scores),
+        'p_max_ratio': np.repeat(p_max_ratio, province_count),
+        'max_b_quotas': per_row(max_b_quotas),
+        'b1': b1.ravel(),
+        'b2': np.broadcast_to(np.atleast_2d(allocation.b2), b1.shape).ravel(),
+        'b3': np.broadcast_to(np.atleast_2d(allocation.b3), b1.shape).ravel(),
+        'p_ratio_cap': p_ratio_cap.ravel(),
+        'total_b': total_b.ravel(),
+    }
+
+def _encode(columns, manifest):
+    """检查列并转换为存储类型；省份/模式按字典编码 (新出现的省份追加到字典末尾)。"""
+    missing = set(RESULT_COLUMNS) - set(columns)
+    unknown = set(columns) - set(RESULT_COLUMNS)
+    if missing or unknown:
+        raise ValueError(f"批次的列与结果表不符: 缺少 {sorted(missing)}，多余 {sorted(unknown)}")
+    rows = len(columns['scenario'])
+
+    encoded = {}
+    for name, dtype in RESULT_SCHEMA:
+        values = np.asarray(columns[name])
+        if values.shape != (rows,):
+            raise ValueError(f"列 '{name}' 的长度 {values.shape} 与行数 {rows} 不符。")
+        if name in DICTIONARY_COLUMNS:
+            dictionary = manifest['dictionaries'][name]
+            uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+            uniques = [str(u) for u in uniques]
+            if name == 'b1_mode' and not set(uniques) <= set(dictionary):
+                raise ValueError(f"未知的B1模式: {sorted(set(uniques) - set(dictionary))}")
+            position = {v: i for i, v in enumerate(dictionary)}
+            for value in uniques:
+                if value not in position:
+                    position[value] = len(dictionary)
+                    dictionary.append(value)
+            values = np.array([position[v] for v in uniques], dtype=np.int64)[inverse.ravel()]
+        stored = values.astype(dtype)
+        if np.issubdtype(np.dtype(dtype), np.integer) and not np.array_equal(stored, values):
+            raise ValueError(f"列 '{name}' 的取值超出存储类型 {dtype} 的范围或不是整数。")
+        encoded[name] = stored
+    return encoded, rows
+
+def append_batch(columns, store_dir=RESULTS_STORE_DIR, compress=False, exact=None):
+    """
+    将一个批次 (由 allocation_columns 得到，或列名与 RESULT_SCHEMA 相同的数组字典) 追加到结果目录。
+    exact 为计算所用的 (取整方式, 同分处理)，浮点引擎为 None，记录在批次信息中。
+    批次内的场景编号会加上目录中已有的场景数，使其全局唯一。返回写入的 Batch。
+    先写入临时位置再改名，最后更新 manifest；读取方只会看到完整的批次。
+    """
+    manifest = load_manifest(store_dir)
+    encoded, rows = _encode(columns, manifest)
+    scenario_offset = sum(b['scenarios'] for b in manifest['batches'])
+    scenarios = int(encoded['scenario'].max()) + 1 if rows else 0
+    encoded['scenario'] = encoded['scenario'] + scenario_offset
+
+    os.makedirs(store_dir, exist_ok=True)
+    name = f"batch_{len(manifest['batches']):05d}"
+    if compress:
+        path = os.path.join(store_dir, f"{name}.npz")
+        with open(f"{path}.tmp", 'wb') as f:
+            np.savez_compressed(f, **encoded)
+        os.replace(f"{path}.tmp", path)
+    else:
+        path = os.path.join(store_dir, name)
+        tmp_dir = f"{path}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for column, values in encoded.items():
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), values)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_dir, path)
+
+    rounding, tie_break = exact if exact else (None, None)
+    batch = Batch(name, rows, scenarios, compress, 'exact' if exact else 'float', rounding, tie_break)
+    manifest['batches'].append(batch._asdict())
+    _write_json(_manifest_path(store_dir), manifest)
+    return batch
+
+def _load_batch(store_dir, batch, columns):
+    if batch.compressed:
+        with np.load(os.path.join(store_dir, f"{batch.name}.npz")) as archive:
+            return {c: archive[c] for c in columns}
+    return {c: np.load(os.path.join(store_dir, batch.name, f"{c}.npy"), mmap_mode='r') for c in columns}
+
+def _decode(arrays, manifest):
+    for name in DICTIONARY_COLUMNS:
+        if name in arrays:
+            arrays[name] = np.asarray(manifest['dictionaries'][name], dtype=object)[arrays[name]]
+    return arrays
+
+def iter_batches(store_dir=RESULTS_STORE_DIR, columns=None, decode=False):
+    """
+    逐批次读取结果，产出 {列名: 数组}。未压缩的批次以内存映射方式打开 (零拷贝)；
+    decode=True 时将省份/模式还原为字符串 (会产生拷贝)。
+    """
+    manifest = load_manifest(store_dir)
+    columns = list(columns or RESULT_COLUMNS)
+    for batch in manifest['batches']:
+        arrays = _load_batch(store_dir, Batch(**batch), columns)
+        yield _decode(arrays, manifest) if decode else arrays
+
+def read_columns(store_dir=RESULTS_STORE_DIR, columns=None, decode=False):
+    """读取整个结果目录的若干列。只有一个未压缩批次时直接返回内存映射数组，否则拼接各批次。"""
+    manifest = load_manifest(store_dir)
+    columns = list(columns or RESULT_COLUMNS)
+    batches = [Batch(**b) for b in manifest['batches']]
+    if len(batches) == 1:
+        arrays = _load_batch(store_dir, batches[0], columns)
+    else:
+        parts = [_load_batch(store_dir, batch, columns) for batch in batches]
+        arrays = {c: np.concatenate([p[c] for p in parts]) if parts else np.zeros(0, dtype=dict(RESULT_SCHEMA)[c])
+                  for c in columns}
+    return _decode(arrays, manifest) if decode else arrays
+
+def to_frame(store_dir=RESULTS_STORE_DIR, columns=None):
+    """以 pandas.DataFrame 读取结果 (省份/模式为字符串)。"""
+    import pandas as pd
+
+    return pd.DataFrame(read_columns(store_dir, columns, decode=True))
+
+def scenario_allocation(store_dir, scenario):
+    """取出一个场景，返回 (quota_engine.Allocation, 该场景的参数行)。"""
+    arrays = read_columns(store_dir, decode=True)
+    rows = np.flatnonzero(arrays['scenario'] == scenario)
+    if not rows.size:
+        raise ValueError(f"结果目录 '{store_dir}' 中没有场景 {scenario}。")
+    allocation = quota_engine.Allocation(
+        list(arrays['province'][rows]), np.asarray(arrays['b1'][rows]), np.asarray(arrays['b2'][rows]),
+        np.asarray(arrays['b3'][rows]), np.asarray(arrays['total_b'][rows]),
+    )
+    params = {c: arrays[c][rows[0]] for c in ('b1_mode', 's_total', 'k1_segments', 'k2_top_scores',
+                                               'p_max_ratio', 'max_b_quotas')}
+    return allocation, params
+
+def export_csv(output_filename, store_dir=RESULTS_STORE_DIR, scenario=None):
+    """
+    导出CSV视图: 默认导出所有行 (整洁格式，精确的 B1)；
+    指定 scenario 时导出该场景与 calculate_noi_quotas 输出相同格式的结果表。返回导出的行数。
+    """
+    if scenario is None:
+        table = to_frame(store_dir)
+    else:
+        allocation, _ = scenario_allocation(store_dir, scenario)
+        table = calc.build_result_table(allocation, calc.load_province_mapping())
+    calc.save_result_table(table, output_filename)
+    return len(table)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="列式名额结果目录: 查看与导出CSV。")
+    parser.add_argument('--store', default=RESULTS_STORE_DIR, help="结果目录")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('info', help="列出批次与行数")
+
+    p = subparsers.add_parser('export', help="导出CSV")
+    p.add_argument('--output', required=True, help="输出CSV文件")
+    p.add_argument('--scenario', type=int, default=None, help="只导出一个场景 (与主程序的结果表格式相同)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        manifest = load_manifest(args.store)
+        batches = [Batch(**b) for b in manifest['batches']]
+        if not batches:
+            print(f"结果目录 '{args.store}' 中没有数据。")
+            return
+        for batch in batches:
+            kind = "压缩" if batch.compressed else "内存映射"
+            engine = f"精确模式, {batch.rounding}, {batch.tie_break}" if batch.engine == 'exact' else "浮点模式"
+            print(f"{batch.name}: {batch.rows} 行，{batch.scenarios} 个场景 ({kind}，{engine})")
+        print(f"共 {sum(b.rows for b in batches)} 行，{sum(b.scenarios for b in batches)} 个场景，"
+              f"{len(manifest['dictionaries']['province'])} 个省份")
+    elif args.command == 'export':
+        rows = export_csv(args.output, args.store, args.scenario)
+        print(f"已导出 {rows} 行到: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import os
+import csv
+import json
+import codecs
+import hashlib
+from collections import namedtuple
+import numpy as np
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 缓存目录 (与 results/ 同级)
+CACHE_DIR = ".score_cache"
+# 缓存清单文件名，记录每个CSV的大小、修改时间与内容哈希
+MANIFEST_FILENAME = "manifest.json"
+# 计算内容哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 1 << 20
+
+# 成绩文件各规范列在不同表头方言 (中文/英文) 中的列名，按优先级排列
+USER_COLUMN_NAMES = ('用户', '用户名', 'User', 'Username')
+SCORE_COLUMN_NAMES = ('总分数', '总分', 'Total Score', 'Score', 'score')
+# 识别表头时最多读取的字节数，只需要包含完整的表头行
+SNIFF_BYTES = 1 << 16
+# 候选的分隔符
+DELIMITERS = (',', '\t', ';', '|')
+# 字节顺序标记 (BOM) 与对应的编码；没有 BOM 时先尝试 UTF-8，再尝试 GB18030 (中文 Windows 导出的文件)
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+FALLBACK_ENCODINGS = ('utf-8', 'gb18030')
+# 用户ID哈希 (64位 FNV-1a) 的参数
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
+# 总分上限，总分为 0~MAX_SCORE 的整数，用 int16 存储即可
+MAX_SCORE = 400
+SCORE_DTYPE = np.int16
+# ==============================================================================
+
+def cache_dir_for(results_dir):
+    """返回与成绩目录同级的缓存目录路径。"""
+    return os.path.join(os.path.dirname(os.path.normpath(results_dir)), CACHE_DIR)
+
+def file_digest(filepath):
+    """计算文件内容的 SHA-256 哈希。"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 由文件开头识别出的成绩文件格式: 编码、分隔符，以及表头中原样的用户列与总分列名
+ScoreFileFormat = namedtuple('ScoreFileFormat', ['encoding', 'delimiter', 'user_column', 'score_column'])
+
+def detect_dialect(columns):
+    """根据表头判断成绩文件的方言，返回 (用户列下标, 总分列下标)；无法识别时返回 None。"""
+    names = [str(c).strip().lstrip('\ufeff') for c in columns]
+    user_index = next((names.index(c) for c in USER_COLUMN_NAMES if c in names), None)
+    score_index = next((names.index(c) for c in SCORE_COLUMN_NAMES if c in names), None)
+    if user_index is None or score_index is None:
+        return None
+    return user_index, score_index
+
+def _decode_head(head):
+    for bom, encoding in BOM_ENCODINGS:
+        if head.startswith(bom):
+            # 解码器会自行去掉 BOM；文件截断处不完整的字符直接忽略
+            return head.decode(encoding, errors='ignore'), encoding
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return head.decode(encoding), encoding
+        except UnicodeDecodeError as e:
+            # 截断处可能切断一个多字节字符，只要错误出现在末尾附近就仍然可用
+            if e.start >= len(head) - 4:
+                return head[:e.start].decode(encoding), encoding
+    return None, None
+
+def sniff_score_file(filepath):
+    """
+    只读取文件开头的若干字节，识别编码 (BOM)、分隔符与表头方言，返回 ScoreFileFormat；
+    无法识别时返回 None。
+    """
+    with open(filepath, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    text, encoding = _decode_head(head)
+    if not text:
+        return None
+    header_line = text.splitlines()[0] if text.splitlines() else ''
+
+    # 依次尝试各分隔符，取第一个能识别出用户列与总分列的
+    for delimiter in DELIMITERS:
+        if delimiter not in header_line:
+            continue
+        columns = next(csv.reader([header_line], delimiter=delimiter))
+        dialect = detect_dialect(columns)
+        if dialect is not None:
+            return ScoreFileFormat(encoding, delimiter, columns[dialect[0]], columns[dialect[1]])
+    return None
+
+def checked_scores(values, filepath):
+    """
+    将一列总分转换为 int16，转换前检查每个值都是 0~MAX_SCORE 的整数 (空白、小数、越界均报错)，
+    批量读取与流式读取对同一文件给出相同的结果。
+    """
+    import pandas as pd
+
+    scores = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    if not np.all(np.isfinite(scores)) or not np.array_equal(scores, np.floor(scores)):
+        raise ValueError(f"成绩文件 '{filepath}' 中存在空白或非整数的总分。")
+    if (scores < 0).any() or (scores > MAX_SCORE).any():
+        raise ValueError(f"成绩文件 '{filepath}' 中存在超出 0~{MAX_SCORE} 的总分。")
+    return scores.astype(SCORE_DTYPE)
+
+def parse_score_file(filepath):
+    """
+    解析单个成绩文件，只读取用户列和总分列。
+    返回 (users, scores) 两个 numpy 数组 (用户为ASCII字节串，分数为int16)；无法识别表头时返回 None。
+    文件格式由 sniff_score_file 从文件开头识别，只有缓存未命中时才需要解析CSV，pandas 在此时才导入。
+    """
+    import pandas as pd
+
+    file_format = sniff_score_file(filepath)
+    if file_format is None:
+        print(f"警告: 无法识别成绩文件 '{filepath}' 的表头，已跳过。")
+        return None
+
+    user_col, score_col = file_format.user_column, file_format.score_column
+    df = pd.read_csv(filepath, sep=file_format.delimiter, encoding=file_format.encoding,
+                     usecols=[user_col, score_col], dtype={user_col: str})
+    df = df[df[user_col].notna()]
+    users = df[user_col].str.strip().str.encode('utf-8').to_numpy(dtype=bytes)
+    scores = checked_scores(df[score_col], filepath)
+    return users, scores
+
+def hash_users(users):
+    """
+    用户ID (定长字节串数组) 的64位 FNV-1a 哈希，逐字节向量化计算。
+    定长数组末尾补齐的零字节不参与计算，同一用户ID在不同宽度的数组中哈希相同。
+    """
+    width = users.dtype.itemsize
+    raw = np.ascontiguousarray(users).view(np.uint8).reshape(len(users), width)
+    hashes = np.full(len(users), _FNV_OFFSET, dtype=np.uint64)
+    for j in range(width):
+        column = raw[:, j]
+        if column.all():
+            hashes ^= column
+            hashes *= _FNV_PRIME
+        else:
+            padded = column == 0
+            hashes = np.where(padded, hashes, (hashes ^ column) * _FNV_PRIME)
+    return hashes
+
+def first_occurrences(users):
+    """
+    返回每名选手首次出现位置的掩码。以64位哈希建立索引: 哈希排序后相邻比较，每组取最小的下标；
+    同一哈希下出现不同的用户ID (哈希冲突) 时退回按用户ID精确去重。
+    """
+    mask = np.zeros(len(users), dtype=bool)
+    if not len(users):
+        return mask
+    hashes = hash_users(users)
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    run_start = np.empty(len(order), dtype=bool)
+    run_start[0] = True
+    np.not_equal(sorted_hashes[1:], sorted_hashes[:-1], out=run_start[1:])
+
+    sorted_users = users[order]
+    if np.any((sorted_users[1:] != sorted_users[:-1]) & ~run_start[1:]):
+        _, first = np.unique(users, return_index=True)
+    else:
+        first = np.minimum.reduceat(order, np.flatnonzero(run_start))
+    mask[first] = True
+    return mask
+
+def _column_paths(cache_dir, digest):
+    return (os.path.join(cache_dir, f"{digest}.users.npy"),
+            os.path.join(cache_dir, f"{digest}.scores.npy"))
+
+def _atomic_save_npy(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def _load_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def load_cached_score_file(filepath, manifest, cache_dir=CACHE_DIR):
+    """
+    通过缓存读取单个成绩文件，返回 (users, scores) 或 None。
+    大小与修改时间均未变化时直接信任清单中的哈希；否则重新计算哈希，只有内容真正变化才重新解析。
+    缓存的列以 .npy 格式存储，并以内存映射方式打开。
+    """
+    stat = os.stat(filepath)
+    entry = manifest.get(filepath)
+
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        digest = entry['sha256']
+    else:
+        digest = file_digest(filepath)
+
+    if entry and entry['sha256'] == digest and not entry['parsed']:
+        # 已知无法识别的文件，不再重复解析
+        manifest[filepath] = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        return None
+
+    users_path, scores_path = _column_paths(cache_dir, digest)
+    if not (os.path.exists(users_path) and os.path.exists(scores_path)):
+        parsed = parse_score_file(filepath)
+        if parsed is None:
+            manifest[filepath] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest, 'parsed': False}
+            return None
+        _atomic_save_npy(users_path, parsed[0])
+        _atomic_save_npy(scores_path, parsed[1])
+
+    manifest[filepath] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest, 'parsed': True}
+    return np.load(users_path, mmap_mode='r'), np.load(scores_path, mmap_mode='r')
+
+def load_score_columns(csv_files, cache_dir=CACHE_DIR):
+    """
+    读取一组成绩文件的 (users, scores) 列，未变化的文件直接从缓存加载。
+    返回与 csv_files 对应的列表，无法识别的文件对应 None。
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+    before = json.dumps(manifest, sort_keys=True)
+
+    columns = [load_cached_score_file(f, manifest, cache_dir) for f in csv_files]
+
+    # 清理已经不存在的源文件记录，以及不再被任何文件引用的缓存列
+    for filepath in [f for f in manifest if not os.path.exists(f)]:
+        del manifest[filepath]
+    live_digests = {entry['sha256'] for entry in manifest.values()}
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npy') and name.split('.', 1)[0] not in live_digests:
+            os.remove(os.path.join(cache_dir, name))
+
+    if json.dumps(manifest, sort_keys=True) != before:
+        _save_manifest(cache_dir, manifest)
+    return columns
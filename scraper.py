@@ -1,6 +1,13 @@
 import os
 import re
+import json
+import hashlib
+import asyncio
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import time
 import random
@@ -10,8 +17,8 @@ import random
 # ==============================================================================
 # 基础URL
 BASE_URL = "https://yundouxueyuan.com"
-# 比赛列表页面的URL模板
-CONTEST_LIST_URL_TEMPLATE = "https://yundouxueyuan.com/d/NOIPC/contest?page={page_num}"
+# 比赛列表页面的路径模板
+CONTEST_LIST_PATH_TEMPLATE = "/d/NOIPC/contest?page={page_num}"
 # 要爬取的页数
 PAGES_TO_SCRAPE = 2
 # 保存结果的目录
@@ -21,9 +28,19 @@ MIN_DOWNLOAD_DELAY = 5
 MAX_DOWNLOAD_DELAY = 10
 
 # 重试配置
-MAX_RETRIES = 40000000               # 最大重试次数
-RETRY_BACKOFF_FACTOR = 8      # 重试等待时间的基数（秒）。第一次重试等待5s，第二次10s，第三次20s...
+MAX_RETRIES = 5                # 最大尝试次数
+RETRY_BACKOFF_FACTOR = 8      # 重试等待时间的基数（秒）。第一次重试等待8s，第二次16s，第三次32s...
 RETRY_JITTER = 10              # 重试等待时间的随机抖动范围（秒）
+REQUEST_TIMEOUT = 60           # 单次请求的连接/读取超时（秒）
+
+# 下载清单配置
+MANIFEST_FILENAME = "scoreboard_manifest.json"  # 保存在 OUTPUT_DIR 中
+DOWNLOAD_CHUNK_SIZE = 64 * 1024                 # 流式下载时每次写入的块大小
+
+# 并发模式配置 (--async)
+CONCURRENCY = 8                # 同时进行的请求数，也是连接池大小
+REQUESTS_PER_SECOND = 4        # 令牌桶限速: 平均每秒请求数
+RATE_BURST = 4                 # 令牌桶容量: 允许的瞬时突发请求数
 
 # 请求头
 HEADERS = {
@@ -41,72 +58,322 @@ def sanitize_filename(name):
     name = re.sub(r'【※ 官方数据】', '', name).strip()
     return re.sub(r'[\\/*?:"><|]', "", name).replace(' ', '_')
 
-def scrape_contests():
+def find_noip_contests(html):
+    """从比赛列表页面中解析出所有NOIP比赛，返回 [(比赛名称, 比赛路径), ...]。"""
+    soup = BeautifulSoup(html, 'html.parser')
+    contest_links = soup.select('h1.contest__title a[href*="/d/NOIPC/contest/"]')
+    return [(link.text.strip(), link['href']) for link in contest_links if "NOIP" in link.text]
+
+class IncompleteDownloadError(requests.exceptions.RequestException):
+    """下载的字节数与服务器声明的长度不一致。已下载部分会保留，下次尝试时续传。"""
+
+class DownloadManifest:
+    """
+    保存在 results/ 中的下载清单，按比赛ID记录成绩文件的URL、ETag/Last-Modified、字节数与内容哈希，
+    以及未完成下载 (.part 文件) 的续传验证器。每次更新后立即原子写回磁盘，可在多个线程中共用。
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR):
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, contest_id):
+        with self.lock:
+            return dict(self.entries.get(contest_id, {}))
+
+    def update(self, contest_id, **fields):
+        with self.lock:
+            self.entries.setdefault(contest_id, {}).update(fields)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+def _sha256_of(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _expected_length(response):
+    """返回完整文件的字节数 (206 响应取 Content-Range 中的总长度)，未知时返回 None。"""
+    if response.status_code == 206:
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+def _local_paths(contest_name, output_dir):
+    filename = sanitize_filename(contest_name) + ".csv"
+    return filename, os.path.join(output_dir, filename)
+
+def _is_current(entry, filename, filepath):
+    """本地文件与清单记录一致 (文件名与字节数相同)，可以发送条件请求。"""
+    return (entry.get('filename') == filename and os.path.exists(filepath)
+            and os.path.getsize(filepath) == entry.get('length'))
+
+def has_current_copy(contest_name, contest_path, manifest, output_dir=OUTPUT_DIR):
+    """该比赛是否有与清单一致、带 ETag/Last-Modified 的本地文件，即下一次请求会是条件请求。"""
+    entry = manifest.get(contest_path.split('/')[-1])
+    filename, filepath = _local_paths(contest_name, output_dir)
+    return _is_current(entry, filename, filepath) and bool(entry.get('etag') or entry.get('last_modified'))
+
+def download_scoreboard(session, contest_name, contest_path, manifest, base_url=BASE_URL, output_dir=OUTPUT_DIR):
+    """
+    下载一个比赛的成绩CSV，返回 (状态, 文件路径)，状态为 'saved'、'unchanged' 或 'not_modified'。
+    - 本地文件与清单一致时发送条件请求 (If-None-Match / If-Modified-Since)，304 时直接跳过 ('not_modified')；
+    - 存在未完成的 .part 文件时用 Range + If-Range 续传；
+    - 数据先写入 .part，长度校验通过后才原子替换正式文件，失败的下载不会覆盖已有的好文件；
+    - 内容哈希与上次相同时保留原文件不动。
+    失败时抛出 requests.exceptions.RequestException。
+    """
+    contest_id = contest_path.split('/')[-1]
+    url = f"{base_url}{contest_path}/scoreboard/csv"
+    filename, filepath = _local_paths(contest_name, output_dir)
+    part_path = f"{filepath}.part"
+    entry = manifest.get(contest_id)
+
+    # 压缩传输会使字节数与 Range 偏移失去意义，这里要求原样传输
+    headers = {'Accept-Encoding': 'identity'}
+    have_good_file = _is_current(entry, filename, filepath)
+    if have_good_file:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    resume_validator = (entry.get('partial') or {}).get('validator')
+    resume_from = os.path.getsize(part_path) if resume_validator and os.path.exists(part_path) else 0
+    if resume_from:
+        headers['Range'] = f"bytes={resume_from}-"
+        headers['If-Range'] = resume_validator
+
+    with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 304:
+            return 'not_modified', filepath
+        response.raise_for_status()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        # If-Range 只接受强 ETag，否则退回 Last-Modified
+        validator = etag if etag and not etag.startswith('W/') else last_modified
+        expected_length = _expected_length(response)
+        manifest.update(contest_id, url=url, name=contest_name, partial={'validator': validator})
+
+        mode = 'ab' if response.status_code == 206 else 'wb'
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
+    length = os.path.getsize(part_path)
+    if expected_length is not None and length != expected_length:
+        raise IncompleteDownloadError(f"只下载了 {length}/{expected_length} 字节: {url}")
+
+    sha256 = _sha256_of(part_path)
+    if have_good_file and sha256 == entry.get('sha256'):
+        os.remove(part_path)
+        status = 'unchanged'
+    else:
+        os.replace(part_path, filepath)
+        status = 'saved'
+    manifest.update(contest_id, url=url, name=contest_name, filename=filename, etag=etag,
+                    last_modified=last_modified, length=length, sha256=sha256, partial=None)
+    return status, filepath
+
+def _report_download(status, filepath):
+    if status == 'not_modified':
+        print(f"    - 服务器返回未修改，跳过: {filepath}")
+    elif status == 'unchanged':
+        print(f"    - 成绩未变化，跳过: {filepath}")
+    else:
+        print(f"    - 成功保存到: {filepath}")
+
+def scrape_contests(base_url=BASE_URL, pages=PAGES_TO_SCRAPE, output_dir=OUTPUT_DIR):
     """
-    主函数，用于爬取比赛数据。
+    主函数，逐个爬取比赛数据。
+    只在真正需要下载内容时暂停随机的 MIN_DOWNLOAD_DELAY~MAX_DOWNLOAD_DELAY 秒: 本地没有可用文件的比赛
+    在请求前暂停；有可用文件的比赛直接发送条件请求，返回 304 时不暂停，
+    只有内容确有变化被下载下来时，才在下一个请求前暂停。
     """
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        print(f"创建目录: {OUTPUT_DIR}")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"创建目录: {output_dir}")
+    manifest = DownloadManifest(output_dir)
+    session = create_session(1)
+    # 上一个请求是否下载了内容，若是则下一个请求前需要暂停
+    downloaded = False
 
-    for page_num in range(1, PAGES_TO_SCRAPE + 1):
-        list_url = CONTEST_LIST_URL_TEMPLATE.format(page_num=page_num)
+    for page_num in range(1, pages + 1):
+        list_url = base_url + CONTEST_LIST_PATH_TEMPLATE.format(page_num=page_num)
         print(f"\n正在爬取比赛列表第 {page_num} 页: {list_url}")
 
         try:
-            response = requests.get(list_url, headers=HEADERS)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            contest_links = soup.select('h1.contest__title a[href*="/d/NOIPC/contest/"]')
-
-            if not contest_links:
-                print(f"在第 {page_num} 页没有找到比赛。")
-                continue
-
-            for link in contest_links:
-                contest_name = link.text.strip()
-                
-                if "NOIP" in contest_name:
-                    contest_path = link['href']
-                    contest_id = contest_path.split('/')[-1]
-                    print(f"  > 找到NOIP比赛: '{contest_name}' (ID: {contest_id})")
-
-                    csv_download_url = f"{BASE_URL}{contest_path}/scoreboard/csv"
-                    
-                    # 添加下载前的随机延迟
-                    delay = random.uniform(MIN_DOWNLOAD_DELAY, MAX_DOWNLOAD_DELAY)
-                    print(f"    - 暂停 {delay:.2f} 秒...")
-                    time.sleep(delay)
-
-                    # --- 下载与重试逻辑 ---
-                    for attempt in range(MAX_RETRIES):
-                        try:
-                            print(f"    - 正在下载 (尝试 {attempt + 1}/{MAX_RETRIES}): {csv_download_url}")
-                            csv_response = requests.get(csv_download_url, headers=HEADERS)
-                            csv_response.raise_for_status()
-                            
-                            filename = sanitize_filename(contest_name) + ".csv"
-                            filepath = os.path.join(OUTPUT_DIR, filename)
-                            
-                            with open(filepath, 'wb') as f:
-                                f.write(csv_response.content)
-                            print(f"    - 成功保存到: {filepath}")
-                            break # 下载成功，跳出重试循环
-
-                        except requests.exceptions.RequestException as e:
-                            print(f"    - 尝试 {attempt + 1} 失败: {e}")
-                            if attempt < MAX_RETRIES - 1:
-                                # 计算下一次重试的等待时间（指数退避 + 随机抖动）
-                                backoff_time = RETRY_BACKOFF_FACTOR * (2 ** attempt)
-                                retry_delay = backoff_time + random.uniform(0, RETRY_JITTER)
-                                print(f"    - 等待 {retry_delay:.2f} 秒后重试...")
-                                time.sleep(retry_delay)
-                            else:
-                                print(f"    - 所有重试均失败，放弃下载: {contest_name}")
-                    # --- 重试逻辑结束 ---
+            contests = find_noip_contests(_get_page(session, list_url).text)
+        except requests.exceptions.RequestException as e:
+            print(f"访问比赛列表第 {page_num} 页失败: {e}")
+            continue
+        if not contests:
+            print(f"在第 {page_num} 页没有找到比赛。")
+            continue
+
+        for contest_name, contest_path in contests:
+            print(f"  > 找到NOIP比赛: '{contest_name}' (ID: {contest_path.split('/')[-1]})")
+            csv_download_url = f"{base_url}{contest_path}/scoreboard/csv"
+
+            if downloaded or not has_current_copy(contest_name, contest_path, manifest, output_dir):
+                delay = random.uniform(MIN_DOWNLOAD_DELAY, MAX_DOWNLOAD_DELAY)
+                print(f"    - 暂停 {delay:.2f} 秒...")
+                time.sleep(delay)
+
+            # --- 下载与重试逻辑 ---
+            for attempt in range(MAX_RETRIES):
+                try:
+                    print(f"    - 正在下载 (尝试 {attempt + 1}/{MAX_RETRIES}): {csv_download_url}")
+                    status, filepath = download_scoreboard(session, contest_name, contest_path, manifest,
+                                                           base_url, output_dir)
+                    _report_download(status, filepath)
+                    downloaded = status != 'not_modified'
+                    break # 下载成功，跳出重试循环
+
+                except requests.exceptions.RequestException as e:
+                    print(f"    - 尝试 {attempt + 1} 失败: {e}")
+                    downloaded = True
+                    if attempt < MAX_RETRIES - 1:
+                        # 计算下一次重试的等待时间（指数退避 + 随机抖动）
+                        backoff_time = RETRY_BACKOFF_FACTOR * (2 ** attempt)
+                        retry_delay = backoff_time + random.uniform(0, RETRY_JITTER)
+                        print(f"    - 等待 {retry_delay:.2f} 秒后重试...")
+                        time.sleep(retry_delay)
+                    else:
+                        print(f"    - 所有重试均失败，放弃下载: {contest_name}")
+            # --- 重试逻辑结束 ---
+
+class TokenBucket:
+    """
+    异步令牌桶限速器: 平均每秒发放 rate 个令牌，最多积累 capacity 个。
+    替代逐个请求前的固定随机延迟，允许并发请求在限速范围内同时进行。
+    """
+
+    def __init__(self, rate, capacity):
+        if not rate > 0 or not capacity >= 1:
+            raise ValueError(f"令牌桶的速率必须为正数、容量不小于1: rate={rate}, capacity={capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
+def create_session(pool_size=CONCURRENCY):
+    """创建复用连接的 requests.Session，连接池大小与并发数一致。"""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _get_page(session, url):
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+async def _with_retries(limiter, semaphore, executor, description, func, *args):
+    """在并发与限速约束下于线程池中执行一次请求函数，失败时按指数退避重试，最多 MAX_RETRIES 次。"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(MAX_RETRIES):
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except requests.exceptions.RequestException as e:
+                print(f"    - {description} 第 {attempt + 1}/{MAX_RETRIES} 次失败: {e}")
+                if attempt == MAX_RETRIES - 1:
+                    raise
+        backoff_time = RETRY_BACKOFF_FACTOR * (2 ** attempt)
+        await asyncio.sleep(backoff_time + random.uniform(0, RETRY_JITTER))
+
+async def scrape_contests_async(base_url=BASE_URL, pages=PAGES_TO_SCRAPE, output_dir=OUTPUT_DIR,
+                                concurrency=CONCURRENCY, rate=REQUESTS_PER_SECOND, burst=RATE_BURST):
+    """
+    并发爬取比赛列表与成绩CSV。
+    所有请求共用一个带连接池的会话，同时进行的请求数不超过 concurrency，
+    整体请求速率由令牌桶限制为每秒 rate 个。base_url 可指向本地测试服务器。
+    返回本次新保存 (内容有变化) 的文件路径列表。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = DownloadManifest(output_dir)
+    limiter = TokenBucket(rate, burst)
+    semaphore = asyncio.Semaphore(concurrency)
+    saved = []
+
+    async def download(contest_name, contest_path):
+        try:
+            status, filepath = await _with_retries(
+                limiter, semaphore, executor, f"下载 {contest_name}",
+                download_scoreboard, session, contest_name, contest_path, manifest, base_url, output_dir
+            )
+        except requests.exceptions.RequestException:
+            print(f"    - 所有重试均失败，放弃下载: {contest_name}")
+            return
+        if status == 'saved':
+            saved.append(filepath)
+        _report_download(status, filepath)
+
+    async def scrape_page(page_num):
+        list_url = base_url + CONTEST_LIST_PATH_TEMPLATE.format(page_num=page_num)
+        try:
+            response = await _with_retries(limiter, semaphore, executor, f"访问 {list_url}", _get_page, session, list_url)
         except requests.exceptions.RequestException as e:
             print(f"访问比赛列表第 {page_num} 页失败: {e}")
+            return
+        contests = find_noip_contests(response.text)
+        if not contests:
+            print(f"在第 {page_num} 页没有找到比赛。")
+        for contest_name, contest_path in contests:
+            print(f"  > 找到NOIP比赛: '{contest_name}' (ID: {contest_path.split('/')[-1]})")
+        await asyncio.gather(*(download(name, path) for name, path in contests))
+
+    with create_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        await asyncio.gather(*(scrape_page(n) for n in range(1, pages + 1)))
+    return saved
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="爬取各省NOIP成绩CSV。")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="使用并发模式下载")
+    parser.add_argument('--base-url', default=BASE_URL, help="站点地址，可指向本地测试服务器")
+    parser.add_argument('--pages', type=int, default=PAGES_TO_SCRAPE, help="要爬取的比赛列表页数")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="最大并发请求数 (并发模式)")
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND, help="每秒请求数上限 (并发模式)")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error(f"--concurrency 必须为正整数: {args.concurrency}")
+    if not args.rate > 0:
+        parser.error(f"--rate 必须为正数: {args.rate}")
+
+    if args.use_async:
+        asyncio.run(scrape_contests_async(args.base_url, args.pages, concurrency=args.concurrency,
+                                          rate=args.rate, burst=max(1, round(args.rate))))
+    else:
+        scrape_contests(args.base_url, args.pages)
 
 if __name__ == "__main__":
-    scrape_contests()
+    main()
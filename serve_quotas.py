@@ -0,0 +1,223 @@
+import json
+import time
+import argparse
+import threading
+import itertools
+import functools
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import quota_engine
+import calculate_noi_quotas as calc
+from calcnoi import api
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+HOST = "127.0.0.1"
+PORT = 8000
+# 每个参数组合的结果缓存条数上限 (LRU)，B2/B3 排名另有一份按 (S, K1, K2) 缓存
+RESULT_CACHE_SIZE = 4096
+RANKING_CACHE_SIZE = 1024
+# 启动时预先计算的常用参数网格 (与默认的 P、单省上限及三种B1模式组合)
+PRECOMPUTE_S = range(100, 201, 10)
+PRECOMPUTE_K1 = range(3, 8)
+PRECOMPUTE_K2 = range(3, 8)
+# 查询参数的取值上限，防止异常请求占用过多资源
+MAX_S = 10000
+MAX_SEGMENTS = 100
+# ==============================================================================
+
+B1_MODE_NAMES = tuple(mode for mode, _, _, _ in calc.B1_MODES)
+
+class QueryError(ValueError):
+    """查询参数不合法，返回 400。"""
+
+class QuotaService:
+    """
+    常驻内存的名额查询服务: 成绩只读取并预处理一次，
+    B2/B3 排名按 (S, K1, K2) 缓存，完整结果按 (参数, B1模式) 缓存，两者均为有大小上限的 LRU。
+    """
+
+    def __init__(self, results_dir="results", result_cache_size=RESULT_CACHE_SIZE,
+                 ranking_cache_size=RANKING_CACHE_SIZE):
+        self.results_dir = results_dir
+        data = api.load_scores(results_dir)
+        if not data.scores:
+            raise RuntimeError(f"'{results_dir}' 中没有可用的成绩数据。")
+        self.province_code_to_name = calc.load_province_mapping()
+        self.board = quota_engine.prepare_scores(data.scores)
+        self.participants = {}
+        for mode in B1_MODE_NAMES:
+            b1_participants_data = api.b1_participants(mode, data)
+            if b1_participants_data:
+                self.participants[mode] = quota_engine.align_participants(self.board, b1_participants_data)
+        self.loaded_at = time.time()
+
+        # 每个实例各自的缓存，重新加载时随旧实例一起丢弃
+        self.rankings = functools.lru_cache(maxsize=ranking_cache_size)(self._rankings)
+        self.quotas = functools.lru_cache(maxsize=result_cache_size)(self._quotas)
+
+    def _rankings(self, s_total, k1_segments, k2_top_scores):
+        return quota_engine.rank_awards(self.board, s_total, k1_segments, k2_top_scores)
+
+    def _quotas(self, params, mode):
+        if mode not in self.participants:
+            raise QueryError(f"B1模式 '{mode}' 没有可用的参赛人数数据。")
+        awards = self.rankings(params.s_total, params.k1_segments, params.k2_top_scores)
+        b1_counts, b1_total = self.participants[mode]
+        b1 = quota_engine.b1_quotas(b1_counts, b1_total, params.s_total)
+        total_b = api.apply_caps(b1, awards.b2, awards.b3, awards.non_zero, params)
+        allocation = quota_engine.Allocation(awards.province_codes, b1, awards.b2, awards.b3, total_b)
+        return int(b1_total), tuple(api.quota_table(allocation, self.province_code_to_name))
+
+    def precompute(self, s_values=PRECOMPUTE_S, k1_values=PRECOMPUTE_K1, k2_values=PRECOMPUTE_K2):
+        """预先计算常用参数网格，返回计算的组合数。"""
+        count = 0
+        for s_total, k1, k2, mode in itertools.product(s_values, k1_values, k2_values, self.participants):
+            self.quotas(api.QuotaParams(s_total, k1, k2), mode)
+            count += 1
+        return count
+
+    def query(self, params, mode='official', province=None):
+        """返回可序列化为JSON的查询结果；province 为省份代码或名称时只返回该省。"""
+        national_total, rows = self.quotas(params, mode)
+        if province is not None:
+            rows = [r for r in rows if province in (r['省份代码'], r['省份'])]
+            if not rows:
+                raise QueryError(f"没有省份 '{province}' 的成绩数据。")
+        return {
+            'params': params._asdict(),
+            'mode': mode,
+            'national_total_participants': national_total,
+            'provinces': list(rows),
+        }
+
+    def cache_stats(self):
+        def stats(cached):
+            info = cached.cache_info()
+            return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+        return {'results': stats(self.quotas), 'rankings': stats(self.rankings)}
+
+def parse_query(query_string):
+    """将URL查询串解析为 (QuotaParams, B1模式, 省份)。"""
+    query = {k: v[-1] for k, v in parse_qs(query_string).items()}
+    defaults = api.QuotaParams()
+
+    def number(name, field, value_type, low, high):
+        raw = query.get(name)
+        if raw is None:
+            return getattr(defaults, field)
+        try:
+            value = value_type(raw)
+        except ValueError:
+            raise QueryError(f"参数 {name} 不是有效的数字: {raw}")
+        if value != value:
+            raise QueryError(f"参数 {name} 不是有效的数字: {raw}")
+        if not low <= value <= high:
+            raise QueryError(f"参数 {name} 超出范围 [{low}, {high}]: {raw}")
+        return value
+
+    params = api.QuotaParams(
+        s_total=number('s', 's_total', int, 1, MAX_S),
+        k1_segments=number('k1', 'k1_segments', int, 1, MAX_SEGMENTS),
+        k2_top_scores=number('k2', 'k2_top_scores', int, 1, MAX_SEGMENTS),
+        p_max_ratio=number('p', 'p_max_ratio', float, 0.0, 1.0),
+        max_b_quotas=number('max', 'max_b_quotas', int, 0, MAX_S),
+    )
+    mode = query.get('mode', 'official')
+    if mode not in B1_MODE_NAMES:
+        raise QueryError(f"未知的B1模式: {mode} (可选: {', '.join(B1_MODE_NAMES)})")
+    return params, mode, query.get('province')
+
+class QuotaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'CalcNOI'
+    # 响应头与响应体分两次写出，不关闭 Nagle 算法时会与客户端的延迟确认叠加出约40ms的等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path == '/quotas':
+            try:
+                params, mode, province = parse_query(url.query)
+                self._send_json(200, service.query(params, mode, province))
+            except QueryError as e:
+                self._send_json(400, {'error': str(e)})
+        elif url.path == '/health':
+            self._send_json(200, {
+                'provinces': len(service.board.province_codes),
+                'modes': list(service.participants),
+                'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(service.loaded_at)),
+                'cache': service.cache_stats(),
+            })
+        else:
+            self._send_json(404, {'error': f"未知路径: {url.path} (可用: /quotas, /health, POST /reload)"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/reload':
+            self._send_json(404, {'error': "只支持 POST /reload"})
+            return
+        try:
+            self.server.reload()
+        except Exception as e:
+            self._send_json(500, {'error': f"重新加载成绩失败: {e}"})
+            return
+        self._send_json(200, {'reloaded': True, 'provinces': len(self.server.service.board.province_codes)})
+
+class QuotaServer(ThreadingHTTPServer):
+    """每个连接一个线程的HTTP服务；reload 时整体替换 QuotaService，进行中的查询不受影响。"""
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False, precompute=True):
+        super().__init__(address, QuotaRequestHandler)
+        self.service = service
+        self.verbose = verbose
+        self.precompute = precompute
+        self._reload_lock = threading.Lock()
+
+    def reload(self):
+        with self._reload_lock:
+            service = QuotaService(self.service.results_dir)
+            if self.precompute:
+                service.precompute()
+            self.service = service
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常驻内存的名额查询服务 (HTTP/JSON)。")
+    parser.add_argument('--host', default=HOST, help="监听地址")
+    parser.add_argument('--port', type=int, default=PORT, help="监听端口")
+    parser.add_argument('--results-dir', default="results", help="成绩目录")
+    parser.add_argument('--no-precompute', action='store_true', help="启动时不预先计算常用参数网格")
+    parser.add_argument('--verbose', action='store_true', help="打印每个请求的访问日志")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    service = QuotaService(args.results_dir)
+    if not args.no_precompute:
+        count = service.precompute()
+        print(f"已预先计算 {count} 个参数组合 ({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+    server = QuotaServer((args.host, args.port), service, verbose=args.verbose, precompute=not args.no_precompute)
+    print(f"名额查询服务已启动: http://{args.host}:{args.port}/quotas?s=150&k1=5&k2=5&mode=official，按 Ctrl+C 退出。")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n已停止服务。")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import quota_engine
+import calculate_noi_quotas as calc
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 每批试验数。同一批试验在一次向量化计算中完成，批次越大越快，但占用内存越多
+TRIALS_PER_BATCH = 256
+# 报告中输出的分位数
+QUANTILES = (0.05, 0.5, 0.95)
+# 总分上下限，加噪声后的成绩会被截断到此范围
+MIN_SCORE = 0
+MAX_SCORE = 400
+# 蒙特卡洛结果输出文件
+OUTPUT_FILENAME = "noi2025_quotas_montecarlo.csv"
+# ==============================================================================
+
+# 工作进程中的基准成绩与扰动设置
+_worker_state = {}
+
+def positive_int(text):
+    """argparse 类型: 正整数。"""
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"必须为正整数: {text}")
+    return value
+
+def _init_worker(state):
+    _worker_state.update(state)
+
+def perturb_rosters(rng, base_rosters, impute_counts, trials, bootstrap, noise_sd):
+    """
+    为一批试验生成扰动后的各省成绩矩阵 (试验数, 人数)，每行降序、零分在末尾。
+    - bootstrap: 对每省完整名单 (含零分) 有放回重抽样
+    - impute_counts: 每省补入的缺失选手数，其成绩从该省名单中随机抽取
+    - noise_sd: 对非零分成绩叠加标准差为 noise_sd 的取整高斯噪声
+    """
+    rosters = []
+    for base, extra in zip(base_rosters, impute_counts):
+        if bootstrap:
+            sample = base[rng.integers(0, base.size, size=(trials, base.size))]
+        else:
+            sample = np.broadcast_to(base, (trials, base.size)).copy()
+        if extra:
+            sample = np.hstack([sample, base[rng.integers(0, base.size, size=(trials, extra))]])
+        if noise_sd:
+            noise = np.rint(rng.normal(0, noise_sd, size=sample.shape)).astype(sample.dtype)
+            sample = np.where(sample > 0, np.clip(sample + noise, MIN_SCORE, MAX_SCORE), 0)
+        # int16 成绩上的 stable 排序为基数排序，线性时间
+        sample = np.sort(sample, axis=1, kind='stable')[:, ::-1]
+        rosters.append(sample)
+    return rosters
+
+def _simulate_batch(task):
+    """在工作进程中执行一批试验，返回 (试验数, 省份数) 的B类总名额矩阵。"""
+    seed_seq, trials = task
+    state = _worker_state
+    rng = np.random.default_rng(seed_seq)
+    rosters = perturb_rosters(rng, state['base_rosters'], state['impute_counts'], trials,
+                              state['bootstrap'], state['noise_sd'])
+    _, _, _, total_b = quota_engine.allocate_rosters(rosters, *state['allocate_args'])
+    return total_b.astype(np.int16)
+
+def run_simulation(score_arrays, participants_with_zeros, b1_participants_data, trials,
+                   seed=0, bootstrap=True, impute=False, noise_sd=0.0, workers=None):
+    """
+    对各省成绩做 trials 次扰动并重新分配名额。
+    返回 (省份代码列表, 基准B类总名额数组, (试验数, 省份数) 的B类总名额矩阵)。
+    试验按固定大小分批，每批使用 SeedSequence(seed) 派生的独立种子，结果与工作进程数无关。
+    trials 为 0 时不启动工作进程，返回 (0, 省份数) 的空矩阵。
+    """
+    if trials < 0:
+        raise ValueError(f"试验次数不能为负数: {trials}")
+    board = quota_engine.prepare_scores(score_arrays)
+    b1_counts, b1_total = quota_engine.align_participants(board, b1_participants_data)
+    allocate_args = (b1_counts, b1_total, calc.S_TOTAL_B_QUOTAS, calc.K1_SEGMENTS, calc.K2_TOP_SCORES,
+                     calc.P_MAX_RATIO, calc.MAX_B_QUOTAS_PER_PROVINCE)
+    baseline = quota_engine.allocate(board, *allocate_args).total_b
+
+    # 每省完整名单: 非零分成绩 + 零分选手
+    base_rosters = []
+    for i, province_code in enumerate(board.province_codes):
+        nonzero = np.asarray(score_arrays[province_code], dtype=np.int16)
+        zeros = max(0, participants_with_zeros.get(province_code, nonzero.size) - nonzero.size)
+        base_rosters.append(np.concatenate([nonzero, np.zeros(zeros, dtype=np.int16)]))
+
+    if impute:
+        impute_counts = [max(0, int(b1_participants_data.get(pc, 0)) - r.size)
+                         for pc, r in zip(board.province_codes, base_rosters)]
+    else:
+        impute_counts = [0] * len(base_rosters)
+
+    batch_sizes = [TRIALS_PER_BATCH] * (trials // TRIALS_PER_BATCH)
+    if trials % TRIALS_PER_BATCH:
+        batch_sizes.append(trials % TRIALS_PER_BATCH)
+    tasks = list(zip(np.random.SeedSequence(seed).spawn(len(batch_sizes)), batch_sizes))
+
+    state = {
+        'base_rosters': base_rosters,
+        'impute_counts': impute_counts,
+        'bootstrap': bootstrap,
+        'noise_sd': noise_sd,
+        'allocate_args': allocate_args,
+    }
+    if not tasks:
+        return board.province_codes, baseline, np.zeros((0, len(board.province_codes)), dtype=np.int16)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                             initializer=_init_worker, initargs=(state,)) as executor:
+        results = list(executor.map(_simulate_batch, tasks))
+
+    return board.province_codes, baseline, np.concatenate(results)
+
+def summarize_simulation(province_codes, baseline, totals, province_code_to_name):
+    """汇总每省B类总名额的分布: 均值、分位数，以及相对基准增加/减少名额的概率 (没有试验时为空值)。"""
+    empty = not len(totals)
+    if empty:
+        totals = np.full((1, len(province_codes)), np.nan)
+    quantiles = np.quantile(totals, QUANTILES, axis=0)
+    summary = pd.DataFrame({
+        '省份代码': province_codes,
+        '省份': [province_code_to_name.get(pc, pc) for pc in province_codes],
+        '基准B总名额': baseline,
+        '平均B总名额': totals.mean(axis=0).round(3),
+        **{f"P{round(q * 100)}": quantiles[i] for i, q in enumerate(QUANTILES)},
+        '增加概率': (totals > baseline).mean(axis=0).round(4),
+        '减少概率': (totals < baseline).mean(axis=0).round(4),
+    })
+    if empty:
+        summary[['增加概率', '减少概率']] = np.nan
+    return summary.sort_values('省份代码', ignore_index=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对各省成绩做蒙特卡洛扰动，估计B类名额的不确定性。")
+    parser.add_argument('--trials', type=positive_int, default=10000, help="试验次数")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子 (相同种子结果可复现)")
+    parser.add_argument('--no-bootstrap', action='store_true', help="不对成绩名单做有放回重抽样")
+    parser.add_argument('--impute', action='store_true', help="按B1参赛人数补入缺失选手 (从本省成绩中抽样)")
+    parser.add_argument('--noise', type=float, default=0.0, help="对非零分成绩叠加的高斯噪声标准差")
+    parser.add_argument('--b1-mode', choices=('official', 'with_zeros', 'no_zeros'), default='official',
+                        help="B1 所用参赛人数来源 (对应 calculate_noi_quotas 的三种模式)")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数 (默认使用全部CPU核心)")
+    parser.add_argument('--output', default=OUTPUT_FILENAME, help="结果输出文件")
+    args = parser.parse_args(argv)
+
+    province_code_to_name = calc.load_province_mapping()
+    score_arrays, participants_with_zeros = calc.load_score_data()
+    if not score_arrays:
+        print("核心数据加载不完整，无法继续计算。")
+        return
+
+    b1_participants_data = calc.load_b1_participants(args.b1_mode, score_arrays, participants_with_zeros)
+    print(f"开始 {args.trials} 次蒙特卡洛试验 (种子 {args.seed}) ...")
+    province_codes, baseline, totals = run_simulation(
+        score_arrays, participants_with_zeros, b1_participants_data, args.trials, seed=args.seed,
+        bootstrap=not args.no_bootstrap, impute=args.impute, noise_sd=args.noise, workers=args.workers
+    )
+
+    summary = summarize_simulation(province_codes, baseline, totals, province_code_to_name)
+    print(summary.to_string())
+    try:
+        summary.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n模拟结果已成功保存到: {args.output}")
+    except Exception as e:
+        print(f"\n保存结果到CSV文件时出错: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import contextlib
+import tracemalloc
+
+# 当前启用的分析器；为 None 时 stage() 不做任何记录
+_active = None
+
+class StageProfiler:
+    """
+    按阶段记录耗时、净分配块数 (sys.getallocatedblocks 的变化) 与内存。
+    - trace_memory: 使用 tracemalloc 记录每个阶段的峰值内存与净增内存 (numpy 数组也会被计入)，
+      会让 Python 层的分配变慢，只在需要内存数据时打开
+    - dump_dir: 为每个阶段的每次执行写出 cProfile 统计 (.prof) 与 tracemalloc 快照 (.tracemalloc)
+    同名阶段多次执行 (如三种 B1 模式的输出) 时合并统计。嵌套的阶段计入最外层阶段。
+    """
+
+    def __init__(self, dump_dir=None, trace_memory=True):
+        self.dump_dir = dump_dir
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.total_seconds = 0.0
+        self._started = None
+        self._owns_tracemalloc = False
+        self._depth = 0
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        if self.dump_dir:
+            os.makedirs(self.dump_dir, exist_ok=True)
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.total_seconds = time.perf_counter() - self._started
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self._depth:
+            yield
+            return
+        self._depth += 1
+        profile = cProfile.Profile() if self.dump_dir else None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+        blocks_before = sys.getallocatedblocks()
+        started = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            elapsed = time.perf_counter() - started
+            record = self.stages.setdefault(name, {
+                'calls': 0, 'seconds': 0.0, 'net_blocks': 0, 'peak_bytes': None, 'net_bytes': None,
+            })
+            record['calls'] += 1
+            record['seconds'] += elapsed
+            record['net_blocks'] += sys.getallocatedblocks() - blocks_before
+            if self.trace_memory:
+                memory_after, peak = tracemalloc.get_traced_memory()
+                record['peak_bytes'] = max(record['peak_bytes'] or 0, peak - memory_before)
+                record['net_bytes'] = (record['net_bytes'] or 0) + memory_after - memory_before
+            if self.dump_dir:
+                self._dump(name, record['calls'], profile)
+            self._depth -= 1
+
+    def _dump(self, name, call, profile):
+        order = list(self.stages).index(name) + 1
+        safe_name = re.sub(r'[^\w.-]+', '_', name)
+        stem = os.path.join(self.dump_dir, f"{order:02d}_{safe_name}_{call}")
+        profile.dump_stats(stem + ".prof")
+        if self.trace_memory:
+            tracemalloc.take_snapshot().dump(stem + ".tracemalloc")
+
+    def report(self):
+        """返回可序列化为JSON的报告，阶段按首次执行的顺序排列。"""
+        return {
+            'total_seconds': round(self.total_seconds, 6),
+            'trace_memory': self.trace_memory,
+            'dump_dir': self.dump_dir,
+            'stages': [
+                {'name': name, **{k: round(v, 6) if isinstance(v, float) else v for k, v in record.items()}}
+                for name, record in self.stages.items()
+            ],
+        }
+
+    def save_report(self, filepath):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def summary_table(self):
+        """返回紧凑的文本汇总表。"""
+        def mb(value):
+            return '-' if value is None else f"{value / (1024 * 1024):.1f}"
+
+        rows = [('阶段', '次数', '耗时(s)', '占比', '峰值内存(MB)', '净增内存(MB)', '净分配块数')]
+        for name, record in self.stages.items():
+            share = record['seconds'] / self.total_seconds if self.total_seconds else 0.0
+            rows.append((name, str(record['calls']), f"{record['seconds']:.4f}", f"{share:.1%}",
+                         mb(record['peak_bytes']), mb(record['net_bytes']), str(record['net_blocks'])))
+        rows.append(('总计', '', f"{self.total_seconds:.4f}", '', '', '', ''))
+
+        widths = [max(_display_width(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines = []
+        for row in rows:
+            cells = [row[0] + ' ' * (widths[0] - _display_width(row[0]))]
+            cells += [' ' * (widths[i] - _display_width(cell)) + cell for i, cell in enumerate(row) if i]
+            lines.append('  '.join(cells).rstrip())
+        return '\n'.join(lines)
+
+def _display_width(text):
+    # 中文字符在终端中占两列
+    return sum(2 if ord(ch) > 0x2E7F else 1 for ch in text)
+
+def stage(name):
+    """标记一个阶段；没有启用分析器时为空操作。"""
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.stage(name)
+
+@contextlib.contextmanager
+def profiling(dump_dir=None, trace_memory=True):
+    """在 with 块内启用阶段分析，产出 StageProfiler。"""
+    global _active
+    profiler = StageProfiler(dump_dir, trace_memory)
+    previous = _active
+    _active = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active = previous
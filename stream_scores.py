@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import score_cache
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 每次从CSV读取的行数
+CHUNK_ROWS = 1 << 15
+# 总分上限，总分为 0~MAX_SCORE 的整数
+MAX_SCORE = score_cache.MAX_SCORE
+# ==============================================================================
+
+class ProvinceAccumulator:
+    """
+    单个省份的流式累加器，大小与该省人数无关:
+    - participants: 总参赛人数 (含零分)
+    - histogram: 0~MAX_SCORE 每个分数的人数 (计数排序)。B2 的分段与 B3 的拔尖分都由它直接求出
+      (见 quota_engine.prepare_histograms)，不需要另外保存成绩
+    """
+    __slots__ = ('participants', 'histogram')
+
+    def __init__(self):
+        self.participants = 0
+        self.histogram = np.zeros(MAX_SCORE + 1, dtype=np.int64)
+
+    @property
+    def non_zero(self):
+        return int(self.participants - self.histogram[0])
+
+class _SeenUsers:
+    """
+    跨文件去重用的已见选手集合，保存用户ID及其64位哈希 (score_cache.hash_users，与批量读取相同)。
+    记录按哈希分层存放在若干有序数组中，新数组按二进制计数器的方式与同等大小的层合并，
+    层数保持在 O(log n)，避免每块都重新排序全部记录。哈希相同时再比较用户ID，哈希冲突不会误判为重复。
+    """
+
+    def __init__(self):
+        self.levels = []
+
+    def _contains(self, hashes, users):
+        found = np.zeros(len(hashes), dtype=bool)
+        for level_hashes, level_users in self.levels:
+            pos = np.minimum(np.searchsorted(level_hashes, hashes), level_hashes.size - 1)
+            hit = level_hashes[pos] == hashes
+            same = hit & (level_users[pos] == users)
+            found |= same
+            # 哈希相同而用户ID不同 (哈希冲突，极少出现): 检查该哈希下的全部记录
+            for i in np.flatnonzero(hit & ~same):
+                lo, hi = np.searchsorted(level_hashes, hashes[i], 'left'), np.searchsorted(level_hashes, hashes[i], 'right')
+                found[i] = bool(np.any(level_users[lo:hi] == users[i]))
+        return found
+
+    def filter_new(self, users):
+        """返回 users (定长字节串数组) 中首次出现的选手掩码，并把它们加入集合。"""
+        mask = score_cache.first_occurrences(users)
+        hashes = score_cache.hash_users(users)
+        mask &= ~self._contains(hashes, users)
+
+        order = np.argsort(hashes[mask], kind='stable')
+        new_hashes, new_users = hashes[mask][order], users[mask][order]
+        while self.levels and self.levels[-1][0].size <= new_hashes.size:
+            level_hashes, level_users = self.levels.pop()
+            merged_hashes = np.concatenate([level_hashes, new_hashes])
+            merged_users = np.concatenate([level_users, new_users])
+            order = np.argsort(merged_hashes, kind='stable')
+            new_hashes, new_users = merged_hashes[order], merged_users[order]
+        if new_hashes.size:
+            self.levels.append((new_hashes, new_users))
+        return mask
+
+def _iter_chunks(filepath, chunk_rows):
+    file_format = score_cache.sniff_score_file(filepath)
+    if file_format is None:
+        print(f"警告: 无法识别成绩文件 '{filepath}' 的表头，已跳过。")
+        return
+    user_col, score_col = file_format.user_column, file_format.score_column
+    reader = pd.read_csv(filepath, sep=file_format.delimiter, encoding=file_format.encoding,
+                         usecols=[user_col, score_col], dtype={user_col: str}, chunksize=chunk_rows)
+    for chunk in reader:
+        chunk = chunk[chunk[user_col].notna()]
+        scores = score_cache.checked_scores(chunk[score_col], filepath).astype(np.int64)
+        # 与 score_cache.parse_score_file 相同: 用户ID为 UTF-8 编码的定长字节串
+        yield chunk[user_col].str.strip().str.encode('utf-8').to_numpy(dtype=bytes), scores
+
+def stream_score_summaries(csv_files, chunk_rows=CHUNK_ROWS, dedupe=True, valid_codes=None):
+    """
+    分块流式读取成绩文件，直接累加到各省的 ProvinceAccumulator，不构建完整的 DataFrame。
+    dedupe=True 时跨文件去重同一选手 (保留先出现的记录，与 load_score_data 相同)，
+    此时每名选手额外保存其用户ID与8字节的哈希；dedupe=False 时内存只随省份数增长。
+    valid_codes 给定时，省份代码不在其中的记录会被忽略，读取结束后给出警告。
+    """
+    summaries = {}
+    ignored = {}
+    seen = _SeenUsers() if dedupe else None
+    for filepath in csv_files:
+        for users, scores in _iter_chunks(filepath, chunk_rows):
+            if seen is not None:
+                mask = seen.filter_new(users)
+                users, scores = users[mask], scores[mask]
+
+            codes, province_index = np.unique(users.astype('S2'), return_inverse=True)
+            hist = np.bincount(province_index * (MAX_SCORE + 1) + scores,
+                               minlength=len(codes) * (MAX_SCORE + 1)).reshape(len(codes), MAX_SCORE + 1)
+            for i, code in enumerate(codes.tolist()):
+                if not code:
+                    continue
+                code = code.decode('utf-8', errors='replace')
+                if valid_codes is not None and code not in valid_codes:
+                    ignored[code] = ignored.get(code, 0) + int(hist[i].sum())
+                    continue
+                acc = summaries.get(code)
+                if acc is None:
+                    acc = summaries[code] = ProvinceAccumulator()
+                acc.participants += int(hist[i].sum())
+                acc.histogram += hist[i]
+    if ignored:
+        details = ', '.join(f"{code}: {n}" for code, n in sorted(ignored.items()))
+        print(f"警告: 以下省份代码不在省份映射中，对应的记录已忽略 ({details})。")
+    return dict(sorted(summaries.items()))
+
+def summaries_to_histograms(summaries):
+    """
+    将流式累加结果转换为 ({省份代码: 分数直方图}, {省份代码: 总参赛人数})。
+    直方图可直接交给 quota_engine.prepare_histograms，没有非零分成绩的省份不在其中。
+    """
+    histograms = {code: acc.histogram for code, acc in summaries.items() if acc.non_zero}
+    participant_counts = {code: acc.participants for code, acc in summaries.items()}
+    return histograms, participant_counts
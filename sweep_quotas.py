@@ -0,0 +1,273 @@
+import os
+import math
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import quota_engine
+import calculate_noi_quotas as calc
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 未指定时各参数的取值 (即 calculate_noi_quotas 中的默认参数)
+DEFAULT_S = str(calc.S_TOTAL_B_QUOTAS)
+DEFAULT_K1 = str(calc.K1_SEGMENTS)
+DEFAULT_K2 = str(calc.K2_TOP_SCORES)
+DEFAULT_P = str(calc.P_MAX_RATIO)
+# 每个工作进程平均分到的任务块数，块越多负载越均衡
+CHUNKS_PER_WORKER = 4
+# 扫描结果输出文件
+OUTPUT_FILENAME = "noi2025_quotas_sweep.csv"
+# ==============================================================================
+
+# 工作进程中挂载的共享成绩数据
+_worker_state = {}
+
+def parse_values(text, value_type=int, minimum=None, maximum=None):
+    """
+    解析参数取值。逗号分隔多个取值，每项可以是单个值或闭区间 start:stop:step。
+    例如 "100:200:50,300" -> [100, 150, 200, 300]。
+    步长不为正、区间格式错误、没有任何取值，或有取值不在 [minimum, maximum] 内时抛出 ValueError。
+    """
+    values = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if ':' in item:
+            parts = item.split(':')
+            if len(parts) != 3:
+                raise ValueError(f"区间 '{item}' 的格式应为 start:stop:step")
+            start, stop, step = (value_type(x) for x in parts)
+            if step <= 0:
+                raise ValueError(f"区间 '{item}' 的步长必须为正数")
+            count = math.floor((stop - start) / step + 1e-9) + 1
+            values.extend(value_type(round(start + i * step, 10)) for i in range(count))
+        else:
+            values.append(value_type(item))
+    if not values:
+        raise ValueError(f"取值 '{text}' 中没有任何取值")
+    # NaN 与任何值比较都为假，需要单独排除
+    invalid = [v for v in values if v != v or (minimum is not None and v < minimum)
+               or (maximum is not None and v > maximum)]
+    if invalid:
+        if maximum is None:
+            allowed = f"不小于 {minimum}"
+        elif minimum is None:
+            allowed = f"不大于 {maximum}"
+        else:
+            allowed = f"在 {minimum} 到 {maximum} 之间"
+        raise ValueError(f"取值 '{text}' 中的 {invalid[0]} 无效，取值须{allowed}")
+    return sorted(set(values))
+
+def build_grid(s_values, k1_values, k2_values, p_values):
+    """返回所有参数组合 (S, K1, K2, P) 组成的数组，每行一个组合。"""
+    return np.array(list(itertools.product(s_values, k1_values, k2_values, p_values)), dtype=np.float64)
+
+def _share_array(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+def _attach_board(province_codes, array_specs, b1_counts, b1_totals, exact=None):
+    """工作进程初始化: 挂载共享内存中的成绩数组，重建 ScoreBoard (不拷贝数据)。"""
+    arrays = []
+    for name, shape, dtype in array_specs:
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_state.setdefault('shms', []).append(shm)
+        arrays.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+    _worker_state['board'] = quota_engine.ScoreBoard(province_codes, *arrays)
+    _worker_state['b1'] = (b1_counts, b1_totals)
+    _worker_state['exact'] = exact
+
+def _evaluate_group(board, b1_counts, b1_totals, s_total, k1, k2, p_values, exact):
+    """
+    计算 (S, K1, K2) 相同的一组参数: B2/B3 的排名只做一次，
+    所有 P 取值与 B1 场景的组合交给 allocate_scenarios 一次向量化完成 (P 在外、场景在内)。
+    """
+    scenario_count = len(b1_totals)
+    counts = np.tile(b1_counts, (len(p_values), 1))
+    totals = np.tile(b1_totals, len(p_values))
+    p_max_ratio = np.repeat(p_values, scenario_count)
+    if exact:
+        rounding, tie_break = exact
+        awards = quota_engine.exact_rank_awards(board, s_total, k1, k2, tie_break)
+        b1 = quota_engine.b1_scenarios(counts, totals, s_total)
+        total_b = quota_engine.exact_total_b(awards, counts, totals, s_total, p_max_ratio,
+                                             calc.MAX_B_QUOTAS_PER_PROVINCE, rounding)
+        return quota_engine.Allocation(awards.province_codes, b1, awards.b2, awards.b3, total_b)
+    awards = quota_engine.rank_awards(board, s_total, k1, k2)
+    return quota_engine.allocate_scenarios(awards, counts, totals, s_total, p_max_ratio, calc.MAX_B_QUOTAS_PER_PROVINCE)
+
+def _evaluate_chunk(groups):
+    """
+    在工作进程中计算若干组参数，每组为 (网格行号, S, K1, K2, 各行的 P)。
+    返回 (结果行号, B1, B2, B3, B总名额)，后四项为 (结果行数, 省份数) 矩阵。
+    """
+    board = _worker_state['board']
+    b1_counts, b1_totals = _worker_state['b1']
+    exact = _worker_state.get('exact')
+    scenario_count = len(b1_totals)
+    rows, b1, b2, b3, total_b = [], [], [], [], []
+    for grid_rows, s_total, k1, k2, p_values in groups:
+        allocation = _evaluate_group(board, b1_counts, b1_totals, s_total, k1, k2, p_values, exact)
+        shape = allocation.b1.shape
+        rows.append((grid_rows[:, None] * scenario_count + np.arange(scenario_count)).ravel())
+        b1.append(allocation.b1)
+        b2.append(np.broadcast_to(allocation.b2, shape))
+        b3.append(np.broadcast_to(allocation.b3, shape))
+        total_b.append(allocation.total_b)
+    return tuple(np.concatenate(parts) for parts in (rows, b1, b2, b3, total_b))
+
+def _group_grid(grid):
+    """按 (S, K1, K2) 将网格分组，返回 [(网格行号, S, K1, K2, 各行的 P), ...]。"""
+    keys, inverse = np.unique(grid[:, :3], axis=0, return_inverse=True)
+    order = np.argsort(inverse.ravel(), kind='stable')
+    bounds = np.cumsum(np.bincount(inverse.ravel(), minlength=len(keys)))[:-1]
+    return [
+        (rows, int(key[0]), int(key[1]), int(key[2]), grid[rows, 3])
+        for key, rows in zip(keys, np.split(order, bounds))
+    ]
+
+def sweep_allocations(grid, score_arrays, b1_participants_data, workers=None, exact=None):
+    """
+    对 grid 中的每个参数组合执行一次名额分配，返回 (quota_engine.Allocation, 各省非零分人数)，
+    其中 b1/b2/b3/total_b 均为 (结果行数, 省份数) 矩阵。
+    b1_participants_data 为一个 {省份代码: 参赛人数}，或多个这样的 B1 场景组成的列表；
+    有多个场景时结果行按 (参数组合, 场景) 排列，即第 i 个组合的第 j 个场景在第 i×场景数+j 行。
+    exact 为 (取整方式, 同分处理) 时使用精确模式 (见 quota_engine.allocate_exact)。
+    成绩数据只加载一次并放入共享内存，工作进程直接挂载，不随任务序列化；
+    (S, K1, K2) 相同的组合只做一次 B2/B3 排名。
+    """
+    scenarios = [b1_participants_data] if isinstance(b1_participants_data, dict) else list(b1_participants_data)
+    board = quota_engine.prepare_scores(score_arrays)
+    b1_counts, b1_totals = quota_engine.align_scenarios(board, scenarios)
+    workers = workers or os.cpu_count() or 1
+
+    shms, specs = [], []
+    for array in (board.counts, board.offsets, board.scores, board.prefix):
+        shm, spec = _share_array(array)
+        shms.append(shm)
+        specs.append(spec)
+
+    groups = _group_grid(grid)
+    chunk_count = max(1, min(len(groups), workers * CHUNKS_PER_WORKER))
+    chunks = [groups[i::chunk_count] for i in range(chunk_count)]
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_attach_board,
+            initargs=(board.province_codes, specs, b1_counts, b1_totals, exact),
+        ) as executor:
+            results = list(executor.map(_evaluate_chunk, chunks))
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    shape = (len(grid) * len(scenarios), len(board.province_codes))
+    b1 = np.empty(shape)
+    b2, b3, total_b = (np.empty(shape, dtype=np.int64) for _ in range(3))
+    for rows, *parts in results:
+        for out, part in zip((b1, b2, b3, total_b), parts):
+            out[rows] = part
+    return quota_engine.Allocation(board.province_codes, b1, b2, b3, total_b), board.counts
+
+def run_sweep(grid, score_arrays, b1_participants_data, workers=None, exact=None, b1_modes=None):
+    """
+    对 grid 中的每个参数组合执行一次名额分配，返回整洁格式的结果表 (每个组合 x 每个省份一行)。
+    b1_participants_data 为多个 B1 场景的列表时，b1_modes 给出各场景的名称，结果表增加 'B1模式' 列。
+    """
+    allocation, _ = sweep_allocations(grid, score_arrays, b1_participants_data, workers, exact)
+    province_count = len(allocation.province_codes)
+    scenario_count = len(allocation.b1) // max(len(grid), 1)
+    rows = scenario_count * province_count
+    columns = {
+        'S': np.repeat(grid[:, 0].astype(np.int64), rows),
+        'K1': np.repeat(grid[:, 1].astype(np.int64), rows),
+        'K2': np.repeat(grid[:, 2].astype(np.int64), rows),
+        'P': np.repeat(grid[:, 3], rows),
+    }
+    if b1_modes is not None:
+        columns['B1模式'] = np.tile(np.repeat(b1_modes, province_count), len(grid))
+    return pd.DataFrame(dict(columns, **{
+        '省份代码': np.tile(allocation.province_codes, len(grid) * scenario_count),
+        'B1(计算)': allocation.b1.ravel(),
+        'B2(计算)': allocation.b2.ravel(),
+        'B3(计算)': allocation.b3.ravel(),
+        'B总名额(计算)': allocation.total_b.ravel(),
+    }))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对 S/K1/K2/P 参数网格批量计算各省B类名额。")
+    parser.add_argument('--s', default=DEFAULT_S, help="B类总名额 S 的取值，如 100:200:10")
+    parser.add_argument('--k1', default=DEFAULT_K1, help="综合项分数段数 K1 的取值")
+    parser.add_argument('--k2', default=DEFAULT_K2, help="拔尖项取前 K2 名的取值")
+    parser.add_argument('--p', default=DEFAULT_P, help="非零分人数比例上限 P 的取值，如 0.03:0.08:0.01")
+    parser.add_argument('--b1-mode', default='official',
+                        help="B1 所用参赛人数来源 (official/with_zeros/no_zeros，对应 calculate_noi_quotas 的三种模式)，"
+                             "逗号分隔多个时每个参数组合对每种模式各算一次")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数 (默认使用全部CPU核心)")
+    parser.add_argument('--output', default=OUTPUT_FILENAME, help="结果输出文件")
+    parser.add_argument('--store', default=None, metavar='DIR',
+                        help="将结果作为一个批次追加到列式结果目录 DIR，而不是写出CSV (适合大网格)")
+    parser.add_argument('--compress', action='store_true', help="与 --store 同时使用，压缩写入的批次 (不能再内存映射)")
+    parser.add_argument('--float', action='store_true',
+                        help="使用浮点模式 (与 calculate_noi_quotas 的默认计算相同)；默认使用精确模式，"
+                             "平均分比较与取整全部使用整数/整数比")
+    parser.add_argument('--rounding', choices=quota_engine.ROUNDING_MODES, default=calc.EXACT_ROUNDING,
+                        help="精确模式下B类总名额的取整方式")
+    parser.add_argument('--tie-break', choices=quota_engine.TIE_BREAKS, default=calc.EXACT_TIE_BREAK,
+                        help="精确模式下名额线处同分的处理方式")
+    args = parser.parse_args(argv)
+    exact = None if args.float else (args.rounding, args.tie_break)
+
+    def values(option, text, value_type=int, minimum=1, maximum=None):
+        try:
+            return parse_values(text, value_type, minimum, maximum)
+        except ValueError as e:
+            parser.error(f"{option}: {e}")
+
+    grid = build_grid(values('--s', args.s), values('--k1', args.k1), values('--k2', args.k2),
+                      values('--p', args.p, float, 0, 1))
+    b1_modes = list(dict.fromkeys(m.strip() for m in args.b1_mode.split(',') if m.strip()))
+    known_modes = [mode for mode, *_ in calc.B1_MODES]
+    unknown = [m for m in b1_modes if m not in known_modes]
+    if unknown or not b1_modes:
+        parser.error(f"--b1-mode 的取值必须为 {', '.join(known_modes)} 中的一个或多个: {args.b1_mode}")
+
+    score_arrays, participants_with_zeros = calc.load_score_data()
+    if not score_arrays:
+        print("核心数据加载不完整，无法继续计算。")
+        return
+
+    scenarios = [calc.load_b1_participants(m, score_arrays, participants_with_zeros) for m in b1_modes]
+    # 只有一种模式时结果表与之前的格式相同 (没有 'B1模式' 列)
+    b1_participants_data = scenarios[0] if len(b1_modes) == 1 else scenarios
+    print(f"共 {len(grid)} 个参数组合 x {len(b1_modes)} 种B1模式，{len(score_arrays)} 个省份，开始计算 ...")
+    if args.store:
+        import result_store
+
+        allocation, non_zero = sweep_allocations(grid, score_arrays, b1_participants_data, args.workers, exact)
+        params = (np.repeat(grid[:, i], len(b1_modes)) for i in range(4))
+        columns = result_store.allocation_columns(
+            allocation, non_zero, *params, calc.MAX_B_QUOTAS_PER_PROVINCE, b1_mode=np.tile(b1_modes, len(grid)),
+            exact=exact,
+        )
+        batch = result_store.append_batch(columns, args.store, compress=args.compress, exact=exact)
+        print(f"扫描结果 ({batch.rows} 行) 已追加到列式结果目录: {args.store} ({batch.name})")
+        return
+    result_df = run_sweep(grid, score_arrays, b1_participants_data, args.workers, exact,
+                          b1_modes if len(b1_modes) > 1 else None)
+
+    try:
+        result_df.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"扫描结果 ({len(result_df)} 行) 已成功保存到: {args.output}")
+    except Exception as e:
+        print(f"保存结果到CSV文件时出错: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+HEADER = "#,用户,总分数,#1 NOIP2025GFA,#2 NOIP2025GFB,#3 NOIP2025GFC,#4 NOIP2025GFD"
+
+def write_scoreboard(path, rows, header=HEADER, encoding='utf-8-sig', delimiter=','):
+    """写出一个与 results/ 中格式相同的成绩文件，rows 为 [(用户, 总分), ...]。"""
+    lines = [header.replace(',', delimiter)]
+    for rank, (user, score) in enumerate(rows, 1):
+        lines.append(delimiter.join([str(rank), user, str(score), '0', '0', '0', '0']))
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        f.write('\n'.join(lines) + '\n')
+    return str(path)
+
+def random_rows(rng, province_codes, count, prefix=''):
+    """生成随机的 (用户, 总分) 记录，约两成为零分。"""
+    rows = []
+    for i in range(count):
+        code = province_codes[rng.integers(len(province_codes))]
+        score = 0 if rng.random() < 0.2 else int(rng.integers(1, 401))
+        rows.append((f"{code}-{prefix}{i:04d}", score))
+    return rows
+
+def random_scores(rng, province_count, max_size=120, tie_heavy=False):
+    """随机生成 {省份代码: 降序非零分成绩}；tie_heavy 时分数只取少数几个值，制造大量同分。"""
+    codes = sorted({''.join(rng.choice(list('ABCDEFGHJKLMNPQRSTXYZ'), 2)) for _ in range(province_count * 3)})
+    scores = {}
+    for code in codes[:province_count]:
+        size = int(rng.integers(1, max_size))
+        values = rng.choice([100, 200, 300], size) if tie_heavy else rng.integers(1, 401, size)
+        scores[code] = sorted(values.tolist(), reverse=True)
+    return scores
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(20251129)
+
+@pytest.fixture
+def in_tmp(tmp_path, monkeypatch):
+    """在临时目录中运行 (输出文件与缓存都写在这里)。"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,26 @@
+import os
+import json
+import pytest
+import benchmark_quotas
+import calculate_noi_quotas as calc
+
+def test_main_rejects_non_positive_repeat(capsys):
+    with pytest.raises(SystemExit):
+        benchmark_quotas.main(["--repeat", "0", "--sizes", "100"])
+    assert "--repeat" in capsys.readouterr().err
+
+def test_prepare_workspace_outside_repo(in_tmp):
+    # 当前工作目录中没有 province_mapping.json，映射应从仓库目录读取
+    assert not os.path.exists("province_mapping.json")
+    workspace = in_tmp / "workspace"
+    workspace.mkdir()
+    benchmark_quotas.prepare_workspace(str(workspace), 400, 36)
+
+    with open(os.path.join(benchmark_quotas.REPO_DIR, "province_mapping.json"), encoding='utf-8') as f:
+        name_to_code = json.load(f)
+    with open(workspace / "province_mapping.json", encoding='utf-8') as f:
+        mapping = json.load(f)
+    assert name_to_code.items() <= mapping.items()
+    os.chdir(workspace)
+    scores, participants = calc.load_score_data(use_cache=False)
+    assert len(participants) == 36 and sum(participants.values()) == 400
@@ -0,0 +1,21 @@
+import pytest
+import calculate_noi_quotas as calc
+
+@pytest.mark.parametrize("argv", [["--rounding", "half_even"], ["--tie-break", "insertion"]])
+def test_main_rejects_exact_options_without_exact(argv, capsys):
+    with pytest.raises(SystemExit):
+        calc.main(argv)
+    assert "--exact" in capsys.readouterr().err
+
+def test_main_rejects_no_dedupe_without_streaming(capsys):
+    with pytest.raises(SystemExit):
+        calc.main(["--no-dedupe"])
+    assert "--streaming" in capsys.readouterr().err
+
+@pytest.mark.parametrize("argv, dedupe", [(["--streaming"], True), (["--streaming", "--no-dedupe"], False)])
+def test_main_passes_dedupe_to_streaming_loader(argv, dedupe, monkeypatch):
+    calls = []
+    monkeypatch.setattr(calc, 'load_province_mapping', lambda: {'GD': '广东'})
+    monkeypatch.setattr(calc, 'load_score_data_streaming', lambda **kwargs: calls.append(kwargs) or ({}, {}))
+    calc.main(argv)
+    assert calls == [{'dedupe': dedupe}]
@@ -0,0 +1,63 @@
+import pytest
+import quota_engine
+import calibrate_quotas
+import calculate_noi_quotas as calc
+from conftest import random_scores
+
+def test_predictions_match_exact_allocator(rng):
+    scores = random_scores(rng, 10, max_size=200)
+    b1_sources = {'official': {pc: len(s) * 3 + 1 for pc, s in scores.items()},
+                  'no_zeros': {pc: len(s) for pc, s in scores.items()}}
+    space = calibrate_quotas.SearchSpace([20, 41, 75], [1, 3, 5], [1, 4], [0.05, 0.29], [3, 12],
+                                         calibrate_quotas.ROUNDING_MODES, tuple(b1_sources))
+    board = quota_engine.prepare_scores(scores)
+    calibrator = calibrate_quotas.Calibrator(scores, b1_sources, {pc: 1 for pc in scores}, space)
+    for s_total in space.s_values:
+        for k1 in space.k1_values:
+            for p in space.p_values:
+                for rounding in space.rounding_modes:
+                    for mode, participants in b1_sources.items():
+                        fit = calibrate_quotas.Fit(0, s_total, k1, 4, p, 12, rounding, mode)
+                        counts, total = quota_engine.align_participants(board, participants)
+                        expected = quota_engine.allocate_exact(board, counts, total, s_total, k1, 4, p, 12,
+                                                               rounding=rounding, tie_break='insertion')
+                        assert calibrator.predict(fit)[3].tolist() == expected.total_b.tolist()
+
+def test_calibration_recovers_generating_parameters(rng):
+    scores = random_scores(rng, 12, max_size=300)
+    b1_sources = {'no_zeros': {pc: len(s) for pc, s in scores.items()}}
+    board = quota_engine.prepare_scores(scores)
+    counts, total = quota_engine.align_participants(board, b1_sources['no_zeros'])
+    generated = quota_engine.allocate_exact(board, counts, total, 60, 3, 2, 0.08, 7, rounding='half_up',
+                                            tie_break='insertion')
+    target = dict(zip(generated.province_codes, generated.total_b.tolist()))
+    space = calibrate_quotas.SearchSpace(list(range(40, 81, 5)), [1, 3, 5], [1, 2, 3], [0.04, 0.08, 0.12],
+                                         [5, 7, 9], calibrate_quotas.ROUNDING_MODES, ('no_zeros',))
+    best, stats, calibrator = calibrate_quotas.calibrate(scores, b1_sources, target, space, workers=1)
+    assert best.loss == 0
+    assert calibrator.predict(best)[3].tolist() == generated.total_b.tolist()
+
+def test_calibration_stays_inside_space_when_defaults_are_outside(rng):
+    scores = random_scores(rng, 12, max_size=300)
+    b1_sources = {'no_zeros': {pc: len(s) for pc, s in scores.items()}}
+    board = quota_engine.prepare_scores(scores)
+    counts, total = quota_engine.align_participants(board, b1_sources['no_zeros'])
+    # 目标恰好由默认参数生成，默认参数若被当作初始解会以损失0胜出
+    generated = quota_engine.allocate_exact(board, counts, total, calc.S_TOTAL_B_QUOTAS, calc.K1_SEGMENTS,
+                                            calc.K2_TOP_SCORES, calc.P_MAX_RATIO, calc.MAX_B_QUOTAS_PER_PROVINCE,
+                                            rounding='half_even', tie_break='insertion')
+    target = dict(zip(generated.province_codes, generated.total_b.tolist()))
+    space = calibrate_quotas.SearchSpace(list(range(100, 121)), [calc.K1_SEGMENTS], [calc.K2_TOP_SCORES],
+                                         [calc.P_MAX_RATIO], [calc.MAX_B_QUOTAS_PER_PROVINCE], ('half_up',),
+                                         ('no_zeros',))
+    assert calc.S_TOTAL_B_QUOTAS not in space.s_values
+    best, stats, calibrator = calibrate_quotas.calibrate(scores, b1_sources, target, space, workers=1)
+    assert calibrate_quotas.in_space(best, space)
+    assert stats.evaluated > 0
+    assert best.loss == calibrator.loss(best)
+
+@pytest.mark.parametrize("argv", [["--s", "0:10:1"], ["--k1", "0"], ["--p", "-0.1"], ["--max", "-1"]])
+def test_main_rejects_out_of_range_values(argv, capsys):
+    with pytest.raises(SystemExit):
+        calibrate_quotas.main(["--official", "official.csv"] + argv)
+    assert argv[0] in capsys.readouterr().err
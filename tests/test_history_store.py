@@ -0,0 +1,113 @@
+import os
+import json
+import shutil
+import pandas as pd
+import quota_engine
+import history_store
+import calculate_noi_quotas as calc
+from conftest import write_scoreboard, random_rows
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def make_year(base, rng, name):
+    results_dir = base / name
+    results_dir.mkdir()
+    write_scoreboard(results_dir / "a.csv", random_rows(rng, ['GD', 'ZJ', 'BJ'], 200))
+    return str(results_dir)
+
+def test_ingest_without_rules_or_quota_table(in_tmp, rng, capsys):
+    shutil.copy(os.path.join(REPO_DIR, 'province_mapping.json'), in_tmp)
+    shutil.copy(os.path.join(REPO_DIR, 'noip2025_participants.csv'), in_tmp)
+    store = str(in_tmp / "history")
+    results_dir = make_year(in_tmp, rng, "r2024")
+    history_store.main(['--store', store, 'ingest', '--year', '2024', '--results-dir', results_dir,
+                        '--participants', 'noip2025_participants.csv'])
+
+    # 参赛人数文件不会被当作官方名额表，规则记为未设置
+    data = history_store.load_year(2024, store)
+    assert data.official_participants['GD'] == 881
+    assert data.official_quotas == {}
+    with open(os.path.join(store, history_store.RULES_FILENAME), encoding='utf-8') as f:
+        assert json.load(f) == {'2024': None}
+
+    rows = history_store.province_trajectory('GD', store)
+    assert rows == [{'年份': 2024, '规则年份': 2024, '备注': '2024 年未设置规则'}]
+    capsys.readouterr()
+    history_store.main(['--store', store, 'list'])
+    assert '(未设置规则)' in capsys.readouterr().out
+
+    # 补充规则后可以计算；重新导入不会覆盖已设置的规则
+    history_store.main(['--store', store, 'set-rules', '--year', '2024', '--s', '120'])
+    history_store.ingest_year(2024, results_dir, store_dir=store)
+    rules = history_store.load_rules(store)[2024]
+    assert rules.s_total == 120
+    row, = history_store.province_trajectory('GD', store, mode='no_zeros')
+    assert 'B总名额' in row and '备注' not in row and '官方总名额' not in row
+
+def write_participants(path, participants):
+    with open(path, 'w', encoding='utf-8-sig') as f:
+        f.write("省份代码,A类名额,B1,B2,B3,A+B类总名额\n")
+        for province_code, count in participants.items():
+            f.write(f"{province_code},5,0,0,0,{count}\n")
+
+def test_replay_reproduces_result_tables(in_tmp, rng):
+    shutil.copy(os.path.join(REPO_DIR, 'province_mapping.json'), in_tmp)
+    os.mkdir("results")
+    rows = random_rows(rng, ['GD', 'ZJ', 'BJ', 'JS', 'AH'], 500)
+    write_scoreboard(in_tmp / "results" / "a.csv", rows + [(u + 'z', 0) for u, _ in rows[:60]])
+    write_participants("noip2025_participants.csv", {'GD': 260, 'ZJ': 170, 'BJ': 90, 'JS': 140, 'AH': 75})
+    calc.calculate_quotas()
+
+    store = str(in_tmp / "history")
+    history_store.ingest_year(2025, "results", "noip2025_participants.csv", rules=history_store.YearRules(),
+                              store_dir=store)
+    mapping = calc.load_province_mapping()
+    for mode, _, _, output_filename in calc.B1_MODES:
+        allocation, rules = history_store.replay(2025, 2025, store, mode)
+        assert rules == history_store.YearRules()
+        expected = pd.read_csv(output_filename, dtype=str, encoding='utf-8-sig')
+        actual = calc.build_result_table(allocation, mapping).astype(str)
+        pd.testing.assert_frame_equal(actual, expected)
+
+    # 另一年的规则: 重放与轨迹都与直接调用 quota_engine.allocate 一致
+    new_rules = history_store.YearRules(60, 3, 4, 0.1, 9, 2)
+    history_store.save_rules(2026, new_rules, store)
+    scores, counts = calc.load_score_data("results", use_cache=False)
+    board = quota_engine.prepare_scores(scores)
+    b1_counts, b1_total = quota_engine.align_participants(board, counts)
+    expected = quota_engine.allocate(board, b1_counts, b1_total, *new_rules[:5])
+    allocation, _ = history_store.replay(2025, 2026, store, 'with_zeros')
+    assert allocation.province_codes == expected.province_codes
+    for name in ('b1', 'b2', 'b3', 'total_b'):
+        assert getattr(allocation, name).tolist() == getattr(expected, name).tolist()
+
+    i = expected.province_codes.index('GD')
+    row, = history_store.province_trajectory('GD', store, mode='with_zeros', rules_year=2026)
+    assert row['规则年份'] == 2026
+    assert (row['B2'], row['B3'], row['B总名额']) == (int(expected.b2[i]), int(expected.b3[i]), int(expected.total_b[i]))
+    assert row['总名额'] == new_rules.a_quota + int(expected.total_b[i])
+
+def test_province_only_in_participants_file(in_tmp, rng):
+    shutil.copy(os.path.join(REPO_DIR, 'province_mapping.json'), in_tmp)
+    store = str(in_tmp / "history")
+    results_dir = make_year(in_tmp, rng, "r2025")
+    participants = {'GD': 300, 'ZJ': 250, 'BJ': 120, 'SC': 400}
+    write_participants("participants.csv", participants)
+    rules = history_store.YearRules(40, 3, 3, 0.2, 10, 5)
+    history_store.ingest_year(2025, results_dir, "participants.csv", rules=rules, store_dir=store)
+
+    # 没有成绩的省份也会保存，且计入 B1 的全国总人数
+    data = history_store.load_year(2025, store)
+    assert data.official_participants == participants
+    assert 'SC' not in data.scores and 'SC' not in data.participants_with_zeros
+    allocation, _ = history_store.replay(2025, 2025, store)
+    assert 'SC' not in allocation.province_codes
+    board = quota_engine.prepare_scores(data.scores)
+    b1_counts, b1_total = quota_engine.align_participants(board, participants)
+    assert b1_total == sum(participants.values())
+    expected = quota_engine.allocate(board, b1_counts, b1_total, *rules[:5])
+    assert allocation.b1.tolist() == expected.b1.tolist()
+    assert allocation.total_b.tolist() == expected.total_b.tolist()
+
+    row, = history_store.province_trajectory('SC', store)
+    assert row == {'年份': 2025, '规则年份': 2025}
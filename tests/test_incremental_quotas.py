@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import quota_engine
+from incremental_quotas import IncrementalAllocator
+
+def _full_allocation(scores, participants, s_total, k1, k2, p, max_b):
+    # 全量计算时省份按代码排序 (与 load_score_data 一致)
+    board = quota_engine.prepare_scores({pc: scores[pc] for pc in sorted(scores)})
+    b1_counts, b1_total = quota_engine.align_participants(board, participants)
+    return quota_engine.allocate(board, b1_counts, b1_total, s_total, k1, k2, p, max_b)
+
+@pytest.mark.parametrize("s_total,k1,k2", [(150, 5, 5), (20, 3, 1), (400, 8, 12)])
+def test_random_updates_match_full_allocation(rng, s_total, k1, k2):
+    codes = [f"{a}{b}" for a in "ABCD" for b in "XYZ"]
+    allocator = IncrementalAllocator(s_total, k1, k2, 0.1, 12)
+    scores = {}
+    for step in range(120):
+        code = codes[int(rng.integers(len(codes)))]
+        kind = rng.random()
+        if kind < 0.15:
+            values = []                                       # 该省成绩被删除
+        elif kind < 0.6:
+            values = rng.choice([100, 200, 300], int(rng.integers(1, 40))).tolist()   # 大量同分
+        else:
+            values = rng.integers(1, 401, int(rng.integers(1, 60))).tolist()
+        if kind > 0.9:
+            allocator.remove_province(code)
+            values = []
+        else:
+            allocator.set_province(code, values)
+        if values:
+            scores[code] = sorted(values, reverse=True)
+        else:
+            scores.pop(code, None)
+
+        participants = {pc: len(s) + 3 for pc, s in scores.items()}
+        actual = allocator.allocation(participants)
+        if not scores:
+            assert actual.province_codes == []
+            continue
+        expected = _full_allocation(scores, participants, s_total, k1, k2, 0.1, 12)
+        assert actual.province_codes == expected.province_codes, step
+        np.testing.assert_allclose(actual.b1, expected.b1)
+        for name in ('b2', 'b3', 'total_b'):
+            assert getattr(actual, name).tolist() == getattr(expected, name).tolist(), (step, name)
+
+def test_cutoffs_follow_national_ranking():
+    allocator = IncrementalAllocator(10, 1, 2, 1, 12)
+    allocator.update({'AA': [300, 100], 'BB': [200, 200, 50]})
+    # B2: 3 个名额，代表分 [200 (AA), 150 (BB)] 不足3个时取最后一个；B3: 2 个名额，拔尖分 300, 200, 200, 100
+    assert allocator.cutoffs() == (150, 200)
+    allocator.remove_province('AA')
+    assert allocator.cutoffs() == (150, 200)
+    allocator.set_province('BB', [])
+    assert allocator.cutoffs() == (None, None)
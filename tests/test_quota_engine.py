@@ -0,0 +1,262 @@
+import math
+from fractions import Fraction
+import itertools
+import numpy as np
+import pytest
+import quota_engine
+from conftest import random_scores
+
+def reference_allocation(scores_data, b1_participants_data, s_total, k1, k2, p_max_ratio, max_b_quotas):
+    """逐省循环的原始实现 (向量化之前的 calculate_noi_quotas.run_calculation)，作为对照。"""
+    national_total = sum(b1_participants_data.values())
+    b1 = {pc: s_total * 0.5 * (n / national_total if national_total else 0) for pc, n in b1_participants_data.items()}
+    reps = []
+    for pc, s in scores_data.items():
+        seg = math.ceil(len(s) / k1) if s else 1
+        reps += [(pc, sum(s[i:i + seg]) / len(s[i:i + seg])) for i in range(0, len(s), seg)]
+    reps.sort(key=lambda x: x[1], reverse=True)
+    tops = [(pc, v) for pc, s in scores_data.items() for v in sorted(s, reverse=True)[:k2]]
+    tops.sort(key=lambda x: x[1], reverse=True)
+    b2 = {pc: 0 for pc in scores_data}
+    b3 = {pc: 0 for pc in scores_data}
+    for pc, _ in reps[:math.floor(s_total * 0.3)]:
+        b2[pc] += 1
+    for pc, _ in tops[:math.floor(s_total * 0.2)]:
+        b3[pc] += 1
+    total_b = {
+        pc: min(round(b1.get(pc, 0) + b2[pc] + b3[pc]), math.floor(len(s) * p_max_ratio), max_b_quotas)
+        for pc, s in scores_data.items()
+    }
+    return b1, b2, b3, total_b
+
+@pytest.mark.parametrize("tie_heavy", [False, True])
+def test_allocate_matches_reference(rng, tie_heavy):
+    for _ in range(20):
+        scores = random_scores(rng, int(rng.integers(2, 12)), tie_heavy=tie_heavy)
+        participants = {pc: len(s) + int(rng.integers(0, 50)) for pc, s in scores.items()}
+        board = quota_engine.prepare_scores(scores)
+        b1_counts, b1_total = quota_engine.align_participants(board, participants)
+        for s_total, k1, k2, p in itertools.product((20, 150), (1, 5), (1, 5), (0.05, 0.3)):
+            allocation = quota_engine.allocate(board, b1_counts, b1_total, s_total, k1, k2, p, 12)
+            b1, b2, b3, total_b = reference_allocation(scores, participants, s_total, k1, k2, p, 12)
+            codes = allocation.province_codes
+            np.testing.assert_allclose(allocation.b1, [b1[pc] for pc in codes])
+            assert allocation.b2.tolist() == [b2[pc] for pc in codes]
+            assert allocation.b3.tolist() == [b3[pc] for pc in codes]
+            assert allocation.total_b.tolist() == [total_b[pc] for pc in codes]
+
+def test_prepare_scores_sorts_and_drops_empty():
+    board = quota_engine.prepare_scores({'AA': [3, 9, 5], 'BB': [], 'CC': [7]})
+    assert board.province_codes == ['AA', 'CC']
+    assert board.scores.tolist() == [9, 5, 3, 7]
+    assert board.prefix.tolist() == [0, 9, 14, 17, 24]
+
+@pytest.mark.parametrize("tie_heavy", [False, True])
+def test_histogram_board_bit_equal_to_score_board(rng, tie_heavy):
+    for _ in range(20):
+        scores = random_scores(rng, int(rng.integers(1, 15)), max_size=300, tie_heavy=tie_heavy)
+        participants = {pc: len(s) for pc, s in scores.items()}
+        list_board = quota_engine.prepare_scores(scores)
+        hist_board = quota_engine.prepare_histograms(quota_engine.histograms_from_scores(scores))
+        assert hist_board.province_codes == list_board.province_codes
+        assert hist_board.counts.tolist() == list_board.counts.tolist()
+
+        for k1 in (1, 2, 5, 7):
+            list_sums = quota_engine.segment_sums(list_board, k1)
+            hist_sums = quota_engine.histogram_segment_sums(hist_board, k1)
+            for a, b in zip(list_sums, hist_sums):
+                assert a.tolist() == b.tolist()
+        b1_counts, b1_total = quota_engine.align_participants(list_board, participants)
+        for s_total, k1, k2 in itertools.product((10, 150, 1000), (1, 5), (1, 3, 10)):
+            expected = quota_engine.allocate(list_board, b1_counts, b1_total, s_total, k1, k2, 0.05, 12)
+            actual = quota_engine.allocate(hist_board, b1_counts, b1_total, s_total, k1, k2, 0.05, 12)
+            for name in ('b1', 'b2', 'b3', 'total_b'):
+                assert getattr(actual, name).tolist() == getattr(expected, name).tolist()
+
+def test_histograms_reject_out_of_range_scores():
+    with pytest.raises(ValueError):
+        quota_engine.histograms_from_scores({'AA': [10, 401]})
+
+def test_allocate_scenarios_rows_match_allocate(rng):
+    scores = random_scores(rng, 10)
+    scenarios = [{pc: len(s) * f for pc, s in scores.items()} for f in (1, 1.7, 3)]
+    p_values, max_values = np.array([0.05, 0.1, 0.5]), np.array([12, 3, 20])
+    board = quota_engine.prepare_scores(scores)
+    awards = quota_engine.rank_awards(board, 150, 5, 5)
+    b1_counts, b1_totals = quota_engine.align_scenarios(board, scenarios)
+    batch = quota_engine.allocate_scenarios(awards, b1_counts, b1_totals, 150, p_values, max_values)
+    for i, participants in enumerate(scenarios):
+        counts, total = quota_engine.align_participants(board, participants)
+        single = quota_engine.allocate(board, counts, total, 150, 5, 5, p_values[i], max_values[i])
+        assert batch.b1[i].tolist() == single.b1.tolist()
+        assert batch.total_b[i].tolist() == single.total_b.tolist()
+    assert batch.b2.tolist() == single.b2.tolist() and batch.b3.tolist() == single.b3.tolist()
+
+def _shift_needed(sums, lengths, owners, award_count, province_count, rep, direction, limit):
+    """逐分移动代表 rep 的总分，返回本省名额数首次变化时移动的分数，直到 limit 仍不变则返回 None。"""
+    base = quota_engine.award_by_rank(sums / lengths, owners, award_count, province_count)[owners[rep]]
+    for points in range(limit + 1):
+        moved = sums.copy()
+        moved[rep] += direction * points
+        if quota_engine.award_by_rank(moved / lengths, owners, award_count, province_count)[owners[rep]] != base:
+            return points
+    return None
+
+def test_award_margins_match_brute_force(rng):
+    for _ in range(200):
+        province_count, size = int(rng.integers(1, 6)), int(rng.integers(1, 15))
+        owners = np.sort(rng.integers(0, province_count, size))
+        lengths = rng.integers(1, 4, size)
+        sums = np.minimum(rng.integers(0, 6, size) * lengths + rng.integers(0, 2, size), 400 * lengths)
+        award_count = int(rng.integers(0, size + 2))
+        margins = quota_engine.award_margins(sums, lengths, owners, award_count, province_count)
+        assert margins.awarded.tolist() == quota_engine.award_by_rank(
+            sums / lengths, owners, award_count, province_count).tolist()
+
+        order = np.argsort(-(sums / lengths), kind='stable')
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        for p in range(province_count):
+            mine = np.flatnonzero(owners == p)
+            inside = [i for i in mine if position[i] < award_count]
+            outside = [i for i in mine if position[i] >= award_count]
+            if inside:
+                rep = max(inside, key=lambda i: position[i])
+                lose = _shift_needed(sums, lengths, owners, award_count, province_count, rep, -1, sums[rep])
+                assert (lose is None and np.isnan(margins.lose_points[p])) or lose == margins.lose_points[p]
+            if outside:
+                rep = min(outside, key=lambda i: position[i])
+                gain = _shift_needed(sums, lengths, owners, award_count, province_count, rep, 1,
+                                     400 * lengths[rep] - sums[rep])
+                assert (gain is None and np.isnan(margins.gain_points[p])) or gain == margins.gain_points[p]
+
+def test_rank_margins_agree_across_boards(rng):
+    scores = random_scores(rng, 12, max_size=200, tie_heavy=True)
+    list_board = quota_engine.prepare_scores(scores)
+    hist_board = quota_engine.prepare_histograms(quota_engine.histograms_from_scores(scores))
+    awards = quota_engine.rank_awards(list_board, 150, 5, 5)
+    for expected, actual, awarded in zip(quota_engine.rank_margins(list_board, 150, 5, 5),
+                                         quota_engine.rank_margins(hist_board, 150, 5, 5),
+                                         (awards.b2, awards.b3)):
+        assert expected.awarded.tolist() == awarded.tolist()
+        for a, b in zip(expected, actual):
+            np.testing.assert_array_equal(np.asarray(a), np.asarray(b))
+
+def exact_reference(scores_data, b1_participants_data, s_total, k1, k2, p_max_ratio, max_b_quotas, rounding, tie_break):
+    """用 Fraction 逐项比较与取整的精确分配，作为 allocate_exact 的对照。"""
+    codes = list(scores_data)
+    rank = {pc: r for r, pc in enumerate(codes if tie_break == 'insertion' else sorted(codes))}
+
+    def award(reps, count):
+        reps = sorted(reps, key=lambda r: (-r[0], rank[r[1]], r[2]))
+        count = min(count, len(reps))
+        if 0 < count < len(reps) and reps[count - 1][0] == reps[count][0]:
+            if tie_break == 'include_all':
+                count = sum(1 for r in reps if r[0] >= reps[count - 1][0])
+            elif tie_break == 'exclude_all':
+                count = sum(1 for r in reps if r[0] > reps[count - 1][0])
+        awarded = {pc: 0 for pc in codes}
+        for _, pc, _ in reps[:count]:
+            awarded[pc] += 1
+        return awarded
+
+    reps2, reps3 = [], []
+    for pc, s in scores_data.items():
+        seg = -(-len(s) // k1)
+        reps2 += [(Fraction(sum(s[i:i + seg]), len(s[i:i + seg])), pc, len(reps2) + j)
+                  for j, i in enumerate(range(0, len(s), seg))]
+        reps3 += [(Fraction(v), pc, len(reps3) + j) for j, v in enumerate(sorted(s, reverse=True)[:k2])]
+    b2, b3 = award(reps2, s_total * 3 // 10), award(reps3, s_total * 2 // 10)
+
+    national_total = sum(b1_participants_data.values())
+    total_b = []
+    for pc in codes:
+        x = Fraction(s_total * b1_participants_data[pc], 2 * national_total) + b2[pc] + b3[pc]
+        whole, rest = divmod(x, 1)
+        up = rest > Fraction(1, 2) or (rest == Fraction(1, 2) and (rounding == 'half_up' or whole % 2 == 1))
+        cap = math.floor(len(scores_data[pc]) * Fraction(repr(p_max_ratio)))
+        total_b.append(min(int(whole) + up, cap, max_b_quotas))
+    return [b2[pc] for pc in codes], [b3[pc] for pc in codes], total_b
+
+@pytest.mark.parametrize("tie_heavy", [False, True])
+def test_exact_half_even_insertion_matches_float(rng, tie_heavy):
+    for _ in range(10):
+        scores = random_scores(rng, int(rng.integers(2, 12)), tie_heavy=tie_heavy)
+        participants = {pc: len(s) + int(rng.integers(0, 50)) for pc, s in scores.items()}
+        for board in (quota_engine.prepare_scores(scores),
+                      quota_engine.prepare_histograms(quota_engine.histograms_from_scores(scores))):
+            b1_counts, b1_total = quota_engine.align_participants(board, participants)
+            for s_total, k1, k2, p in itertools.product((20, 150), (1, 5), (1, 5), (0.05, 0.3)):
+                expected = quota_engine.allocate(board, b1_counts, b1_total, s_total, k1, k2, p, 12)
+                actual = quota_engine.allocate_exact(board, b1_counts, b1_total, s_total, k1, k2, p, 12,
+                                                     rounding='half_even', tie_break='insertion')
+                for name in ('b2', 'b3', 'total_b'):
+                    assert getattr(actual, name).tolist() == getattr(expected, name).tolist()
+
+@pytest.mark.parametrize("rounding", quota_engine.ROUNDING_MODES)
+@pytest.mark.parametrize("tie_break", quota_engine.TIE_BREAKS)
+def test_allocate_exact_matches_fraction_reference(rng, rounding, tie_break):
+    for _ in range(8):
+        scores = random_scores(rng, int(rng.integers(2, 10)), max_size=60, tie_heavy=True)
+        # 打乱省份顺序，使 province_code 与 insertion 的同分顺序不同
+        scores = dict(sorted(scores.items(), key=lambda item: -len(item[1])))
+        participants = {pc: 2 * len(s) + int(rng.integers(0, 3)) for pc, s in scores.items()}
+        board = quota_engine.prepare_scores(scores)
+        b1_counts, b1_total = quota_engine.align_participants(board, participants)
+        for s_total, k1, k2, p in itertools.product((20, 57, 150), (2, 3), (1, 4), (0.07, 0.29)):
+            b2, b3, total_b = exact_reference(scores, participants, s_total, k1, k2, p, 9, rounding, tie_break)
+            actual = quota_engine.allocate_exact(board, b1_counts, b1_total, s_total, k1, k2, p, 9,
+                                                 rounding=rounding, tie_break=tie_break)
+            assert actual.b2.tolist() == b2 and actual.b3.tolist() == b3
+            assert actual.total_b.tolist() == total_b
+
+def test_exact_award_by_rank_orders_huge_segments_exactly():
+    # 段人数很大时两个不等的平均分的浮点值相同，必须退回 Fraction 排序
+    lengths = np.array([10**9 + 1, 10**9, 3])
+    sums = 3 * lengths + np.array([1, 1, 0])
+    assert sums[0] / lengths[0] == sums[1] / lengths[1]
+    owners = np.arange(3)
+    for award_count, expected in ((1, [0, 1, 0]), (2, [1, 1, 0]), (3, [1, 1, 1])):
+        awarded = quota_engine.exact_award_by_rank(sums, lengths, owners, award_count, 3, tie_break='insertion')
+        assert awarded.tolist() == expected
+    # 最后一个入选者与下一位实际不同分，include_all/exclude_all 不应扩大或缩小名额
+    for tie_break in ('include_all', 'exclude_all'):
+        assert quota_engine.exact_award_by_rank(sums, lengths, owners, 1, 3, tie_break=tie_break).tolist() == [0, 1, 0]
+
+def test_p_ratio_caps_use_decimal_p():
+    # 100 × 0.29 在浮点下为 28.999999999999996
+    assert quota_engine.p_ratio_caps(np.array([100, 7]), 0.29).tolist() == [29, 2]
+    assert quota_engine.p_ratio_caps(np.array([100]), np.array([[0.07], [0.5]])).tolist() == [[7], [50]]
+    with pytest.raises(ValueError):
+        quota_engine.p_ratio_caps(np.array([100]), 1 / 3)
+
+@pytest.mark.parametrize("tie_heavy", [False, True])
+def test_allocate_rosters_match_allocate(rng, tie_heavy):
+    # 省份顺序不按代码排序，同分按 rosters 中的顺序决定先后
+    codes = ['GD', 'AH', 'ZJ', 'BJ', 'SC', 'HN', 'JS', 'FJ']
+    trials = 30
+    rosters = []
+    for _ in codes:
+        width = int(rng.integers(1, 40))
+        values = rng.choice([0, 100, 200, 300], (trials, width)) if tie_heavy else rng.integers(0, 401, (trials, width))
+        # 每行降序，零分排在末尾；部分试验整省为零分
+        values[rng.random(trials) < 0.1] = 0
+        rosters.append(-np.sort(-values, axis=1))
+    participants = {pc: int(rng.integers(1, 80)) for pc in codes}
+    b1_counts = np.array([participants[pc] for pc in codes], dtype=np.float64)
+    b1_total = sum(participants.values())
+
+    for s_total, k1, k2 in ((150, 5, 5), (40, 3, 2), (300, 1, 10)):
+        b1, b2, b3, total_b = quota_engine.allocate_rosters(rosters, b1_counts, b1_total, s_total, k1, k2, 0.2, 12)
+        assert b2.shape == (trials, len(codes))
+        for t in range(trials):
+            scores = {pc: [v for v in r[t].tolist() if v > 0] for pc, r in zip(codes, rosters)}
+            board = quota_engine.prepare_scores(scores)
+            counts, _ = quota_engine.align_participants(board, participants)
+            expected = quota_engine.allocate(board, counts, b1_total, s_total, k1, k2, 0.2, 12)
+            index = [codes.index(pc) for pc in board.province_codes]
+            absent = [i for i in range(len(codes)) if codes[i] not in board.province_codes]
+            np.testing.assert_allclose(b1[index], expected.b1)
+            for actual, wanted in ((b2[t], expected.b2), (b3[t], expected.b3), (total_b[t], expected.total_b)):
+                assert actual[index].tolist() == wanted.tolist()
+                assert not actual[absent].any()
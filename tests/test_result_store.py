@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import quota_engine
+import result_store
+from conftest import random_scores
+
+def _batch(rng, s_total, b1_mode):
+    scores = random_scores(rng, 6)
+    board = quota_engine.prepare_scores(scores)
+    awards = quota_engine.rank_awards(board, s_total, 5, 5)
+    scenarios = [{pc: len(s) * f for pc, s in scores.items()} for f in (1, 2, 3)]
+    b1_counts, b1_totals = quota_engine.align_scenarios(board, scenarios)
+    p_values = np.array([0.05, 0.1, 0.2])
+    allocation = quota_engine.allocate_scenarios(awards, b1_counts, b1_totals, s_total, p_values, 12)
+    columns = result_store.allocation_columns(allocation, board.counts, s_total, 5, 5, p_values, 12, b1_mode)
+    return allocation, columns
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_batches_round_trip(tmp_path, rng, compress):
+    store_dir = str(tmp_path / 'store')
+    first, first_columns = _batch(rng, 100, 'official')
+    second, second_columns = _batch(rng, 150, 'no_zeros')
+    result_store.append_batch(first_columns, store_dir, compress=compress)
+    result_store.append_batch(second_columns, store_dir, compress=compress)
+    assert [b.scenarios for b in result_store.list_batches(store_dir)] == [3, 3]
+
+    arrays = result_store.read_columns(store_dir, decode=True)
+    rows = len(first_columns['scenario'])
+    assert arrays['scenario'].tolist() == first_columns['scenario'].tolist() + (second_columns['scenario'] + 3).tolist()
+    for name in result_store.RESULT_COLUMNS[1:]:
+        expected = np.concatenate([first_columns[name], second_columns[name]])
+        assert np.asarray(arrays[name]).tolist() == expected.tolist(), name
+    assert set(arrays['b1_mode'][:rows]) == {'official'} and set(arrays['b1_mode'][rows:]) == {'no_zeros'}
+
+    allocation, params = result_store.scenario_allocation(store_dir, 4)
+    assert allocation.province_codes == second.province_codes
+    assert allocation.b1.tolist() == second.b1[1].tolist()
+    assert allocation.total_b.tolist() == second.total_b[1].tolist()
+    assert params['s_total'] == 150 and params['p_max_ratio'] == 0.1
+
+def test_append_batch_rejects_bad_columns(tmp_path, rng):
+    store_dir = str(tmp_path / 'store')
+    _, columns = _batch(rng, 100, 'official')
+    with pytest.raises(ValueError):
+        result_store.append_batch(dict(columns, b1_mode=np.full(len(columns['scenario']), 'unknown')), store_dir)
+    with pytest.raises(ValueError):
+        result_store.append_batch(dict(columns, total_b=columns['total_b'] + 0.5), store_dir)
+    with pytest.raises(ValueError):
+        result_store.append_batch({k: v for k, v in columns.items() if k != 'b1'}, store_dir)
+    assert result_store.list_batches(store_dir) == []
+
+def test_exact_batches_store_exact_caps_and_engine(tmp_path):
+    store_dir = str(tmp_path / 'store')
+    # 100 × 0.29 在浮点下向下取整为 28，精确模式的上限为 29
+    allocation = quota_engine.Allocation(['AA'], np.array([5.0]), np.array([30]), np.array([0]), np.array([29]))
+    exact = ('half_up', 'province_code')
+    columns = result_store.allocation_columns(allocation, [100], 150, 5, 5, 0.29, 40, exact=exact)
+    assert columns['p_ratio_cap'].tolist() == [29]
+    assert result_store.allocation_columns(allocation, [100], 150, 5, 5, 0.29, 40)['p_ratio_cap'].tolist() == [28]
+
+    result_store.append_batch(columns, store_dir, exact=exact)
+    result_store.append_batch(columns, store_dir)
+    batches = result_store.list_batches(store_dir)
+    assert [(b.engine, b.rounding, b.tie_break) for b in batches] == [('exact', *exact), ('float', None, None)]
+
+def test_batches_without_engine_read_as_float(tmp_path, rng):
+    store_dir = str(tmp_path / 'store')
+    _, columns = _batch(rng, 100, 'official')
+    result_store.append_batch(columns, store_dir)
+    manifest = result_store.load_manifest(store_dir)
+    for batch in manifest['batches']:
+        for field in ('engine', 'rounding', 'tie_break'):
+            del batch[field]
+    result_store._write_json(result_store._manifest_path(store_dir), manifest)
+    assert result_store.list_batches(store_dir)[0].engine == 'float'
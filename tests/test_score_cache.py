@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pytest
+import score_cache
+import stream_scores
+from conftest import HEADER, write_scoreboard
+
+def test_parse_score_file_reads_user_and_score(tmp_path):
+    path = write_scoreboard(tmp_path / "a.csv", [("GD-0001", 350), ("GD-0002", 0), (" ZJ-0001 ", 12)])
+    users, scores = score_cache.parse_score_file(path)
+    assert users.tolist() == [b"GD-0001", b"GD-0002", b"ZJ-0001"]
+    assert scores.dtype == score_cache.SCORE_DTYPE
+    assert scores.tolist() == [350, 0, 12]
+
+@pytest.mark.parametrize("bad", ["", "12.5", "401", "-1", "abc"])
+def test_invalid_scores_rejected_by_both_paths(tmp_path, bad):
+    path = write_scoreboard(tmp_path / "bad.csv", [("GD-0001", 100), ("GD-0002", bad)])
+    with pytest.raises(ValueError, match="bad.csv"):
+        score_cache.parse_score_file(path)
+    with pytest.raises(ValueError, match="bad.csv"):
+        stream_scores.stream_score_summaries([path])
+
+def test_sniff_heterogeneous_formats(tmp_path):
+    rows = [("SC-0001", 300), ("SC-0002", 120)]
+    paths = [
+        write_scoreboard(tmp_path / "gbk.csv", rows, encoding='gb18030', delimiter=';'),
+        write_scoreboard(tmp_path / "utf16.csv", rows, encoding='utf-16', delimiter='\t'),
+        write_scoreboard(tmp_path / "en.csv", rows, header=HEADER.replace('用户', 'User').replace('总分数', 'Total Score')),
+    ]
+    for path in paths:
+        users, scores = score_cache.parse_score_file(path)
+        assert users.tolist() == [b"SC-0001", b"SC-0002"]
+        assert scores.tolist() == [300, 120]
+    unknown = tmp_path / "unknown.csv"
+    unknown.write_text("a,b\n1,2\n", encoding='utf-8')
+    assert score_cache.parse_score_file(str(unknown)) is None
+
+def test_first_occurrences_matches_unique():
+    users = np.array([b"GD-1", b"ZJ-2", b"GD-1", b"", b"ZJ-2", b"SC-3"])
+    mask = score_cache.first_occurrences(users)
+    _, first = np.unique(users, return_index=True)
+    assert np.flatnonzero(mask).tolist() == sorted(first.tolist())
+
+def test_cache_reuses_and_invalidates(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    path = write_scoreboard(tmp_path / "a.csv", [("GD-0001", 300), ("GD-0002", 200)])
+    calls = []
+    parse = score_cache.parse_score_file
+    monkeypatch.setattr(score_cache, 'parse_score_file', lambda f: calls.append(f) or parse(f))
+
+    (users, scores), = score_cache.load_score_columns([path], cache_dir)
+    assert scores.tolist() == [300, 200] and len(calls) == 1
+
+    # 未变化: 直接使用缓存
+    (users, scores), = score_cache.load_score_columns([path], cache_dir)
+    assert isinstance(scores, np.memmap) and len(calls) == 1
+
+    # 只改修改时间、内容不变: 重新计算哈希，但不重新解析
+    os.utime(path, ns=(1, 1))
+    score_cache.load_score_columns([path], cache_dir)
+    assert len(calls) == 1
+
+    # 内容变化: 重新解析，旧的缓存列被清理
+    write_scoreboard(tmp_path / "a.csv", [("GD-0001", 300), ("GD-0002", 201)])
+    (users, scores), = score_cache.load_score_columns([path], cache_dir)
+    assert scores.tolist() == [300, 201] and len(calls) == 2
+    assert len([n for n in os.listdir(cache_dir) if n.endswith('.npy')]) == 2
+
+def test_sniff_score_file_keeps_header_names(tmp_path):
+    header = 'Rank,Username,Total Score,T1,T2,T3,T4'
+    path = write_scoreboard(tmp_path / 'en.csv', [('AH-0001', 100)], header=header, delimiter=';')
+    file_format = score_cache.sniff_score_file(path)
+    assert (file_format.delimiter, file_format.user_column, file_format.score_column) == (';', 'Username', 'Total Score')
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import scraper
+
+class LocalSite:
+    """本地替身站点: 比赛列表页与成绩CSV，记录收到的请求与同时进行的最大请求数。"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.pages = {}
+        self.files = {}
+        self.requests = []
+        self.delay = 0
+        # truncate: 这些路径只发送一半内容就断开；bad_total: 这些路径的 206 响应声明错误的总长度
+        self.truncate = set()
+        self.bad_total = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def add_contests(self, page_num, contests):
+        links = ''.join(f'<h1 class="contest__title"><a href="/d/NOIPC/contest/{cid}">{name}</a></h1>'
+                        for cid, name, _ in contests)
+        self.pages[page_num] = f"<html><body>{links}</body></html>".encode('utf-8')
+        for cid, name, body in contests:
+            self.set_file(cid, body)
+
+    def set_file(self, contest_id, body, etag=None):
+        self.files[f"/d/NOIPC/contest/{contest_id}/scoreboard/csv"] = (body, etag or f'"{hash(body) & 0xffffff:x}"')
+
+    def csv_requests(self):
+        return [(path, headers) for path, headers in self.requests if path.endswith('/scoreboard/csv')]
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        site = self.server.site
+        with site.lock:
+            site.requests.append((self.path, dict(self.headers)))
+            site.active += 1
+            site.max_active = max(site.max_active, site.active)
+        try:
+            if site.delay:
+                time.sleep(site.delay)
+            self._respond(site)
+        finally:
+            with site.lock:
+                site.active -= 1
+
+    def _send(self, status, body=b'', headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self, site):
+        if self.path.startswith('/d/NOIPC/contest?page='):
+            page = site.pages.get(int(self.path.rpartition('=')[2]))
+            return self._send(200, page) if page is not None else self._send(404)
+        if self.path not in site.files:
+            return self._send(404)
+        body, etag = site.files[self.path]
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304)
+        status, start = 200, 0
+        headers = [('ETag', etag)]
+        if self.headers.get('Range') and self.headers.get('If-Range') == etag:
+            status, start = 206, int(self.headers['Range'].removeprefix('bytes=').rstrip('-'))
+            total = len(body) + (10 if self.path in site.bad_total else 0)
+            headers.append(('Content-Range', f"bytes {start}-{len(body) - 1}/{total}"))
+        if self.path in site.truncate:
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body) - start))
+            self.end_headers()
+            self.wfile.write(body[start:start + (len(body) - start) // 2])
+            return
+        self._send(status, body[start:], headers)
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.site = LocalSite(f"http://127.0.0.1:{server.server_address[1]}")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.site
+    server.shutdown()
+    server.server_close()
+
+def _contests(prefix, count):
+    return [(f"{prefix}{i}", f"NOIP2025 {prefix}{i}", f"#,用户,总分数\n1,{prefix.upper()}-{i:04d},{i}\n".encode('utf-8'))
+            for i in range(count)]
+
+def test_async_scrape_downloads_all_boards_concurrently(site, tmp_path):
+    site.add_contests(1, _contests('ah', 4) + [('x', "CSP-S 2025", b'')])
+    site.add_contests(2, _contests('bj', 4))
+    site.delay = 0.05
+    output_dir = str(tmp_path / 'results')
+
+    saved = scraper.asyncio.run(scraper.scrape_contests_async(site.base_url, pages=2, output_dir=output_dir,
+                                                              concurrency=4, rate=1000, burst=1000))
+    assert len(saved) == 8
+    assert 1 < site.max_active <= 4
+    for path, (body, _) in site.files.items():
+        if path.startswith('/d/NOIPC/contest/x/'):
+            continue
+        name = f"NOIP2025_{path.split('/')[4]}.csv"
+        with open(tmp_path / 'results' / name, 'rb') as f:
+            assert f.read() == body
+    assert not any(path.startswith('/d/NOIPC/contest/x/') for path, _ in site.requests)
+
+    # 第二次运行时所有成绩都发送条件请求并得到 304
+    site.requests.clear()
+    saved = scraper.asyncio.run(scraper.scrape_contests_async(site.base_url, pages=2, output_dir=output_dir,
+                                                              concurrency=4, rate=1000, burst=1000))
+    assert saved == []
+    assert all('If-None-Match' in headers for _, headers in site.csv_requests())
+
+@pytest.mark.parametrize("argv", [["--async", "--rate", "0"], ["--async", "--rate", "-1"],
+                                  ["--async", "--concurrency", "0"]])
+def test_main_rejects_non_positive_limits(argv, capsys):
+    with pytest.raises(SystemExit):
+        scraper.main(argv)
+    assert argv[1] in capsys.readouterr().err
+
+def test_token_bucket_rejects_zero_rate():
+    with pytest.raises(ValueError):
+        scraper.TokenBucket(0, 1)
+
+def _board_path(tmp_path, contest_id):
+    return tmp_path / 'results' / f"NOIP2025_{contest_id}.csv"
+
+def test_sync_scrape_sleeps_only_before_real_downloads(site, tmp_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(scraper.time, 'sleep', sleeps.append)
+    site.add_contests(1, _contests('ah', 3))
+    output_dir = str(tmp_path / 'results')
+
+    scraper.scrape_contests(site.base_url, pages=1, output_dir=output_dir)
+    assert len(sleeps) == 3
+    assert _board_path(tmp_path, 'ah2').read_bytes() == site.files['/d/NOIPC/contest/ah2/scoreboard/csv'][0]
+
+    # 全部返回 304: 不暂停
+    sleeps.clear()
+    site.requests.clear()
+    scraper.scrape_contests(site.base_url, pages=1, output_dir=output_dir)
+    assert sleeps == []
+    assert len(site.csv_requests()) == 3
+    assert all('If-None-Match' in headers for _, headers in site.csv_requests())
+
+    # 第一个成绩有变化: 它被下载后，下一个请求前暂停一次
+    site.set_file('ah0', "#,用户,总分数\n1,AH-9999,400\n".encode('utf-8'))
+    sleeps.clear()
+    scraper.scrape_contests(site.base_url, pages=1, output_dir=output_dir)
+    assert len(sleeps) == 1
+    assert _board_path(tmp_path, 'ah0').read_bytes() == site.files['/d/NOIPC/contest/ah0/scoreboard/csv'][0]
+
+def _download(site, tmp_path, contest_id):
+    output_dir = str(tmp_path / 'results')
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = scraper.DownloadManifest(output_dir)
+    with scraper.create_session(1) as session:
+        return scraper.download_scoreboard(session, f"NOIP2025 {contest_id}", f"/d/NOIPC/contest/{contest_id}",
+                                           manifest, site.base_url, output_dir)
+
+def test_interrupted_download_resumes_with_range(site, tmp_path):
+    body = bytes(range(256)) * 1024
+    site.set_file('ah0', body)
+    path = '/d/NOIPC/contest/ah0/scoreboard/csv'
+    part_path = tmp_path / 'results' / 'NOIP2025_ah0.csv.part'
+
+    site.truncate.add(path)
+    with pytest.raises(requests.exceptions.RequestException):
+        _download(site, tmp_path, 'ah0')
+    partial = part_path.stat().st_size
+    assert 0 < partial < len(body)
+    assert not _board_path(tmp_path, 'ah0').exists()
+
+    site.truncate.clear()
+    site.requests.clear()
+    assert _download(site, tmp_path, 'ah0')[0] == 'saved'
+    _, headers = site.csv_requests()[0]
+    assert headers['Range'] == f"bytes={partial}-" and headers['If-Range'] == site.files[path][1]
+    assert _board_path(tmp_path, 'ah0').read_bytes() == body
+    assert not part_path.exists()
+    assert _download(site, tmp_path, 'ah0')[0] == 'not_modified'
+
+def test_changed_file_restarts_interrupted_download(site, tmp_path):
+    site.set_file('ah0', bytes(200 * 1024))
+    path = '/d/NOIPC/contest/ah0/scoreboard/csv'
+    site.truncate.add(path)
+    with pytest.raises(requests.exceptions.RequestException):
+        _download(site, tmp_path, 'ah0')
+
+    # ETag 变化后 If-Range 不成立，服务器返回完整的新文件
+    new_body = bytes(range(256)) * 900
+    site.set_file('ah0', new_body)
+    site.truncate.clear()
+    assert _download(site, tmp_path, 'ah0')[0] == 'saved'
+    assert _board_path(tmp_path, 'ah0').read_bytes() == new_body
+
+def test_length_mismatch_keeps_existing_file(site, tmp_path):
+    body = bytes(range(256)) * 1024
+    site.set_file('ah0', body)
+    path = '/d/NOIPC/contest/ah0/scoreboard/csv'
+    site.truncate.add(path)
+    with pytest.raises(requests.exceptions.RequestException):
+        _download(site, tmp_path, 'ah0')
+
+    site.truncate.clear()
+    site.bad_total.add(path)
+    with pytest.raises(scraper.IncompleteDownloadError):
+        _download(site, tmp_path, 'ah0')
+    assert not _board_path(tmp_path, 'ah0').exists()
+    assert (tmp_path / 'results' / 'NOIP2025_ah0.csv.part').stat().st_size == len(body)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import pytest
+import quota_engine
+import serve_quotas
+import calculate_noi_quotas as calc
+from calcnoi import api
+from conftest import write_scoreboard, random_rows
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODES = ['AH', 'BJ', 'GD', 'JS', 'SC', 'ZJ']
+
+@pytest.mark.parametrize("query", [
+    "s=abc", "k1=1.5", "p=x",                        # 不是数字
+    "s=0", "s=-5", "k1=0", "k2=0", "p=1.5", "p=-0.1", "max=-1", f"s={serve_quotas.MAX_S + 1}",  # 超出范围
+    "p=nan", "p=NaN",                                 # NaN
+    "mode=unknown",                                   # 未知的B1模式
+])
+def test_parse_query_rejects_invalid_values(query):
+    with pytest.raises(serve_quotas.QueryError):
+        serve_quotas.parse_query(query)
+
+def test_parse_query_defaults_and_values():
+    params, mode, province = serve_quotas.parse_query("")
+    assert params == api.QuotaParams() and mode == 'official' and province is None
+    params, mode, province = serve_quotas.parse_query("s=1&k1=5&k2=6&p=0.05&max=12&mode=no_zeros&province=GD")
+    assert params == api.QuotaParams(1, 5, 6, 0.05, 12)
+    assert (mode, province) == ('no_zeros', 'GD')
+
+def test_query_matches_result_table(in_tmp, rng):
+    shutil.copy(os.path.join(REPO_DIR, 'province_mapping.json'), in_tmp)
+    with open("noip2025_participants.csv", 'w', encoding='utf-8-sig') as f:
+        f.write("省份代码,省份,A+B类总名额\n")
+        for i, pc in enumerate(CODES):
+            f.write(f"{pc},{pc},{500 + 97 * i}\n")
+    os.mkdir("results")
+    rows = random_rows(rng, CODES, 600)
+    write_scoreboard(in_tmp / "results" / "a.csv", rows + [(u + 'z', 0) for u, _ in rows[:80]])
+
+    service = serve_quotas.QuotaService("results")
+    assert set(service.participants) == set(serve_quotas.B1_MODE_NAMES)
+    data = api.load_scores("results")
+    for params in (api.QuotaParams(), api.QuotaParams(40, 3, 4, 0.1, 9)):
+        for mode in serve_quotas.B1_MODE_NAMES:
+            board = quota_engine.prepare_scores(data.scores)
+            b1_counts, b1_total = quota_engine.align_participants(board, api.b1_participants(mode, data))
+            allocation = quota_engine.allocate(board, b1_counts, b1_total, *params)
+            expected = calc.build_result_table(allocation, service.province_code_to_name)
+
+            result = service.query(params, mode)
+            assert result['national_total_participants'] == b1_total
+            provinces = result['provinces']
+            assert [r['省份'] for r in provinces] == expected['省份'].tolist()
+            assert [f"{r['B1']:.2f}" for r in provinces] == expected['B1(计算)'].tolist()
+            assert [r['B2'] for r in provinces] == expected['B2(计算)'].tolist()
+            assert [r['B3'] for r in provinces] == expected['B3(计算)'].tolist()
+            assert [r['B总名额'] for r in provinces] == expected['B总名额(计算)'].tolist()
+            assert [r['总名额'] for r in provinces] == expected['总名额'].tolist()
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+import simulate_quotas
+from conftest import random_scores
+
+def test_trials_must_be_positive():
+    with pytest.raises(SystemExit):
+        simulate_quotas.main(['--trials', '0'])
+
+def test_zero_trials_and_reproducibility(rng):
+    scores = random_scores(rng, 6)
+    participants = {pc: len(s) + 3 for pc, s in scores.items()}
+    codes, baseline, totals = simulate_quotas.run_simulation(scores, participants, participants, 0)
+    assert totals.shape == (0, len(codes))
+    summary = simulate_quotas.summarize_simulation(codes, baseline, totals, {})
+    assert summary['平均B总名额'].isna().all() and summary['增加概率'].isna().all()
+
+    runs = [simulate_quotas.run_simulation(scores, participants, participants, 300, seed=7, noise_sd=3, workers=w)[2]
+            for w in (1, 2)]
+    assert runs[0].shape == (300, len(codes))
+    np.testing.assert_array_equal(runs[0], runs[1])
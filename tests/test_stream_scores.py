@@ -0,0 +1,58 @@
+import glob
+import numpy as np
+import pytest
+import calculate_noi_quotas as calc
+import quota_engine
+import score_cache
+import stream_scores
+from conftest import write_scoreboard, random_rows
+
+CODES = ['AH', 'BJ', 'GD', 'ZJ']
+
+@pytest.fixture
+def overlapping_results(tmp_path, rng):
+    """三个互相重叠、格式各不相同的成绩文件，其中含有不在省份映射中的代码 ZZ。"""
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    shared = random_rows(rng, CODES, 400)
+    write_scoreboard(results_dir / "1.csv", shared[:300] + [("ZZ-0001", 50)])
+    write_scoreboard(results_dir / "2.csv", [(u, (s + 11) % 401) for u, s in shared[200:]] + random_rows(rng, CODES, 80, 'x'),
+                     encoding='gb18030', delimiter=';')
+    write_scoreboard(results_dir / "3.csv", shared[::7] + random_rows(rng, CODES, 30, 'y'),
+                     encoding='utf-16', delimiter='\t')
+    return str(results_dir)
+
+def test_streaming_matches_batch(overlapping_results):
+    valid = set(CODES)
+    scores, counts = calc.load_score_data(overlapping_results, use_cache=False, valid_codes=valid)
+    # 很小的分块，使去重跨越多个块和文件
+    csv_files = sorted(glob.glob(overlapping_results + "/*.csv"))
+    summaries = stream_scores.stream_score_summaries(csv_files, chunk_rows=37, valid_codes=valid)
+    histograms, stream_counts = stream_scores.summaries_to_histograms(summaries)
+
+    assert stream_counts == counts
+    assert list(histograms) == list(scores)
+    for pc, s in scores.items():
+        assert histograms[pc][1:].tolist() == np.bincount(s, minlength=401)[1:].tolist()
+
+    # 直方图直接用于分配，与逐人成绩的结果逐位相同
+    list_board = quota_engine.prepare_scores(scores)
+    hist_board = quota_engine.prepare_histograms(histograms)
+    b1_counts, b1_total = quota_engine.align_participants(list_board, counts)
+    for s_total, k1, k2 in ((150, 5, 5), (40, 3, 2)):
+        expected = quota_engine.allocate(list_board, b1_counts, b1_total, s_total, k1, k2, 0.05, 12)
+        actual = quota_engine.allocate(hist_board, b1_counts, b1_total, s_total, k1, k2, 0.05, 12)
+        for name in ('b1', 'b2', 'b3', 'total_b'):
+            assert getattr(actual, name).tolist() == getattr(expected, name).tolist()
+
+def test_seen_users_handles_hash_collisions(monkeypatch):
+    # 所有用户ID的哈希都相同时，去重仍须按用户ID精确进行
+    monkeypatch.setattr(score_cache, 'hash_users', lambda users: np.zeros(len(users), dtype=np.uint64))
+    seen = stream_scores._SeenUsers()
+    assert seen.filter_new(np.array([b"GD-1", b"GD-2", b"GD-1"])).tolist() == [True, True, False]
+    assert seen.filter_new(np.array([b"GD-3", b"GD-2", b"GD-12345"])).tolist() == [True, False, True]
+    assert seen.filter_new(np.array([b"GD-12345", b"GD-4"])).tolist() == [False, True]
+
+def test_hash_users_ignores_padding():
+    short, wide = np.array([b"GD-1"]), np.array([b"GD-1", b"GD-123456789"])
+    assert score_cache.hash_users(short)[0] == score_cache.hash_users(wide)[0]
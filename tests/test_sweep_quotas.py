@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import quota_engine
+import sweep_quotas
+from conftest import random_scores
+
+def test_parse_values():
+    assert sweep_quotas.parse_values("100:200:50,300") == [100, 150, 200, 300]
+    assert sweep_quotas.parse_values("0.03:0.05:0.01", float) == [0.03, 0.04, 0.05]
+    for text in ("1:10:0", "1:10:-1", ",", "", "1:2", "10:1:1"):
+        with pytest.raises(ValueError):
+            sweep_quotas.parse_values(text)
+    assert sweep_quotas.parse_values("0:1:0.5", float, minimum=0, maximum=1) == [0, 0.5, 1]
+    for text, value_type, minimum, maximum in (("0", int, 1, None), ("3,0:2:1", int, 1, None),
+                                               ("-1", float, 0, 1), ("0.5:1.5:0.5", float, 0, 1),
+                                               ("nan", float, 0, 1)):
+        with pytest.raises(ValueError):
+            sweep_quotas.parse_values(text, value_type, minimum, maximum)
+
+@pytest.mark.parametrize("argv", [["--s", "0"], ["--k1", "0"], ["--k2", "0:3:1"], ["--p", "-1"], ["--p", "1.5"]])
+def test_main_rejects_out_of_range_values(argv, capsys):
+    with pytest.raises(SystemExit):
+        sweep_quotas.main(argv)
+    assert argv[0] in capsys.readouterr().err
+
+def test_sweep_matches_single_allocations(rng):
+    scores = random_scores(rng, 8)
+    modes = [{pc: len(s) * 2 for pc, s in scores.items()}, {pc: len(s) for pc, s in scores.items()}]
+    grid = sweep_quotas.build_grid([20, 40], [1, 3], [2], [0.05, 0.2, 0.5])
+    allocation, non_zero = sweep_quotas.sweep_allocations(grid, scores, modes, workers=2)
+
+    board = quota_engine.prepare_scores(scores)
+    assert non_zero.tolist() == board.counts.tolist()
+    for i, (s_total, k1, k2, p) in enumerate(grid):
+        for j, participants in enumerate(modes):
+            b1_counts, b1_total = quota_engine.align_participants(board, participants)
+            expected = quota_engine.allocate(board, b1_counts, b1_total, int(s_total), int(k1), int(k2), p, 12)
+            row = i * len(modes) + j
+            np.testing.assert_array_equal(allocation.b1[row], expected.b1)
+            for name in ('b2', 'b3', 'total_b'):
+                assert getattr(allocation, name)[row].tolist() == getattr(expected, name).tolist()
+
+def test_run_sweep_single_mode_table(rng):
+    scores = random_scores(rng, 5)
+    grid = sweep_quotas.build_grid([30], [2, 4], [3], [0.1])
+    table = sweep_quotas.run_sweep(grid, scores, {pc: len(s) for pc, s in scores.items()}, workers=1)
+    assert list(table.columns) == ['S', 'K1', 'K2', 'P', '省份代码', 'B1(计算)', 'B2(计算)', 'B3(计算)', 'B总名额(计算)']
+    assert len(table) == len(grid) * len(scores)
+
+def test_exact_sweep_matches_allocate_exact(rng):
+    scores = random_scores(rng, 8, tie_heavy=True)
+    modes = [{pc: len(s) * 2 + 1 for pc, s in scores.items()}, {pc: len(s) for pc, s in scores.items()}]
+    grid = sweep_quotas.build_grid([20, 45], [1, 3], [2], [0.05, 0.29])
+    exact = ('half_up', 'province_code')
+    allocation, _ = sweep_quotas.sweep_allocations(grid, scores, modes, workers=1, exact=exact)
+
+    board = quota_engine.prepare_scores(scores)
+    for i, (s_total, k1, k2, p) in enumerate(grid):
+        for j, participants in enumerate(modes):
+            b1_counts, b1_total = quota_engine.align_participants(board, participants)
+            expected = quota_engine.allocate_exact(board, b1_counts, b1_total, int(s_total), int(k1), int(k2), p, 12,
+                                                   *exact)
+            row = i * len(modes) + j
+            for name in ('b2', 'b3', 'total_b'):
+                assert getattr(allocation, name)[row].tolist() == getattr(expected, name).tolist()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import calculate_noi_quotas as calc
+import quota_engine
+import watch_quotas
+from conftest import write_scoreboard, random_rows
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODES = ['CQ', 'GD', 'GS', 'JS', 'SC']
+
+def batch_state(results_dir):
+    """全量批处理的结果: (非零分成绩, 含零分人数)，成绩按降序比较。"""
+    scores, counts = calc.load_score_data(results_dir, use_cache=False)
+    return {pc: sorted(s.tolist(), reverse=True) for pc, s in scores.items()}, counts
+
+def assert_matches_batch(watcher, results_dir):
+    scores, counts = batch_state(results_dir)
+    assert {pc: s.tolist() for pc, s in watcher.allocator.scores.items()} == scores
+    assert watcher.participant_counts == counts
+
+    board = quota_engine.prepare_scores(dict(sorted(scores.items())))
+    b1_counts, b1_total = quota_engine.align_participants(board, counts)
+    expected = quota_engine.allocate(board, b1_counts, b1_total, calc.S_TOTAL_B_QUOTAS, calc.K1_SEGMENTS,
+                                     calc.K2_TOP_SCORES, calc.P_MAX_RATIO, calc.MAX_B_QUOTAS_PER_PROVINCE)
+    actual = watcher.allocator.allocation(counts)
+    assert actual.province_codes == expected.province_codes
+    for name in ('b2', 'b3', 'total_b'):
+        assert getattr(actual, name).tolist() == getattr(expected, name).tolist()
+
+def test_watcher_refresh_matches_batch_run(in_tmp, rng):
+    shutil.copy(os.path.join(REPO_DIR, 'province_mapping.json'), in_tmp)
+    results_dir = in_tmp / "results"
+    results_dir.mkdir()
+    # 两个文件的选手大量重叠但分数不同，去重保留哪一份取决于文件的合并顺序
+    shared = random_rows(rng, CODES, 300)
+    write_scoreboard(results_dir / "a.csv", shared)
+    write_scoreboard(results_dir / "b.csv", [(u, (s + 37) % 401) for u, s in shared] + random_rows(rng, CODES, 50, 'b'))
+
+    watcher = watch_quotas.QuotaWatcher(str(results_dir), poll_interval=0, debounce_seconds=0)
+    watcher.snapshot = watch_quotas.scan_results(str(results_dir))
+    watcher.refresh(set(watcher.snapshot))
+    assert_matches_batch(watcher, str(results_dir))
+
+    # 修改排在前面的文件后，它仍然优先于 b.csv
+    a_path = str(results_dir / "a.csv")
+    mtime_ns = watcher.snapshot[a_path][1]
+    write_scoreboard(results_dir / "a.csv", shared[:250] + random_rows(rng, CODES, 40, 'a'))
+    # 显式推进修改时间，不依赖文件系统的时间戳精度
+    os.utime(a_path, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    snapshot = watch_quotas.scan_results(str(results_dir))
+    assert watch_quotas.changed_paths(watcher.snapshot, snapshot) == {a_path}
+    watcher.refresh({a_path})
+    watcher.snapshot = snapshot
+    assert_matches_batch(watcher, str(results_dir))
+
+    # 删除文件
+    os.remove(results_dir / "b.csv")
+    watcher.refresh({str(results_dir / "b.csv")})
+    assert_matches_batch(watcher, str(results_dir))
+
+def test_publish_removes_outputs_when_all_scores_deleted(in_tmp, rng):
+    shutil.copy(os.path.join(REPO_DIR, 'province_mapping.json'), in_tmp)
+    results_dir = in_tmp / "results"
+    results_dir.mkdir()
+    write_scoreboard(results_dir / "a.csv", random_rows(rng, CODES, 100))
+
+    watcher = watch_quotas.QuotaWatcher(str(results_dir), poll_interval=0, debounce_seconds=0)
+    assert watcher.poll() == 1
+    outputs = [output_filename for _, _, _, output_filename in calc.B1_MODES]
+    assert any(os.path.exists(path) for path in outputs)
+
+    os.remove(results_dir / "a.csv")
+    assert watcher.poll() == 1
+    assert not any(os.path.exists(path) for path in outputs)
+    assert watcher.published == {}
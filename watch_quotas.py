@@ -0,0 +1,165 @@
+import os
+import time
+import argparse
+import numpy as np
+import score_cache
+import incremental_quotas
+import calculate_noi_quotas as calc
+
+# ==============================================================================
+# 配置
+# ==============================================================================
+# 成绩目录
+RESULTS_DIR = "results"
+# 轮询间隔 (秒)。空闲时每个间隔只对目录做一次 stat 扫描
+POLL_INTERVAL = 0.5
+# 防抖时间 (秒)。检测到变化后，目录在这段时间内不再变化才开始重新计算
+DEBOUNCE_SECONDS = 1.0
+# ==============================================================================
+
+def scan_results(results_dir=RESULTS_DIR):
+    """返回 {CSV路径: (大小, 修改时间)}，只做 stat，不读取文件内容。"""
+    snapshot = {}
+    try:
+        entries = list(os.scandir(results_dir))
+    except FileNotFoundError:
+        return snapshot
+    for entry in entries:
+        if entry.name.endswith('.csv') and entry.is_file():
+            stat = entry.stat()
+            snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+def changed_paths(old_snapshot, new_snapshot):
+    """返回新增、修改或删除的文件路径集合。"""
+    return {p for p in old_snapshot.keys() | new_snapshot.keys() if old_snapshot.get(p) != new_snapshot.get(p)}
+
+def _province_codes(users):
+    return {code.decode('utf-8', errors='replace') for code in np.unique(users.astype('S2')) if code}
+
+class QuotaWatcher:
+    """
+    监视 results/ 目录，成绩文件变化时只重新处理受影响的省份，
+    然后原子地重写三种模式的结果文件，并打印名额发生变化的省份。
+    """
+
+    def __init__(self, results_dir=RESULTS_DIR, poll_interval=POLL_INTERVAL, debounce_seconds=DEBOUNCE_SECONDS):
+        self.results_dir = results_dir
+        self.poll_interval = poll_interval
+        self.debounce_seconds = debounce_seconds
+        self.cache_dir = score_cache.cache_dir_for(results_dir)
+        self.province_code_to_name = calc.load_province_mapping()
+        self.participants_from_file = calc.load_province_participants_from_file()
+        self.allocator = incremental_quotas.IncrementalAllocator()
+
+        self.snapshot = {}
+        self.columns = {}            # 文件路径 -> (users, scores)
+        self.file_provinces = {}     # 文件路径 -> 文件中出现的省份代码
+        self.participant_counts = {} # 省份代码 -> 总参赛人数 (含零分)
+        self.published = {}          # 输出文件 -> {省份: B类总名额}
+
+    def refresh(self, paths):
+        """重新读取变化的文件，返回受影响的省份代码集合。"""
+        affected = set()
+        for path in paths:
+            affected |= self.file_provinces.pop(path, set())
+            self.columns.pop(path, None)
+
+        existing = sorted(p for p in paths if os.path.exists(p))
+        for path, columns in zip(existing, score_cache.load_score_columns(existing, self.cache_dir)):
+            if columns is None:
+                continue
+            self.columns[path] = columns
+            self.file_provinces[path] = _province_codes(columns[0])
+            affected |= self.file_provinces[path]
+
+        # 受影响省份的数据需要由所有包含该省的文件重新合并 (跨文件去重)。
+        # 去重保留先出现的记录，文件按路径排序合并，与 load_score_data 的读取顺序一致
+        sources = [self.columns[p] for p in sorted(self.file_provinces) if self.file_provinces[p] & affected]
+        scores, counts = calc.combine_score_columns(sources, set(self.province_code_to_name) or None) if sources else ({}, {})
+        for province_code in affected:
+            if province_code in counts:
+                self.participant_counts[province_code] = counts[province_code]
+            else:
+                self.participant_counts.pop(province_code, None)
+            self.allocator.set_province(province_code, scores.get(province_code, []))
+        return affected
+
+    def publish(self):
+        """重新计算三种模式并原子地写出结果文件，打印相对上次发布的名额变化。"""
+        score_counts = {pc: s.size for pc, s in self.allocator.scores.items()}
+        b1_sources = {
+            'official': self.participants_from_file,
+            'with_zeros': self.participant_counts,
+            'no_zeros': score_counts,
+        }
+        for mode, title, _, output_filename in calc.B1_MODES:
+            if not score_counts:
+                # 成绩已全部删除: 移除旧的结果文件，避免继续发布过期名额
+                if os.path.exists(output_filename):
+                    os.remove(output_filename)
+                    print(f"  [{title}] 已无成绩，删除结果文件 '{output_filename}'")
+                self.published.pop(output_filename, None)
+                continue
+            b1_participants_data = b1_sources[mode]
+            if not b1_participants_data:
+                continue
+            allocation = self.allocator.allocation(b1_participants_data)
+            result_df = calc.build_result_table(allocation, self.province_code_to_name)
+            calc.save_result_table(result_df, output_filename)
+
+            totals = dict(zip(allocation.province_codes, allocation.total_b.tolist()))
+            previous = self.published.get(output_filename)
+            if previous is not None:
+                for province_code in sorted(previous.keys() | totals.keys()):
+                    before, after = previous.get(province_code), totals.get(province_code)
+                    if before != after:
+                        name = self.province_code_to_name.get(province_code, province_code)
+                        print(f"  [{title}] {name}: B总名额 {before} -> {after}")
+            self.published[output_filename] = totals
+
+    def poll(self):
+        """检查一次目录，有变化时等待防抖时间结束后处理，返回处理的文件数。"""
+        snapshot = scan_results(self.results_dir)
+        if snapshot == self.snapshot:
+            return 0
+
+        # 防抖: 连续写入的一批文件合并为一次重新计算
+        deadline = time.monotonic() + self.debounce_seconds
+        while time.monotonic() < deadline:
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+            latest = scan_results(self.results_dir)
+            if latest != snapshot:
+                snapshot = latest
+                deadline = time.monotonic() + self.debounce_seconds
+
+        paths = changed_paths(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        started = time.perf_counter()
+        affected = self.refresh(paths)
+        self.publish()
+        elapsed = (time.perf_counter() - started) * 1000
+        names = ', '.join(self.province_code_to_name.get(pc, pc) for pc in sorted(affected))
+        print(f"{time.strftime('%H:%M:%S')} 处理 {len(paths)} 个文件，更新省份: {names or '无'} ({elapsed:.1f} ms)")
+        return len(paths)
+
+    def run(self):
+        print(f"开始监视 '{self.results_dir}' (轮询间隔 {self.poll_interval}s，防抖 {self.debounce_seconds}s)，按 Ctrl+C 退出。")
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            print("\n已停止监视。")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="监视成绩目录，成绩更新时自动重新计算并发布名额表。")
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help="成绩目录")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help="轮询间隔 (秒)")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS, help="防抖时间 (秒)")
+    args = parser.parse_args(argv)
+
+    QuotaWatcher(args.results_dir, args.interval, args.debounce).run()
+
+if __name__ == "__main__":
+    main()